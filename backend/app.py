@@ -1,31 +1,59 @@
 # app.py - Enhanced AI Chatbot Backend with File Processing
 from ast import Import
 import os
-import base64
-import google.generativeai as genai
+import functools
+import time
+from collections import deque
 from dotenv import load_dotenv
-from flask import Flask, json, request, jsonify, send_from_directory
+from flask import Flask, Response, g, json, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
-from flask_jwt_extended import create_access_token, get_jwt_identity, JWTManager, decode_token
+from flask_jwt_extended import create_access_token, get_jwt_identity, JWTManager
+from auth import require_auth, token_cache
+from sessions import create_session, refresh_session, revoke_session, session_cache
 import mysql.connector
-from passlib.hash import pbkdf2_sha256 as sha256
+from config import Config
+from logging_setup import logging_stats, setup_logging, start_request
+import metrics
+import tracing
+from tracing import span, traced
+from db_pool import get_pool
+from message_writer import ChatWriterBusy, writer as message_writer
+from streaming import iter_text_chunks, sse_event
+import file_workers
+from file_workers import FileProcessingBusy
+from jobs import TERMINAL_STATUSES, create_job, get_job, submit_job
+from extraction_cache import ExtractionCache
+from upload_spool import SpoolingRequest
+from rate_limit import make_rate_limiter, request_cost
+from response_cache import ResponseCache
+from retrieval import select_relevant_text
+from image_prep import prepare_image
+from history import InvalidCursor, fetch_history_page, fetch_message
+from search_index import on_history_cleared, on_message_saved, search_history
+from models import delete_file, embed_content, get_file, get_model, limiter_snapshot, upload_file
+from resilience import LLMUnavailable
+from conversations import build_context, create_conversation, get_conversation, schedule_summary, with_context
+from passwords import PasswordHashingBusy, hash_password, verify_password
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
-import mimetypes
 import PyPDF2
 from PIL import Image
 import io
 import json
-import docx
-import traceback
+import posixpath
+import zipfile
+from xml.etree import ElementTree
+import logging
 
 load_dotenv()
+setup_logging()
+logger = logging.getLogger(__name__)
 
 # --- CONFIGURATIONS ---
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": ["http://localhost:3000", "http://localhost:5173", "https://responsive-chatbot-2.onrender.com"]}}, supports_credentials=True)
 app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
-app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(hours=1)  # Session management
+app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(minutes=Config.ACCESS_TOKEN_EXPIRES_MINUTES)  # renewed via /refresh
 if not app.config["JWT_SECRET_KEY"]:
     raise RuntimeError("JWT_SECRET_KEY env variable is not set!")
 app.config["UPLOAD_FOLDER"] = os.path.join(os.getcwd(), "uploads")
@@ -34,19 +62,94 @@ app.config["MAX_CONTENT_LENGTH"] = 50 * 1024 * 1024  # 50MB max file size
 # Create uploads directory if it doesn't exist
 os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
 
+# Parse uploads straight into UploadSpools (memory, or a temp file in UPLOAD_FOLDER)
+SpoolingRequest.spool_dir = app.config["UPLOAD_FOLDER"]
+app.request_class = SpoolingRequest
+
 jwt = JWTManager(app)
 
+# --- Request IDs and timing ---
+# Every log record of a request carries its id; a well-formed X-Request-ID from a proxy is kept
+@app.before_request
+def bind_request_id():
+    g.request_started = time.perf_counter()
+    incoming = request.headers.get('X-Request-ID', '')
+    well_formed = incoming.isascii() and incoming.replace('-', '').isalnum() and len(incoming) <= 64
+    g.request_id = start_request(incoming if well_formed else None)
+
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.trace_span = tracing.start_span(
+        f"{request.method} {route}",
+        {'http.method': request.method, 'http.route': route, 'request_id': g.request_id},
+        traceparent=request.headers.get('traceparent'),
+        kind='SERVER'
+    )
+    g.trace_token = tracing.activate(g.trace_span)
+
+@app.after_request
+def add_request_id_header(response):
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    if 'trace_span' in g:
+        g.trace_span.set_attribute('http.status_code', response.status_code)
+        traceparent = g.trace_span.traceparent()
+        if traceparent:
+            response.headers['traceparent'] = traceparent
+        if response.is_streamed:
+            # Teardown runs before the body is sent; end the span once the server closes the stream
+            g.trace_deferred = True
+            response.call_on_close(functools.partial(finish_request_span, g.trace_span, g.trace_token))
+    if 'request_started' in g:
+        # Route templates, not raw paths, keep the label set bounded
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.http_request_duration.observe(time.perf_counter() - g.request_started,
+                                              request.method, route, response.status_code)
+    return response
+
+def finish_request_span(trace_span, token):
+    trace_span.end()
+    try:
+        tracing.deactivate(token)
+    except (ValueError, RuntimeError):
+        pass  # already reset, or closed from another context that ends with the request
+
+@app.teardown_request
+def end_request_span(error=None):
+    if 'trace_span' in g:
+        if error is not None:
+            g.trace_span.record_exception(error)
+        if not g.get('trace_deferred'):
+            finish_request_span(g.trace_span, g.trace_token)
+
 # --- Gemini AI Configuration ---
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-print(f"DEBUG: Gemini API key configured: {bool(os.getenv('GEMINI_API_KEY'))}")
-
-# --- Database Configuration ---
-db_config = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'user': os.getenv('DB_USER', 'root'),
-    'password': os.getenv('DB_PASSWORD', 'your_password'),
-    'database': os.getenv('DB_NAME', 'chatbot_db')
-}
+# models.py configures the SDK once; get_model() hands out shared model instances
+logger.info("Gemini API key configured: %s", bool(os.getenv('GEMINI_API_KEY')))
+
+# --- Document Extraction Cache ---
+extraction_cache = ExtractionCache(
+    Config.EXTRACTION_CACHE_DIR,
+    ttl=Config.EXTRACTION_CACHE_TTL,
+    memory_max_bytes=Config.EXTRACTION_CACHE_MEMORY_MAX_BYTES,
+    disk_max_bytes=Config.EXTRACTION_CACHE_DISK_MAX_BYTES,
+    enabled=Config.EXTRACTION_CACHE_ENABLED
+)
+
+# --- Response Cache (plain-text prompts) ---
+def embed_prompt(prompt):
+    return embed_content(model=Config.EMBEDDING_MODEL, content=prompt)['embedding']
+
+response_cache = ResponseCache(
+    max_entries=Config.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl=Config.RESPONSE_CACHE_TTL,
+    scope=Config.RESPONSE_CACHE_SCOPE,
+    similarity_threshold=Config.RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+    embed_fn=embed_prompt,
+    enabled=Config.RESPONSE_CACHE_ENABLED,
+    semantic_max_entries=Config.RESPONSE_CACHE_SEMANTIC_MAX_ENTRIES
+)
+
+# --- Rate Limiting ---
+rate_limiter = make_rate_limiter()
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'txt', 'docx', 'doc'}
@@ -55,56 +158,200 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def get_db_connection():
-    return mysql.connector.connect(**db_config)
+    """Check out a pooled connection; close() hands it back to the pool."""
+    with span('db.connection'):
+        return get_pool().connection()
+
+def save_chat_message(user_id, user_message, bot_response, file_info, conversation_id=None):
+    """Persist one completed exchange to chat_messages (queued for a batch insert with CHAT_WRITE_BEHIND)."""
+    created_at = datetime.now()
+    if Config.CHAT_WRITE_BEHIND:
+        message_writer.submit({
+            'user_id': user_id,
+            'conversation_id': conversation_id,
+            'user_message': user_message,
+            'bot_response': bot_response,
+            'files_info': file_info,
+            'created_at': created_at
+        })
+        return
 
-def validate_token(token):
-    """Manually validate JWT token"""
-    try:
-        decoded_token = decode_token(token)
-        return decoded_token['sub']
-    except Exception as e:
-        print(f"Token validation error: {e}")
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            with span('db.insert chat_messages', **{'db.statement': 'INSERT chat_messages'}):
+                cursor.execute("""
+                    INSERT INTO chat_messages (user_id, conversation_id, user_message, bot_response, files_info, created_at) 
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, (user_id, conversation_id, user_message, bot_response, json.dumps(file_info), created_at))
+                conn.commit()
+            message_id = cursor.lastrowid
+        finally:
+            cursor.close()
+
+    on_message_saved(user_id, {
+        'id': message_id,
+        'user_message': user_message,
+        'bot_response': bot_response,
+        'files_info': file_info,
+        'created_at': created_at
+    })
+
+def client_ip():
+    """Client address for per-IP limits.
+
+    Behind RATE_LIMIT_TRUSTED_PROXY_HOPS proxies that each append to X-Forwarded-For,
+    the client is the entry the outermost of them added, counted from the right;
+    entries further left were sent by the client and cannot be trusted.
+    """
+    hops = Config.RATE_LIMIT_TRUSTED_PROXY_HOPS
+    if hops and 'X-Forwarded-For' in request.headers:
+        route = request.access_route
+        if len(route) >= hops:
+            return route[-hops]
+    return request.remote_addr
+
+def rate_limit_response(user_id, cost):
+    """Return a 429 response if the caller is over quota, otherwise None."""
+    retry_after = rate_limiter.check(user_id, client_ip(), cost)
+    if retry_after is None:
         return None
-
-def process_docx_with_gemini(docx_path, user_message):
+    response = jsonify({"error": "Rate limit exceeded. Please try again later.", "retry_after": retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+OFFICE_DOCUMENT_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+
+def _docx_main_part(package):
+    """Name of the main document part, from the package relationships"""
+    root = ElementTree.fromstring(package.read('_rels/.rels'))
+    for rel in root:
+        if rel.get('Type') == OFFICE_DOCUMENT_REL:
+            return posixpath.normpath(rel.get('Target').lstrip('/'))
+    return 'word/document.xml'
+
+def _docx_paragraph_text(paragraph):
+    parts = []
+    for element in paragraph.iter():
+        if element.tag == W_NS + 't':
+            parts.append(element.text or '')
+        elif element.tag == W_NS + 'tab':
+            parts.append('\t')
+        elif element.tag in (W_NS + 'br', W_NS + 'cr'):
+            parts.append('\n')
+    return ''.join(parts)
+
+def extract_docx_text(upload):
+    """Extract paragraph and table text from an uploaded DOCX file
+
+    Only the main document part is read, streamed and parsed one block at a
+    time; embedded images and other media are never loaded.
+    """
+    paragraphs = []
+    cells = []
+    depth = 0
+    with upload.open() as docx_file, zipfile.ZipFile(docx_file) as package, \
+            package.open(_docx_main_part(package)) as xml:
+        for event, element in ElementTree.iterparse(xml, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 2:  # only top-level blocks: <w:document><w:body><block>
+                continue
+            if element.tag == W_NS + 'p':
+                text = _docx_paragraph_text(element).strip()
+                if text:
+                    paragraphs.append(text)
+            elif element.tag == W_NS + 'tbl':
+                for row in element.findall(W_NS + 'tr'):
+                    for cell in row.findall(W_NS + 'tc'):
+                        text = '\n'.join(_docx_paragraph_text(p) for p in cell.findall(W_NS + 'p')).strip()
+                        if text:
+                            cells.append(text)
+            element.clear()
+
+    # Paragraphs first, then table cells
+    return '\n'.join(paragraphs + cells)
+
+def extract_txt_text(upload):
+    """Decode an uploaded text file, trying common encodings; None if none of them fit"""
+    encodings = ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252', 'iso-8859-1']
+    
+    with upload.view() as data:
+        for encoding in encodings:
+            try:
+                # Decodes straight from the spooled buffer, no intermediate bytes copy
+                extracted_text = str(data, encoding)
+                logger.debug("Text file decoded", extra={'encoding': encoding})
+                return extracted_text
+            except (UnicodeDecodeError, UnicodeError):
+                continue
+    return None
+
+def extract_text_cached(upload, kind, extractor):
+    """Return extracted text for an upload, reusing earlier extractions of identical bytes"""
+    sha256 = upload.sha256
+    cached = extraction_cache.get(kind, sha256)
+    if cached is not None:
+        logger.debug("Extraction cache hit", extra={'kind': kind, 'sha256': sha256[:12]})
+        return cached['text']
+
+    with span('extract', kind=kind, bytes=upload.size):
+        extracted_text = extractor(upload)
+    if extracted_text is not None:
+        extraction_cache.set(kind, sha256, {'text': extracted_text})
+    return extracted_text
+
+def get_or_upload_gemini_file(upload):
+    """Reuse the Gemini file for identical PDF bytes while the remote copy is still alive.
+
+    Returns (uploaded_file, cached): cached files must outlive the request,
+    so callers only delete uploads that did not go into the cache.
+    """
+    sha256 = upload.sha256 if extraction_cache.enabled else None
+    cached = extraction_cache.get('gemini_file', sha256) if sha256 else None
+    if cached is not None:
+        try:
+            uploaded_file = get_file(cached['name'])
+            if uploaded_file.state.name in ("ACTIVE", "PROCESSING"):
+                logger.debug("Reusing Gemini file", extra={'gemini_file': cached['name']})
+                return uploaded_file, True
+        except LLMUnavailable:
+            raise
+        except Exception as e:
+            logger.debug("Cached Gemini file unavailable: %s", e)
+        extraction_cache.delete('gemini_file', sha256)
+
+    if upload.in_memory:
+        with upload.open() as pdf_file:
+            uploaded_file = upload_file(pdf_file, mime_type='application/pdf')
+    else:
+        uploaded_file = upload_file(upload.path, mime_type='application/pdf')
+    if sha256:
+        extraction_cache.set('gemini_file', sha256, {'name': uploaded_file.name},
+                             ttl=Config.GEMINI_FILE_CACHE_TTL)
+    return uploaded_file, bool(sha256)
+
+@traced('process_docx')
+def process_docx_with_gemini(upload, user_message):
     """Process DOCX using Gemini AI for question answering"""
     try:
-        print(f"DEBUG: Processing DOCX file: {docx_path}")
-        
-        # Check if file exists
-        if not os.path.exists(docx_path):
-            print(f"ERROR: File does not exist: {docx_path}")
-            return "The uploaded file could not be found."
+        logger.debug("Processing DOCX file", extra={'bytes': upload.size})
         
-        # Extract text from DOCX
-        doc = docx.Document(docx_path)
-        full_text = []
-        
-        # Extract text from paragraphs
-        for para in doc.paragraphs:
-            if para.text.strip():
-                full_text.append(para.text.strip())
-        
-        # Extract text from tables
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    if cell.text.strip():
-                        full_text.append(cell.text.strip())
-        
-        extracted_text = '\n'.join(full_text)
-        print(f"DEBUG: Extracted text length: {len(extracted_text)}")
-        print(f"DEBUG: First 200 chars: {extracted_text[:200]}")
+        extracted_text = extract_text_cached(upload, 'docx', extract_docx_text)
+        logger.debug("Text extracted", extra={'text_chars': len(extracted_text)})
         
         if not extracted_text.strip():
             return "The document appears to be empty or contains no readable text."
         
-        # Limit text length for API
-        if len(extracted_text) > 8000:
-            extracted_text = extracted_text[:8000] + "\n[Document truncated due to length...]"
+        # Send only the sections relevant to the question for long documents
+        extracted_text = select_relevant_text(extracted_text, user_message)
         
         # Use Gemini to answer based on document content
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = get_model()
         prompt = f"""Based on the following document content, please answer the user's question:
 
 DOCUMENT CONTENT:
@@ -114,53 +361,36 @@ USER QUESTION: {user_message}
 
 Please provide a detailed answer based on the document content. If the information is not available in the document, please state that clearly."""
         
-        print(f"DEBUG: Sending to Gemini with prompt length: {len(prompt)}")
+        logger.debug("Sending document prompt", extra={'prompt_chars': len(prompt)})
         response = model.generate_content(prompt)
-        print(f"DEBUG: Received Gemini response: {response.text[:100]}...")
         return response.text
         
+    except LLMUnavailable:
+        raise  # shed or failed model calls surface as 503, never as a saved answer
     except Exception as e:
-        print(f"ERROR processing DOCX: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Failed to process DOCX file")
         return f"Error processing DOCX file: {str(e)}"
 
-def process_txt_with_gemini(txt_path, user_message):
+@traced('process_txt')
+def process_txt_with_gemini(upload, user_message):
     """Process TXT using Gemini AI for question answering"""
     try:
-        print(f"DEBUG: Processing TXT file: {txt_path}")
+        logger.debug("Processing TXT file", extra={'bytes': upload.size})
         
-        # Check if file exists
-        if not os.path.exists(txt_path):
-            print(f"ERROR: File does not exist: {txt_path}")
-            return "The uploaded file could not be found."
-        
-        # Try different encodings
-        extracted_text = None
-        encodings = ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252', 'iso-8859-1']
-        
-        for encoding in encodings:
-            try:
-                with open(txt_path, 'r', encoding=encoding) as f:
-                    extracted_text = f.read()
-                print(f"DEBUG: Successfully read file with {encoding} encoding")
-                break
-            except (UnicodeDecodeError, UnicodeError):
-                continue
+        extracted_text = extract_text_cached(upload, 'txt', extract_txt_text)
         
         if extracted_text is None:
             return "Could not read the text file due to encoding issues."
         
-        print(f"DEBUG: Extracted text length: {len(extracted_text)}")
-        print(f"DEBUG: First 200 chars: {extracted_text[:200]}")
+        logger.debug("Text extracted", extra={'text_chars': len(extracted_text)})
         
         if not extracted_text.strip():
             return "The text file appears to be empty."
         
-        # Limit text length
-        if len(extracted_text) > 8000:
-            extracted_text = extracted_text[:8000] + "\n[Document truncated due to length...]"
+        # Send only the sections relevant to the question for long documents
+        extracted_text = select_relevant_text(extracted_text, user_message)
         
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = get_model()
         prompt = f"""Based on the following document content, please answer the user's question:
 
 DOCUMENT CONTENT:
@@ -170,39 +400,42 @@ USER QUESTION: {user_message}
 
 Please provide a detailed answer based on the document content. If the information is not available in the document, please state that clearly."""
         
-        print(f"DEBUG: Sending to Gemini with prompt length: {len(prompt)}")
+        logger.debug("Sending document prompt", extra={'prompt_chars': len(prompt)})
         response = model.generate_content(prompt)
-        print(f"DEBUG: Received Gemini response: {response.text[:100]}...")
         return response.text
         
+    except LLMUnavailable:
+        raise  # shed or failed model calls surface as 503, never as a saved answer
     except Exception as e:
-        print(f"ERROR processing TXT: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Failed to process TXT file")
         return f"Error processing text file: {str(e)}"
 
-def process_image_with_gemini(image_path, user_message):
+@traced('process_image')
+def process_image_with_gemini(upload, user_message):
     """Process image using Gemini Vision API"""
     try:
-        print(f"DEBUG: Processing image file: {image_path}")
+        logger.debug("Processing image file", extra={'bytes': upload.size})
         
-        if not os.path.exists(image_path):
-            return "The uploaded image could not be found."
-            
-        # Read and encode image
-        with open(image_path, 'rb') as image_file:
-            image_data = image_file.read()
-
-        # Get mime type
-        mime_type, _ = mimetypes.guess_type(image_path)
-        if not mime_type or not mime_type.startswith('image/'):
+        # Downscale and re-encode before upload; send the file as-is only if it cannot be decoded
+        try:
+            with upload.open() as image_file, span('image.prepare', bytes=upload.size):
+                image_data, mime_type, image_info = prepare_image(image_file)
+            logger.debug("Image prepared", extra={
+                'original_dimensions': image_info['original_dimensions'], 'original_bytes': upload.size,
+                'dimensions': image_info['dimensions'], 'bytes': image_info['bytes']})
+        except (OSError, ValueError) as prep_error:
+            logger.warning("Image preprocessing failed, sending original: %s", prep_error)
+            with upload.view() as data:
+                image_data = bytes(data)
             mime_type = 'image/jpeg'  # Default fallback
 
         # Use Gemini to analyze image
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = get_model()
 
+        # Raw bytes go straight into the request; no base64 round trip
         image_part = {
             "mime_type": mime_type,
-            "data": base64.b64encode(image_data).decode()
+            "data": image_data
         }
 
         prompt = f"User question: {user_message}\n\nPlease analyze this image and provide a detailed response to the user's question."
@@ -210,65 +443,232 @@ def process_image_with_gemini(image_path, user_message):
         response = model.generate_content([prompt, {"inline_data": image_part}])
         return response.text
         
+    except LLMUnavailable:
+        raise  # shed or failed model calls surface as 503, never as a saved answer
     except Exception as e:
-        print(f"ERROR processing image: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Failed to process image file")
         return f"Error processing image: {str(e)}"
 
-def process_pdf_with_gemini(pdf_path, user_message):
+@traced('process_pdf')
+def process_pdf_with_gemini(upload, user_message):
     """Process PDF using Gemini"""
     try:
-        print(f"DEBUG: Processing PDF file: {pdf_path}")
-        
-        if not os.path.exists(pdf_path):
-            return "The uploaded PDF could not be found."
-            
-        # Upload PDF to Gemini Files API
-        uploaded_file = genai.upload_file(pdf_path)
-
-        # Wait for file to be processed
-        import time
-        max_wait_time = 60  # Maximum wait time in seconds
-        wait_time = 0
+        logger.debug("Processing PDF file", extra={'bytes': upload.size})
         
-        while uploaded_file.state.name == "PROCESSING" and wait_time < max_wait_time:
-            print(f"Processing PDF... ({wait_time}s)")
-            time.sleep(2)
-            wait_time += 2
-            uploaded_file = genai.get_file(uploaded_file.name)
+        # Upload PDF to Gemini Files API (or reuse an earlier upload of the same bytes)
+        uploaded_file, cached = get_or_upload_gemini_file(upload)
+
+        # Wait for file to be processed, backing off between polls
+        deadline = time.monotonic() + Config.PDF_PROCESSING_TIMEOUT
+        poll_interval = 0.5
+
+        with span('pdf.poll', cached=cached) as poll_span:
+            polls = 0
+            while uploaded_file.state.name == "PROCESSING":
+                if time.monotonic() >= deadline:
+                    raise LLMUnavailable("PDF processing timed out. Please try again later or with a smaller file.")
+                logger.debug("PDF still processing", extra={'next_check_s': poll_interval})
+                time.sleep(poll_interval)
+                poll_interval = min(poll_interval * 2, 5)
+                uploaded_file = get_file(uploaded_file.name)
+                polls += 1
+            poll_span.set_attribute('polls', polls)
+            poll_span.set_attribute('state', uploaded_file.state.name)
 
         if uploaded_file.state.name == "FAILED":
+            if cached:
+                extraction_cache.delete('gemini_file', upload.sha256)
             return "Failed to process PDF file."
-            
-        if wait_time >= max_wait_time:
-            return "PDF processing timed out. Please try with a smaller file."
 
         # Generate content using the uploaded file
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = get_model()
         prompt = f"User question: {user_message}\n\nPlease analyze this PDF document and provide a detailed response based on its content."
 
         response = model.generate_content([uploaded_file, prompt])
 
-        # Clean up uploaded file
-        try:
-            genai.delete_file(uploaded_file.name)
-        except:
-            pass  # Ignore cleanup errors
+        # Clean up uploaded file unless it is cached for follow-up questions;
+        # Gemini expires it on its own, so a failed delete must not cost the answer
+        if not cached:
+            try:
+                delete_file(uploaded_file.name)
+            except Exception as e:
+                logger.warning("Could not delete Gemini file %s: %s", uploaded_file.name, e)
 
         return response.text
         
+    except LLMUnavailable:
+        raise  # shed or failed model calls surface as 503, never as a saved answer
     except Exception as e:
-        print(f"ERROR processing PDF: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Failed to process PDF file")
         return f"Error processing PDF: {str(e)}"
 
+# Extension -> (processor, reply heading, prompt used when no message was sent)
+FILE_PROCESSORS = {
+    'pdf': (process_pdf_with_gemini, "PDF Analysis", "Please summarize this document."),
+    'png': (process_image_with_gemini, "Image Analysis", "Please describe this image."),
+    'jpg': (process_image_with_gemini, "Image Analysis", "Please describe this image."),
+    'jpeg': (process_image_with_gemini, "Image Analysis", "Please describe this image."),
+    'gif': (process_image_with_gemini, "Image Analysis", "Please describe this image."),
+    'docx': (process_docx_with_gemini, "DOCX Analysis", "Please summarize this document."),
+    'txt': (process_txt_with_gemini, "TXT Analysis", "Please summarize this document."),
+}
+
+def process_saved_file(upload, file_extension, user_message):
+    """Run the processor for one spooled upload, then release it.
+
+    Cleanup happens here rather than in the caller so the upload is only
+    released once the worker thread is done with it, even after a timeout.
+    """
+    try:
+        if file_extension not in FILE_PROCESSORS:
+            return None
+        processor, _, default_prompt = FILE_PROCESSORS[file_extension]
+        return processor(upload, user_message or default_prompt)
+    finally:
+        upload.release()
+
+def process_files_concurrently(saved_files, user_message):
+    """Process saved uploads on the file pool; results keep upload order.
+
+    At most FILE_PROCESSING_CONCURRENCY files of one request run at once, and
+    each gets FILE_PROCESSING_TIMEOUT seconds from when a pool thread picks it
+    up; a file that runs out of time fails the whole request with
+    LLMUnavailable rather than being answered with a timeout notice.
+    """
+    timeout = Config.FILE_PROCESSING_TIMEOUT
+    # Uploads of files not yet submitted, or dropped before a thread picked them up,
+    # are released here; a file that started releases its own (process_saved_file)
+    pending = deque(saved_files)
+    tasks = []
+    results = []
+    try:
+        while pending:
+            tasks = []
+            while pending and len(tasks) < Config.FILE_PROCESSING_CONCURRENCY:
+                filename, upload, file_extension = pending[0]
+                task = file_workers.submit(process_saved_file, upload, file_extension, user_message)
+                pending.popleft()
+                tasks.append((filename, upload, file_extension, task))
+
+            for filename, _, file_extension, task in tasks:
+                try:
+                    response = task.result(timeout)
+                except TimeoutError:
+                    metrics.file_processing_duration.observe(timeout, file_extension)
+                    raise LLMUnavailable(f"Processing {filename} timed out after {timeout} seconds. Please try again.")
+                elapsed = task.finished_at - task.started_at
+                metrics.file_processing_duration.observe(elapsed, file_extension)
+                latency_ms = round(elapsed * 1000, 1)
+                logger.debug("File processed", extra={'file_type': file_extension, 'latency_ms': latency_ms})
+                results.append((response, {
+                    "filename": filename,
+                    "type": file_extension,
+                    "processed": True,
+                    "latency_ms": latency_ms
+                }))
+    except BaseException:
+        for _, upload, _, task in tasks:
+            if task.cancel():
+                upload.release()
+        for _, upload, _ in pending:
+            upload.release()
+        raise
+    return results
+
+def build_file_reply(results):
+    """Join per-file answers under their headings; returns (reply, files_info)."""
+    bot_response = ""
+    file_info = []
+    for response, info in results:
+        if info["type"] in FILE_PROCESSORS:
+            heading = FILE_PROCESSORS[info["type"]][1]
+            bot_response += f"{heading}:\n{response}\n\n"
+        file_info.append(info)
+    return bot_response, file_info
+
+def summarize_turns(previous_summary, turns):
+    """Fold older conversation turns into the running summary."""
+    model = get_model()
+    prompt = f"""Update the summary of a conversation between a user and an assistant.
+
+CURRENT SUMMARY:
+{previous_summary or '(none)'}
+
+NEW TURNS:
+{chr(10).join(turns)}
+
+Write the updated summary in at most {Config.CONTEXT_SUMMARY_WORDS} words. Keep names, facts, decisions and open questions; drop pleasantries."""
+    return model.generate_content(prompt).text.strip()
+
+def resolve_conversation(user_id, conversation_id, title):
+    """Return the caller's conversation row, starting a new one when no id is given.
+
+    Returns None if the id does not belong to the user.
+    """
+    if conversation_id:
+        try:
+            return get_conversation(int(conversation_id), user_id)
+        except ValueError:
+            return None
+    new_id = create_conversation(user_id, title or "New conversation")
+    return {"id": new_id, "title": title, "summary": None, "summary_upto_id": None}
+
+def run_chat_job(user_id, user_message, saved_files, conversation_id=None):
+    """Background job body: process the request's attachments, then persist the exchange."""
+    results = process_files_concurrently(saved_files, user_message)
+    bot_response, file_info = build_file_reply(results)
+    if not bot_response:
+        bot_response = "I couldn't process your request. Please try again."
+    save_chat_message(user_id, user_message, bot_response, file_info, conversation_id)
+    return bot_response, file_info
+
 # --- ROUTES ---
 @app.route('/')
 def index():
     return jsonify({"message": "AI Chatbot Backend with File Processing", "status": "running"})
 
+@app.route('/health/db')
+def db_health():
+    return jsonify({"pool": get_pool().stats(), "chat_writer": message_writer.snapshot()})
+
+@app.route('/health/cache')
+def cache_health():
+    return jsonify({
+        "response_cache": response_cache.snapshot(),
+        "extraction_cache": dict(extraction_cache.stats),
+        "auth_token_cache": token_cache.snapshot(),
+        "session_cache": session_cache.snapshot()
+    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape target: request, file processing, Gemini and DB timings of this worker."""
+    if not Config.METRICS_ENABLED:
+        return jsonify({"error": "Not found"}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/health/logging')
+def logging_health():
+    """Log records waiting in the queue and records dropped because it was full; same for trace spans."""
+    return jsonify(dict(logging_stats(), tracing=tracing.tracing_stats()))
+
+@app.route('/health/llm')
+def llm_health():
+    """Outbound Gemini calls: adaptive limit, in-flight and queued calls, sheds, retries and breaker state."""
+    return jsonify(limiter_snapshot())
+
+def overloaded_response(error):
+    response = jsonify({"error": str(error), "retry_after": error.retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
 @app.route('/register', methods=['POST'])
 def register():
+    limited = rate_limit_response(None, Config.RATE_LIMIT_COST_AUTH)
+    if limited:
+        return limited
+
     data = request.get_json()
     username = data.get('username')
     password = data.get('password')
@@ -280,26 +680,45 @@ def register():
     if len(password) < 6:
         return jsonify({"msg": "Password must be at least 6 characters"}), 400
 
-    password_hash = sha256.hash(password)
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute(
-            "INSERT INTO users (username, password_hash, email, created_at) VALUES (%s, %s, %s, %s)",
-            (username, password_hash, email, datetime.now())
-        )
-        conn.commit()
-    except mysql.connector.IntegrityError:
-        return jsonify({"msg": "Username already exists"}), 409
-    finally:
-        cursor.close()
-        conn.close()
+        password_hash = hash_password(password)
+    except PasswordHashingBusy as e:
+        return overloaded_response(e)
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "INSERT INTO users (username, password_hash, email, created_at) VALUES (%s, %s, %s, %s)",
+                (username, password_hash, email, datetime.now())
+            )
+            conn.commit()
+        except mysql.connector.IntegrityError:
+            return jsonify({"msg": "Username already exists"}), 409
+        finally:
+            cursor.close()
 
     return jsonify({"msg": "User created successfully"}), 201
 
+def rehash_password(user_id, new_hash):
+    """Store a hash made with the current PASSWORD_SCHEME/PASSWORD_ROUNDS; the login succeeds either way."""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("UPDATE users SET password_hash = %s WHERE id = %s", (new_hash, user_id))
+                conn.commit()
+            finally:
+                cursor.close()
+    except Exception:
+        logger.exception("Failed to store upgraded password hash", extra={'user_id': user_id})
+
 @app.route('/login', methods=['POST'])
 def login():
+    limited = rate_limit_response(None, Config.RATE_LIMIT_COST_AUTH)
+    if limited:
+        return limited
+
     data = request.get_json()
     username = data.get('username')
     password = data.get('password')
@@ -307,17 +726,30 @@ def login():
     if not username or not password:
         return jsonify({"msg": "Username and password required"}), 400
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
-    user = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
+            user = cursor.fetchone()
+        finally:
+            cursor.close()
+
+    if not user:
+        return jsonify({"msg": "Invalid credentials"}), 401
 
-    if user and sha256.verify(password, user['password_hash']):
-        access_token = create_access_token(identity=str(user['id']))
+    try:
+        verified, new_hash = verify_password(password, user['password_hash'])
+    except PasswordHashingBusy as e:
+        return overloaded_response(e)
+
+    if verified:
+        if new_hash:
+            rehash_password(user['id'], new_hash)
+        session_id, refresh_token = create_session(user['id'])
+        access_token = create_access_token(identity=str(user['id']), additional_claims={'sid': session_id})
         return jsonify({
             "access_token": access_token,
+            "refresh_token": refresh_token,
             "user": {
                 "id": user['id'],
                 "username": user['username'],
@@ -327,190 +759,350 @@ def login():
 
     return jsonify({"msg": "Invalid credentials"}), 401
 
+@app.route('/refresh', methods=['POST'])
+def refresh():
+    limited = rate_limit_response(None, Config.RATE_LIMIT_COST_AUTH)
+    if limited:
+        return limited
+
+    data = request.get_json(silent=True) or {}
+    refresh_token = data.get('refresh_token')
+    if not refresh_token:
+        return jsonify({"msg": "Refresh token required"}), 400
+
+    refreshed = refresh_session(refresh_token)
+    if not refreshed:
+        return jsonify({"msg": "Invalid or expired refresh token"}), 401
+
+    session_id, user_id, new_refresh_token = refreshed
+    access_token = create_access_token(identity=str(user_id), additional_claims={'sid': session_id})
+    return jsonify({"access_token": access_token, "refresh_token": new_refresh_token})
+
+@app.route('/logout', methods=['POST'])
+@require_auth
+def logout():
+    if g.session_id is not None:
+        revoke_session(g.session_id, g.user_id)
+    return jsonify({"msg": "Logged out"})
+
 @app.route('/chat', methods=['POST'])
+@require_auth
+@traced('chat')
 def chat():
-    # Token validation
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return jsonify({"error": "Authorization header missing"}), 401
-
-    token = auth_header.split(' ')[1]
-    current_user_id = validate_token(token)
-    if not current_user_id:
-        return jsonify({"error": "Invalid token"}), 401
+    current_user_id = g.user_id
 
     # Get form data
     user_message = request.form.get('message', '')
     files = request.files.getlist('files')
 
-    print(f"DEBUG: Received message: '{user_message}'")
-    print(f"DEBUG: Received {len(files)} files")
+    logger.debug("Chat request", extra={'message_chars': len(user_message), 'files': len(files)})
 
     if not user_message and not files:
         return jsonify({"error": "Message or files required"}), 400
 
+    extensions = [file.filename.rsplit('.', 1)[1].lower() for file in files
+                  if file and allowed_file(file.filename)]
+    limited = rate_limit_response(current_user_id, request_cost(extensions))
+    if limited:
+        return limited
+
     try:
         bot_response = ""
         file_info = []
 
-        # Process uploaded files
+        title = user_message or next((file.filename for file in files if file), "")
+        conversation = resolve_conversation(current_user_id, request.form.get('conversation_id'), title)
+        if not conversation:
+            return jsonify({"error": "Conversation not found"}), 404
+        conversation_id = conversation['id']
+
+        # Uploads were spooled (and hashed) while the request was parsed; process them concurrently
+        saved_files = []
         for file in files:
             if file and allowed_file(file.filename):
                 filename = secure_filename(file.filename)
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 filename = f"{timestamp}_{filename}"
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
+                upload = file.stream
+                # Processing may outlive the request (timeouts, background jobs)
+                upload.retain()
 
-                print(f"DEBUG: File saved to: {file_path}")
-                print(f"DEBUG: File exists: {os.path.exists(file_path)}")
-                if os.path.exists(file_path):
-                    print(f"DEBUG: File size: {os.path.getsize(file_path)} bytes")
+                logger.debug("File spooled", extra={'in_memory': upload.in_memory, 'bytes': upload.size})
 
                 file_extension = filename.rsplit('.', 1)[1].lower()
-                print(f"DEBUG: Processing file extension: {file_extension}")
-
-                if file_extension == 'pdf':
-                    print("DEBUG: Entering PDF processing")
-                    if user_message:
-                        response = process_pdf_with_gemini(file_path, user_message)
-                    else:
-                        response = process_pdf_with_gemini(file_path, "Please summarize this document.")
-                    bot_response += f"PDF Analysis:\n{response}\n\n"
-
-                elif file_extension in ['png', 'jpg', 'jpeg', 'gif']:
-                    print("DEBUG: Entering Image processing")
-                    if user_message:
-                        response = process_image_with_gemini(file_path, user_message)
-                    else:
-                        response = process_image_with_gemini(file_path, "Please describe this image.")
-                    bot_response += f"Image Analysis:\n{response}\n\n"
-
-                elif file_extension == 'docx':
-                    print("DEBUG: Entering DOCX processing")
-                    if user_message:
-                        response = process_docx_with_gemini(file_path, user_message)
-                    else:
-                        response = process_docx_with_gemini(file_path, "Please summarize this document.")
-                    bot_response += f"DOCX Analysis:\n{response}\n\n"
-
-                elif file_extension == 'txt':
-                    print("DEBUG: Entering TXT processing")
-                    if user_message:
-                        response = process_txt_with_gemini(file_path, user_message)
-                    else:
-                        response = process_txt_with_gemini(file_path, "Please summarize this document.")
-                    bot_response += f"TXT Analysis:\n{response}\n\n"
-
-                file_info.append({
-                    "filename": filename,
-                    "type": file_extension,
-                    "processed": True
-                })
+                metrics.upload_size.observe(upload.size, file_extension)
+                saved_files.append((filename, upload, file_extension))
 
-                # Clean up file after processing
-                try:
-                    os.remove(file_path)
-                    print(f"DEBUG: File {file_path} cleaned up")
-                except Exception as cleanup_error:
-                    print(f"DEBUG: Could not cleanup file: {cleanup_error}")
+        # PDFs can take a minute to ingest: hand the request to the job pool
+        if Config.PDF_BACKGROUND_JOBS and any(saved[2] == 'pdf' for saved in saved_files):
+            pending_info = [{"filename": filename, "type": file_extension, "processed": False}
+                            for filename, _, file_extension in saved_files]
+            try:
+                job_id = create_job(current_user_id, user_message, pending_info)
+            except Exception:
+                for _, upload, _ in saved_files:
+                    upload.release()
+                raise
+            submit_job(job_id, run_chat_job, current_user_id, user_message, saved_files, conversation_id)
+            return jsonify({
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/jobs/{job_id}",
+                "conversation_id": conversation_id
+            }), 202
+
+        results = process_files_concurrently(saved_files, user_message)
+        bot_response, file_info = build_file_reply(results)
 
         # If no files, just process text message
+        needs_summary = False
         if not files and user_message:
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            response = model.generate_content(user_message)
-            bot_response = response.text
+            context, needs_summary = build_context(conversation)
+            # Replies that depend on earlier turns are not reusable, so only the
+            # first message of a conversation goes through the response cache
+            cached_reply, embedding = (None, None)
+            if not context:
+                cached_reply, embedding = response_cache.get(user_message, current_user_id)
+            if cached_reply is not None:
+                logger.debug("Response cache hit")
+                bot_response = cached_reply
+            else:
+                model = get_model()
+                response = model.generate_content(with_context(context, user_message))
+                bot_response = response.text
+                if not context:
+                    response_cache.set(user_message, current_user_id, bot_response, embedding)
 
         if not bot_response:
             bot_response = "I couldn't process your request. Please try again."
 
-        print(f"DEBUG: Final bot response length: {len(bot_response)}")
+        logger.debug("Chat reply ready", extra={'reply_chars': len(bot_response)})
 
         # Store chat in database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO chat_messages (user_id, user_message, bot_response, files_info, created_at) 
-            VALUES (%s, %s, %s, %s, %s)
-        """, (current_user_id, user_message, bot_response, json.dumps(file_info), datetime.now()))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        save_chat_message(current_user_id, user_message, bot_response, file_info, conversation_id)
+        if needs_summary:
+            schedule_summary(conversation_id, current_user_id, summarize_turns)
 
         return jsonify({
             "reply": bot_response,
-            "files_processed": len(file_info)
+            "files_processed": len(file_info),
+            "files": file_info,
+            "conversation_id": conversation_id
         })
 
+    except (LLMUnavailable, ChatWriterBusy, FileProcessingBusy) as e:
+        logger.warning("Chat request not answered: %s", e)
+        return overloaded_response(e)
     except Exception as e:
-        print(f"ERROR in chat endpoint: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Chat request failed")
         return jsonify({"error": f"Failed to process request: {str(e)}"}), 500
 
+@app.route('/chat/stream', methods=['POST'])
+@require_auth
+@traced('chat_stream')
+def chat_stream():
+    current_user_id = g.user_id
+
+    if request.files:
+        return jsonify({"error": "Streaming supports text messages only; send files to /chat"}), 400
+
+    payload = request.get_json(silent=True) or {}
+    user_message = request.form.get('message') or payload.get('message', '')
+    if not user_message:
+        return jsonify({"error": "Message required"}), 400
+
+    limited = rate_limit_response(current_user_id, request_cost())
+    if limited:
+        return limited
+
+    conversation = resolve_conversation(
+        current_user_id,
+        request.form.get('conversation_id') or payload.get('conversation_id'),
+        user_message
+    )
+    if not conversation:
+        return jsonify({"error": "Conversation not found"}), 404
+    conversation_id = conversation['id']
+
+    # Start generation before the 200 goes out, so a shed call can still answer 503
+    try:
+        context, needs_summary = build_context(conversation)
+        cached_reply, embedding = response_cache.get(user_message, current_user_id) if not context else (None, None)
+        response = None
+        if cached_reply is None:
+            model = get_model()
+            response = model.generate_content(with_context(context, user_message), stream=True)
+    except LLMUnavailable as e:
+        logger.warning("Chat stream not answered: %s", e)
+        return overloaded_response(e)
+    except Exception as e:
+        logger.exception("Chat stream failed")
+        return jsonify({"error": f"Failed to process request: {str(e)}"}), 500
+
+    def generate():
+        chunks = []
+        try:
+            if cached_reply is not None:
+                chunks.append(cached_reply)
+                yield sse_event({"text": cached_reply}, event="chunk")
+            else:
+                for text in iter_text_chunks(response):
+                    chunks.append(text)
+                    yield sse_event({"text": text}, event="chunk")
+                if chunks and not context:
+                    response_cache.set(user_message, current_user_id, ''.join(chunks), embedding)
+
+            bot_response = ''.join(chunks) or "I couldn't process your request. Please try again."
+            save_chat_message(current_user_id, user_message, bot_response, [], conversation_id)
+            if needs_summary:
+                schedule_summary(conversation_id, current_user_id, summarize_turns)
+            yield sse_event({"reply": bot_response, "files_processed": 0,
+                             "conversation_id": conversation_id}, event="done")
+
+        except Exception as e:
+            logger.exception("Chat stream failed")
+            yield sse_event({"error": f"Failed to process request: {str(e)}"}, event="error")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@require_auth
+def job_status(job_id):
+    current_user_id = g.user_id
+
+    job = get_job(job_id, current_user_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+@require_auth
+def job_events(job_id):
+    current_user_id = g.user_id
+
+    job = get_job(job_id, current_user_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    def generate(job):
+        deadline = time.monotonic() + Config.JOB_EVENTS_MAX_DURATION
+        last_status = None
+        while True:
+            if job['status'] != last_status:
+                last_status = job['status']
+                event = job['status'] if job['status'] in TERMINAL_STATUSES else "status"
+                yield sse_event(job, event=event)
+            if job['status'] in TERMINAL_STATUSES or time.monotonic() >= deadline:
+                return
+            time.sleep(Config.JOB_EVENTS_POLL_INTERVAL)
+            job = get_job(job_id, current_user_id)
+
+    return Response(
+        stream_with_context(generate(job)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/history', methods=['GET'])
+@require_auth
 def get_history():
-    # Token validation
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return jsonify({"error": "Authorization header missing"}), 401
+    current_user_id = g.user_id
 
-    token = auth_header.split(' ')[1]
-    current_user_id = validate_token(token)
-    if not current_user_id:
-        return jsonify({"error": "Invalid token"}), 401
+    message_type = request.args.get('type', 'all')
+    if message_type not in ('all', 'text', 'files'):
+        return jsonify({"error": "type must be one of: all, text, files"}), 400
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT id, user_message, bot_response, files_info, created_at 
-            FROM chat_messages 
-            WHERE user_id = %s 
-            ORDER BY created_at DESC 
-            LIMIT 50
-        """, (current_user_id,))
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    full = request.args.get('full', 'false').lower() in ('1', 'true')
+
+    try:
+        page = fetch_history_page(
+            current_user_id,
+            cursor=request.args.get('cursor'),
+            limit=limit,
+            message_type=message_type,
+            full=full
+        )
+        return jsonify(page)
 
-        messages = cursor.fetchall()
-        cursor.close()
-        conn.close()
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.exception("Failed to get history")
+        return jsonify({"error": "Failed to get history"}), 500
 
-        # Parse JSON fields and format dates
-        for message in messages:
-            message['files_info'] = json.loads(message['files_info'] or '[]')
-            message['created_at'] = message['created_at'].isoformat()
+@app.route('/history/search', methods=['GET'])
+@require_auth
+def search_history_messages():
+    current_user_id = g.user_id
 
-        return jsonify({"messages": messages})
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Search query (q) required"}), 400
 
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 50))
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        return jsonify({"error": "limit and offset must be integers"}), 400
+
+    try:
+        return jsonify(search_history(current_user_id, query, limit=limit, offset=offset))
     except Exception as e:
-        print(f"Error getting history: {e}")
-        return jsonify({"error": "Failed to get history"}), 500
+        logger.exception("Failed to search history")
+        return jsonify({"error": "Failed to search history"}), 500
+
+@app.route('/history/<int:message_id>', methods=['GET'])
+@require_auth
+def get_history_message(message_id):
+    current_user_id = g.user_id
+
+    try:
+        message = fetch_message(current_user_id, message_id)
+    except Exception as e:
+        logger.exception("Failed to get history message")
+        return jsonify({"error": "Failed to get message"}), 500
+
+    if not message:
+        return jsonify({"error": "Message not found"}), 404
+    return jsonify(message)
 
 @app.route('/clear-history', methods=['DELETE'])
+@require_auth
 def clear_history():
-    # Token validation
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return jsonify({"error": "Authorization header missing"}), 401
+    current_user_id = g.user_id
 
-    token = auth_header.split(' ')[1]
-    current_user_id = validate_token(token)
-    if not current_user_id:
-        return jsonify({"error": "Invalid token"}), 401
+    # Queued rows would otherwise be inserted after the DELETE and bring history back
+    if not message_writer.flush(timeout=Config.CHAT_WRITE_FLUSH_INTERVAL + 10):
+        return jsonify({"error": "Recent messages are still being saved. Please try again shortly."}), 503
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM chat_messages WHERE user_id = %s", (current_user_id,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("DELETE FROM chat_messages WHERE user_id = %s", (current_user_id,))
+                # Conversation summaries hold the same content, so they go too
+                cursor.execute("DELETE FROM conversations WHERE user_id = %s", (current_user_id,))
+                conn.commit()
+            finally:
+                cursor.close()
+        response_cache.invalidate_user(current_user_id)
+        on_history_cleared(current_user_id)
 
         return jsonify({"msg": "History cleared successfully"})
 
     except Exception as e:
-        print(f"Error clearing history: {e}")
+        logger.exception("Failed to clear history")
         return jsonify({"error": "Failed to clear history"}), 500
 
 if __name__ == '__main__':
+    # Local development server; production runs `gunicorn -c gunicorn.conf.py`
     port = int(os.environ.get("PORT", 5000))  # For Render deployment
-    app.run(host="0.0.0.0", port=port, debug=True)
+    app.run(host="0.0.0.0", port=port, debug=Config.DEBUG)
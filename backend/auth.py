@@ -0,0 +1,121 @@
+"""
+Bearer-token authentication for protected views
+
+@require_auth reads the Authorization header once, verifies the JWT and
+puts the user id on flask.g.user_id; views no longer parse headers
+themselves. Verified tokens are remembered in a bounded LRU keyed by their
+signature until they expire, so a client sending the same token on every
+request pays for HMAC verification and claim checks once per worker.
+Tokens issued for a login session (``sid`` claim) are also rejected once
+the session is revoked (see sessions.py).
+"""
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, jsonify, request
+from flask_jwt_extended import decode_token
+
+import sessions
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCache:
+    """Signature -> (signed header.payload, (user id, session id), exp) for tokens that verified."""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get(self, signing_input, signature):
+        if not self.max_entries:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(signature)
+            if entry is not None and entry[2] <= now:
+                del self._entries[signature]
+                entry = None
+            # The signature only vouches for the exact header.payload it was computed over
+            if entry is not None and entry[0] == signing_input:
+                self._entries.move_to_end(signature)
+                self.stats['hits'] += 1
+                return entry[1]
+            self.stats['misses'] += 1
+            return None
+
+    def set(self, signing_input, signature, identity, expires_at):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[signature] = (signing_input, identity, expires_at)
+            self._entries.move_to_end(signature)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def snapshot(self):
+        with self._lock:
+            total = self.stats['hits'] + self.stats['misses']
+            return dict(self.stats, entries=len(self._entries),
+                        hit_rate=round(self.stats['hits'] / total, 3) if total else 0.0)
+
+
+token_cache = TokenCache(Config.AUTH_TOKEN_CACHE_SIZE)
+
+
+def authenticate(token):
+    """Return (user id, session id or None) for a valid access token, otherwise None."""
+    signing_input, _, signature = token.rpartition('.')
+    if not signing_input or not signature:
+        return None
+    identity = token_cache.get(signing_input, signature)
+    if identity is not None:
+        return identity
+    try:
+        decoded_token = decode_token(token)
+    except Exception as e:
+        logger.debug("Token validation failed: %s", e)
+        return None
+    identity = (decoded_token['sub'], decoded_token.get('sid'))
+    if 'exp' in decoded_token:
+        token_cache.set(signing_input, signature, identity, decoded_token['exp'])
+    return identity
+
+
+def _authenticate_request():
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return jsonify({"error": "Authorization header missing"}), 401
+
+    identity = authenticate(auth_header[len('Bearer '):].strip())
+    if not identity:
+        return jsonify({"error": "Invalid token"}), 401
+    user_id, session_id = identity
+    if session_id is not None:
+        try:
+            active = sessions.is_active(session_id)
+        except Exception:
+            logger.exception("Session lookup failed")
+            return jsonify({"error": "Session store unavailable"}), 503
+        if not active:
+            return jsonify({"error": "Session has ended"}), 401
+    g.user_id = user_id
+    g.session_id = session_id
+    return None
+
+
+def require_auth(view):
+    """Reject requests without a valid bearer token; the view reads the caller from g.user_id."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        denied = _authenticate_request()
+        if denied:
+            return denied
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,53 @@
+"""
+Per-request cost of bearer-token authentication: full JWT verification vs cached
+
+Verifies the same access tokens CALLS times with flask_jwt_extended's
+decode_token (what every protected request did before) and with
+auth.authenticate, which verifies each token once and then answers from the
+signature cache. TOKENS distinct users share the cache, as concurrent
+clients would.
+
+    cd backend && python benchmarks/auth_overhead.py
+"""
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask_jwt_extended import JWTManager, create_access_token, decode_token  # noqa: E402
+
+import auth  # noqa: E402
+
+CALLS = 20000
+TOKENS = 100
+
+
+def per_call(func, tokens):
+    started = time.perf_counter()
+    for i in range(CALLS):
+        func(tokens[i % len(tokens)])
+    return (time.perf_counter() - started) / CALLS
+
+
+def main():
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'benchmark-secret-key-benchmark-secret-key'
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
+    JWTManager(app)
+
+    with app.app_context():
+        tokens = [create_access_token(identity=str(i)) for i in range(TOKENS)]
+        full = per_call(lambda token: decode_token(token)['sub'], tokens)
+        cached = per_call(auth.authenticate, tokens)
+
+    print(f"{CALLS} verifications over {TOKENS} tokens")
+    print(f"decode_token per request   {full * 1e6:7.1f} us")
+    print(f"cached authenticate        {cached * 1e6:7.1f} us  ({full / cached:.0f}x faster)")
+    print(f"cache: {auth.token_cache.snapshot()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Simulated overload: Gemini calls with and without the adaptive limiter
+
+The fake model behaves like an upstream with CAPACITY parallel slots:
+with more calls in flight than that, every call slows down proportionally
+(and past 3x capacity some fail with 503). CLIENTS threads call it in a
+loop for DURATION seconds, once ungoverned and once through
+AdaptiveLimiter; the script prints call latency percentiles, sheds and
+the limit the governor settled on.
+
+    cd backend && python benchmarks/concurrency_governor.py
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_gemini  # noqa: E402
+from concurrency import AdaptiveLimiter, Overloaded  # noqa: E402
+
+CAPACITY = 8
+BASE_LATENCY = 0.1
+CLIENTS = 48
+DURATION = 6.0
+
+_upstream_in_flight = 0
+_upstream_lock = threading.Lock()
+
+
+def slow_upstream_latency():
+    return BASE_LATENCY * max(1.0, _upstream_in_flight / CAPACITY)
+
+
+def call_upstream(model, prompt):
+    global _upstream_in_flight
+    with _upstream_lock:
+        _upstream_in_flight += 1
+        overloaded = _upstream_in_flight > 3 * CAPACITY
+    try:
+        if overloaded:
+            time.sleep(BASE_LATENCY)
+            raise fake_gemini.ServiceUnavailable("503 overloaded")
+        return model.generate_content(prompt)
+    finally:
+        with _upstream_lock:
+            _upstream_in_flight -= 1
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run(limiter):
+    model = fake_gemini.GenerativeModel()
+    latencies, outcomes = [], {'ok': 0, 'error': 0, 'shed': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + DURATION
+
+    def client():
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                if limiter:
+                    limiter.call(call_upstream, model, "hello")
+                else:
+                    call_upstream(model, "hello")
+                outcome = 'ok'
+            except Overloaded:
+                outcome = 'shed'
+                time.sleep(0.05)  # a real client would honour Retry-After
+            except fake_gemini.ServiceUnavailable:
+                outcome = 'error'
+            with lock:
+                outcomes[outcome] += 1
+                if outcome == 'ok':
+                    latencies.append(time.monotonic() - started)
+
+    threads = [threading.Thread(target=client) for _ in range(CLIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, outcomes
+
+
+def report(label, latencies, outcomes):
+    print(f"{label:12s} ok={outcomes['ok']:5d} errors={outcomes['error']:5d} shed={outcomes['shed']:5d}  "
+          f"p50={percentile(latencies, 0.5) * 1000:7.0f}ms  p95={percentile(latencies, 0.95) * 1000:7.0f}ms  "
+          f"p99={percentile(latencies, 0.99) * 1000:7.0f}ms")
+
+
+def main():
+    fake_gemini.latency = slow_upstream_latency
+    print(f"Upstream capacity {CAPACITY}, base latency {BASE_LATENCY * 1000:.0f}ms, "
+          f"{CLIENTS} clients for {DURATION:.0f}s")
+
+    report("ungoverned", *run(None))
+
+    limiter = AdaptiveLimiter(initial=CLIENTS, min_limit=1, max_limit=64, max_queue=CLIENTS,
+                              queue_timeout=0.5, latency_threshold=BASE_LATENCY * 1.5)
+    report("adaptive", *run(limiter))
+    stats = limiter.snapshot()
+    print(f"             limit settled at {stats['limit']} (started at {CLIENTS}), "
+          f"{stats['decreases']} decreases, {stats['shed_timeout'] + stats['shed_queue_full']} shed")
+
+
+if __name__ == '__main__':
+    main()
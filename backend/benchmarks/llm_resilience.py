@@ -0,0 +1,107 @@
+"""
+Simulated flaky upstream: Gemini calls with and without the call policy
+
+The fake model answers in BASE_LATENCY most of the time, takes
+SLOW_LATENCY on a SLOW_RATE fraction of calls (a long tail) and fails
+with 503 on ERROR_RATE of them. CALLS requests run from CLIENTS threads
+three times: bare, with retries only, and with retries plus hedging. The
+script prints how many requests got an answer and the latency
+percentiles of the answered ones.
+
+    cd backend && python benchmarks/llm_resilience.py
+"""
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_gemini  # noqa: E402
+from resilience import CallPolicy, CircuitBreaker, LLMUnavailable  # noqa: E402
+
+BASE_LATENCY = 0.05
+SLOW_LATENCY = 1.0
+SLOW_RATE = 0.03
+ERROR_RATE = 0.05
+CLIENTS = 16
+CALLS = 600
+
+
+def tail_latency():
+    return SLOW_LATENCY if random.random() < SLOW_RATE else BASE_LATENCY
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run(policy):
+    model = fake_gemini.GenerativeModel()
+    latencies, outcomes = [], {'ok': 0, 'failed': 0}
+    lock = threading.Lock()
+    remaining = [CALLS]
+
+    def attempt(timeout):
+        return model.generate_content("hello")
+
+    def client():
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            started = time.monotonic()
+            try:
+                if policy:
+                    policy.run(attempt, hedgeable=True)
+                else:
+                    attempt(None)
+                outcome = 'ok'
+            except (LLMUnavailable, fake_gemini.ServiceUnavailable):
+                outcome = 'failed'
+            with lock:
+                outcomes[outcome] += 1
+                if outcome == 'ok':
+                    latencies.append(time.monotonic() - started)
+
+    threads = [threading.Thread(target=client) for _ in range(CLIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, outcomes
+
+
+def report(label, latencies, outcomes):
+    print(f"{label:16s} ok={outcomes['ok']:4d} failed={outcomes['failed']:4d}  "
+          f"p50={percentile(latencies, 0.5) * 1000:6.0f}ms  p95={percentile(latencies, 0.95) * 1000:6.0f}ms  "
+          f"p99={percentile(latencies, 0.99) * 1000:6.0f}ms")
+
+
+def main():
+    fake_gemini.latency = tail_latency
+    fake_gemini.error_rate = ERROR_RATE
+    print(f"{CALLS} calls from {CLIENTS} clients; {SLOW_RATE:.0%} take {SLOW_LATENCY * 1000:.0f}ms, "
+          f"{ERROR_RATE:.0%} fail with 503")
+
+    report("bare", *run(None))
+
+    # A breaker threshold this high keeps random 503s from opening it; that is measured separately
+    breaker = CircuitBreaker(failure_threshold=1000)
+    report("retries", *run(CallPolicy(deadline=10, base_delay=0.05, max_delay=0.5, breaker=breaker)))
+
+    hedging = CallPolicy(deadline=10, base_delay=0.05, max_delay=0.5, breaker=CircuitBreaker(1000),
+                         hedge=True, hedge_min_delay=BASE_LATENCY * 2)
+    run(hedging)  # warm the latency window so hedges start at the observed p95
+    hedging.stats.update(hedges=0, hedge_wins=0)
+    report("retries+hedging", *run(hedging))
+    print(f"                 {hedging.stats['hedges']} hedges sent, {hedging.stats['hedge_wins']} won")
+
+
+if __name__ == '__main__':
+    main()
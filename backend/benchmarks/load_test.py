@@ -0,0 +1,337 @@
+"""
+Offline load test: the whole app against a fake Gemini and an in-memory DB
+
+Runs app.py in-process through Flask's test client with GEMINI_FAKE=true
+(fake_gemini, with --latency/--jitter per model call) and the SQLite pool
+from memory_db.py, so it needs neither network nor MySQL. CLIENTS worker
+threads each send one request at a time (a closed loop) drawn from a
+weighted mix of operations until REQUESTS have been sent:
+
+    text     POST /chat with a text message
+    image    POST /chat with a small PNG
+    pdf      POST /chat with a PDF (Files API path, handled inline)
+    docx     POST /chat with a DOCX
+    history  GET /history
+    login    POST /login (password hash verification)
+
+Prompts and attachments are varied per request (seeded by --seed), so the
+response cache sees a realistic mix rather than one hot key. The report
+gives throughput and p50/p95/p99 per operation. --save writes it as JSON
+under benchmarks/results/; --compare fails (exit status 1) when p95 or
+throughput of any operation is more than --max-regression worse than a
+saved run, so two versions can be checked against each other:
+
+    cd backend && python benchmarks/load_test.py --save baseline.json
+    cd backend && python benchmarks/load_test.py --compare benchmarks/results/baseline.json
+
+Numbers are only comparable between runs with the same parameters, which
+are stored with the results.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, 'benchmarks', 'results')
+sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_MIX = 'text=50,image=10,pdf=5,docx=10,history=20,login=5'
+USERS = 8
+PASSWORD = 'load-test-password'
+# Operations with fewer samples than this are too noisy to flag as regressions
+MIN_COMPARE_SAMPLES = 20
+TOPICS = ('caching', 'indexes', 'retries', 'queues', 'threads', 'latency', 'sharding', 'backpressure')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=500, help='total requests to send')
+    parser.add_argument('--concurrency', type=int, default=16, help='client threads')
+    parser.add_argument('--latency', type=float, default=0.05, help='fake Gemini latency per call (seconds)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra uniform random latency (seconds)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='weighted operations, e.g. text=80,history=20')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', metavar='NAME', help='write results to benchmarks/results/NAME')
+    parser.add_argument('--compare', metavar='PATH', help='compare against a saved result file')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='allowed fractional p95/throughput regression for --compare')
+    return parser.parse_args()
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip() not in OPERATIONS:
+            raise SystemExit(f"unknown operation in --mix: {name.strip()}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def configure_environment():
+    """Settings the app reads at import time; explicit environment variables still win."""
+    os.environ.setdefault('GEMINI_FAKE', 'true')
+    os.environ.setdefault('JWT_SECRET_KEY', 'offline-load-test-secret-key-0123456789')
+    os.environ.setdefault('HISTORY_SEARCH_BACKEND', 'python')
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+    os.environ.setdefault('PDF_BACKGROUND_JOBS', 'false')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # Uploads and the extraction cache go to a scratch directory, not the source tree
+    os.chdir(tempfile.mkdtemp(prefix='load-test-'))
+
+
+# -- request fixtures ------------------------------------------------------
+
+def make_png(rng):
+    from PIL import Image
+    image = Image.new('RGB', (64, 64), tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def make_docx(rng):
+    import docx
+    document = docx.Document()
+    for _ in range(20):
+        document.add_paragraph(' '.join(rng.choice(TOPICS) for _ in range(12)))
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def make_pdf(rng):
+    # The fake Files API never parses the bytes; only size and hash matter
+    body = ' '.join(rng.choice(TOPICS) for _ in range(400)).encode()
+    return b'%PDF-1.4\n' + body + b'\n%%EOF\n'
+
+
+class Fixtures:
+    """A few variants of each attachment, so caches warm up the way repeat uploads would."""
+
+    VARIANTS = 4
+
+    def __init__(self, seed):
+        rng = random.Random(seed)
+        self.files = {
+            'image': [(make_png(rng), f'photo{i}.png') for i in range(self.VARIANTS)],
+            'pdf': [(make_pdf(rng), f'report{i}.pdf') for i in range(self.VARIANTS)],
+            'docx': [(make_docx(rng), f'notes{i}.docx') for i in range(self.VARIANTS)],
+        }
+
+    def attachment(self, kind, rng):
+        payload, filename = rng.choice(self.files[kind])
+        return io.BytesIO(payload), filename
+
+
+# -- operations --------------------------------------------------------------
+
+def prompt(rng, number):
+    return f"Question {number}: how do {rng.choice(TOPICS)} and {rng.choice(TOPICS)} interact?"
+
+
+def op_text(client, session, rng, number):
+    return client.post('/chat', data={'message': prompt(rng, number)}, headers=session['headers'])
+
+
+def _op_file(kind):
+    def op(client, session, rng, number):
+        data = {'message': prompt(rng, number), 'files': session['fixtures'].attachment(kind, rng)}
+        return client.post('/chat', data=data, headers=session['headers'])
+    return op
+
+
+def op_history(client, session, rng, number):
+    return client.get('/history?limit=20', headers=session['headers'])
+
+
+def op_login(client, session, rng, number):
+    return client.post('/login', json={'username': session['username'], 'password': PASSWORD})
+
+
+OPERATIONS = {
+    'text': op_text,
+    'image': _op_file('image'),
+    'pdf': _op_file('pdf'),
+    'docx': _op_file('docx'),
+    'history': op_history,
+    'login': op_login,
+}
+
+
+# -- driver ------------------------------------------------------------------
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def create_sessions(app, fixtures):
+    client = app.test_client()
+    sessions = []
+    for i in range(USERS):
+        username = f'load{i}'
+        client.post('/register', json={'username': username, 'password': PASSWORD})
+        response = client.post('/login', json={'username': username, 'password': PASSWORD})
+        token = response.get_json()['access_token']
+        sessions.append({'username': username, 'headers': {'Authorization': f'Bearer {token}'},
+                         'fixtures': fixtures})
+    return sessions
+
+
+def plan_requests(args, mix, sessions):
+    """The whole request sequence, drawn up front so every run with a seed sends the same requests."""
+    rng = random.Random(args.seed)
+    names, weights = list(mix), list(mix.values())
+    return [(number, rng.choices(names, weights)[0], rng.choice(sessions), rng.getrandbits(32))
+            for number in range(1, args.requests + 1)]
+
+
+def run(app, plan, concurrency):
+    samples = {name: [] for name in OPERATIONS}
+    errors = dict.fromkeys(OPERATIONS, 0)
+    pending = iter(plan)
+    lock = threading.Lock()
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with lock:
+                item = next(pending, None)
+            if item is None:
+                return
+            number, name, session, seed = item
+            started = time.perf_counter()
+            try:
+                response = OPERATIONS[name](client, session, random.Random(seed), number)
+                response.get_data()
+                response.close()
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples[name].append(elapsed)
+                errors[name] += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, errors, time.perf_counter() - started
+
+
+def summarize(values, error_count, duration):
+    return {
+        'count': len(values),
+        'errors': error_count,
+        'throughput_rps': round(len(values) / duration, 2) if duration else 0,
+        'p50_ms': round(percentile(values, 0.50) * 1000, 2) if values else None,
+        'p95_ms': round(percentile(values, 0.95) * 1000, 2) if values else None,
+        'p99_ms': round(percentile(values, 0.99) * 1000, 2) if values else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results):
+    print(f"{'operation':10s} {'count':>6s} {'errors':>6s} {'req/s':>8s} {'p50':>9s} {'p95':>9s} {'p99':>9s}")
+    for name, row in list(results['operations'].items()) + [('total', results['total'])]:
+        if not row['count']:
+            continue
+        print(f"{name:10s} {row['count']:6d} {row['errors']:6d} {row['throughput_rps']:8.1f} "
+              f"{row['p50_ms']:7.1f}ms {row['p95_ms']:7.1f}ms {row['p99_ms']:7.1f}ms")
+
+
+def compare(results, baseline_path, max_regression):
+    """Print p95/throughput changes against a saved run; returns False on a regression."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline['params'] != results['params']:
+        print(f"warning: parameters differ from the baseline ({baseline['params']})")
+
+    ok = True
+    print(f"\nagainst {baseline_path} (rev {baseline.get('git_rev')}):")
+    rows = dict(results['operations'], total=results['total'])
+    old_rows = dict(baseline['operations'], total=baseline['total'])
+    for name, row in rows.items():
+        old = old_rows.get(name)
+        if not old or min(old['count'], row['count']) < MIN_COMPARE_SAMPLES:
+            continue
+        p95_change = row['p95_ms'] / old['p95_ms'] - 1 if old['p95_ms'] else 0
+        rps_change = row['throughput_rps'] / old['throughput_rps'] - 1 if old['throughput_rps'] else 0
+        regressed = p95_change > max_regression or rps_change < -max_regression
+        ok = ok and not regressed
+        print(f"{name:10s} p95 {old['p95_ms']:8.1f} -> {row['p95_ms']:8.1f}ms ({p95_change:+.0%})  "
+              f"req/s {old['throughput_rps']:7.1f} -> {row['throughput_rps']:7.1f} ({rps_change:+.0%})"
+              f"{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main():
+    args = parse_args()
+    mix = parse_mix(args.mix)
+    if args.compare:
+        args.compare = os.path.abspath(args.compare)  # before configure_environment() changes directory
+    configure_environment()
+
+    import db_pool
+    import fake_gemini
+    from benchmarks.memory_db import MemoryPool
+
+    db_pool.use_pool(MemoryPool())
+    latency_rng = random.Random(args.seed)
+    fake_gemini.latency = lambda: args.latency + latency_rng.uniform(0, args.jitter)
+
+    from app import app
+
+    fixtures = Fixtures(args.seed)
+    sessions = create_sessions(app, fixtures)
+    print(f"{args.requests} requests from {args.concurrency} clients; fake Gemini latency "
+          f"{args.latency * 1000:.0f}ms (+0..{args.jitter * 1000:.0f}ms); mix {args.mix}")
+
+    samples, errors, duration = run(app, plan_requests(args, mix, sessions), args.concurrency)
+    results = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_rev': git_revision(),
+        'params': {'requests': args.requests, 'concurrency': args.concurrency, 'latency': args.latency,
+                   'jitter': args.jitter, 'mix': args.mix, 'seed': args.seed},
+        'duration_s': round(duration, 3),
+        'operations': {name: summarize(values, errors[name], duration)
+                       for name, values in samples.items() if values},
+        'total': summarize([v for values in samples.values() for v in values], sum(errors.values()), duration),
+        'db': db_pool.get_pool().stats(),
+    }
+    report(results)
+
+    if args.save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, args.save)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nsaved to {path}")
+
+    if args.compare and not compare(results, args.compare, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
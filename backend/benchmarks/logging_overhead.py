@@ -0,0 +1,88 @@
+"""
+Caller-side cost of logging: synchronous print vs the queued JSON logger
+
+Each of THREADS threads logs CALLS records while stdout is a slow sink
+(WRITE_DELAY per write, like a pipe whose reader falls behind). The script
+prints the time a log call keeps the calling thread busy, p50/p99, for
+print() and for logging through logging_setup's queue handler.
+
+    cd backend && python benchmarks/logging_overhead.py
+"""
+import io
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+
+THREADS = 8
+CALLS = 500
+WRITE_DELAY = 0.0002
+
+
+class SlowSink(io.TextIOBase):
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:  # one writer at a time, like a file descriptor
+            time.sleep(WRITE_DELAY)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def measure(log_once):
+    durations = []
+    lock = threading.Lock()
+
+    def worker():
+        local = []
+        for i in range(CALLS):
+            started = time.perf_counter()
+            log_once(i)
+            local.append(time.perf_counter() - started)
+        with lock:
+            durations.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return durations
+
+
+def report(label, durations):
+    print(f"{label:8s} p50={percentile(durations, 0.5) * 1e6:8.1f}us  p99={percentile(durations, 0.99) * 1e6:8.1f}us",
+          file=sys.__stdout__)
+
+
+def main():
+    print(f"{THREADS} threads x {CALLS} log calls, sink takes {WRITE_DELAY * 1e6:.0f}us per write",
+          file=sys.__stdout__)
+    sys.stdout = SlowSink()
+
+    report("print", measure(lambda i: print(f"DEBUG: File size: {i} bytes")))
+
+    Config.LOG_LEVEL = 'DEBUG'
+    Config.LOG_QUEUE_SIZE = THREADS * CALLS  # measure the handoff, not drops
+    import logging_setup
+    logging_setup.setup_logging()
+    logger = logging.getLogger('benchmark')
+    report("queued", measure(lambda i: logger.debug("File spooled", extra={'bytes': i})))
+    logging_setup._stop_listener()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""
+In-memory stand-in for the MySQL pool, for offline load tests
+
+MemoryPool exposes the connection() API of db_pool.ConnectionPool on top
+of one shared in-memory SQLite database. Queries are rewritten from the
+MySQL dialect the app uses (%s placeholders, <=>, LEFT, CHAR_LENGTH,
+JSON_LENGTH), IntegrityError is re-raised as mysql.connector's, and TEXT
+columns come back as str, TIMESTAMPs as datetime, like mysql-connector.
+
+Statements are serialised on one lock, so this stands in for a fast,
+uncontended database: load test results measure the app, not MySQL.
+FULLTEXT search is not available; run with HISTORY_SEARCH_BACKEND=python.
+
+    import db_pool
+    from benchmarks.memory_db import MemoryPool
+    db_pool.use_pool(MemoryPool())
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import mysql.connector
+
+SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    password_hash VARCHAR(255) NOT NULL,
+    email VARCHAR(100),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_login TIMESTAMP NULL,
+    is_active BOOLEAN DEFAULT 1
+);
+CREATE TABLE conversations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL,
+    title VARCHAR(255),
+    summary TEXT,
+    summary_upto_id INT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE chat_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL,
+    conversation_id INT NULL,
+    user_message TEXT,
+    bot_response TEXT,
+    files_info TEXT,
+    message_type TEXT DEFAULT 'text',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE user_sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL,
+    session_token VARCHAR(255),
+    expires_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE processing_jobs (
+    id CHAR(32) PRIMARY KEY,
+    user_id INT NOT NULL,
+    status TEXT DEFAULT 'queued',
+    user_message TEXT,
+    files_info TEXT,
+    result TEXT,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_chat_messages_user_created ON chat_messages(user_id, created_at, id);
+CREATE INDEX idx_chat_messages_conversation ON chat_messages(conversation_id, id);
+CREATE INDEX idx_conversations_user_id ON conversations(user_id);
+CREATE INDEX idx_user_sessions_user_id ON user_sessions(user_id);
+CREATE UNIQUE INDEX idx_user_sessions_token ON user_sessions(session_token);
+CREATE INDEX idx_user_sessions_expires ON user_sessions(expires_at);
+"""
+
+_PLACEHOLDER = re.compile(r'%s')
+_LEFT = re.compile(r'\bLEFT\(', re.IGNORECASE)  # LEFT is a keyword in SQLite (LEFT JOIN)
+
+
+def _json_length(value):
+    if value is None:
+        return None
+    try:
+        return len(json.loads(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def translate(query):
+    """Rewrite the MySQL dialect used by the app into SQLite."""
+    query = _PLACEHOLDER.sub('?', query)
+    query = query.replace('<=>', 'IS')
+    query = _LEFT.sub('MYSQL_LEFT(', query)
+    return query
+
+
+class MemoryCursor:
+    def __init__(self, pool, dictionary=False):
+        self._pool = pool
+        self._dictionary = dictionary
+        self._rows = []
+        self._columns = []
+        self.lastrowid = None
+        self.rowcount = -1
+
+    def _run(self, method, query, params):
+        with self._pool.lock:
+            started = time.perf_counter()
+            try:
+                cursor = getattr(self._pool.db, method)(translate(query), params)
+            except sqlite3.IntegrityError as e:
+                raise mysql.connector.IntegrityError(msg=str(e)) from e
+            self._columns = [column[0] for column in cursor.description or ()]
+            self._rows = cursor.fetchall()
+            self.lastrowid = cursor.lastrowid
+            self.rowcount = cursor.rowcount
+            self._pool.query_time += time.perf_counter() - started
+
+    def execute(self, query, params=()):
+        self._run('execute', query, tuple(params or ()))
+
+    def executemany(self, query, seq_of_params):
+        seq_of_params = [tuple(params) for params in seq_of_params]
+        if not seq_of_params:
+            return
+        # mysql-connector sends an INSERT batch as one multi-row statement: lastrowid is the first id
+        self._run('execute', query, seq_of_params[0])
+        first_id = self.lastrowid
+        if len(seq_of_params) > 1:
+            self._run('executemany', query, seq_of_params[1:])
+        self.lastrowid = first_id
+
+    def _shape(self, row):
+        return dict(zip(self._columns, row)) if self._dictionary else row
+
+    def fetchone(self):
+        return self._shape(self._rows.pop(0)) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return [self._shape(row) for row in rows]
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._rows = []
+
+
+class MemoryConnection:
+    in_transaction = False
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def cursor(self, dictionary=False, **kwargs):
+        return MemoryCursor(self._pool, dictionary)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class MemoryPool:
+    def __init__(self):
+        sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+        sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()))
+        self.db = sqlite3.connect(':memory:', check_same_thread=False, isolation_level=None,
+                                  detect_types=sqlite3.PARSE_DECLTYPES)
+        self.db.create_function('MYSQL_LEFT', 2, lambda text, n: None if text is None else text[:n], deterministic=True)
+        self.db.create_function('CHAR_LENGTH', 1, lambda text: None if text is None else len(text),
+                                deterministic=True)
+        self.db.create_function('JSON_LENGTH', 1, _json_length, deterministic=True)
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.query_time = 0.0
+        self.checkouts = 0
+
+    def connection(self):
+        self.checkouts += 1
+        return MemoryConnection(self)
+
+    def stats(self):
+        return {'backend': 'memory', 'checkouts': self.checkouts, 'query_time_total': round(self.query_time, 3)}
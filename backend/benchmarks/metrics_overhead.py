@@ -0,0 +1,57 @@
+"""
+Cost of the metrics hooks on the request path
+
+Times Histogram.observe (with labels), Counter.inc and the SQL statement
+label lookup used by every cursor.execute, single-threaded and from
+THREADS threads sharing one histogram, and renders /metrics once.
+
+    cd backend && python benchmarks/metrics_overhead.py
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics  # noqa: E402
+
+CALLS = 200000
+THREADS = 8
+QUERY = "INSERT INTO chat_messages (user_id, user_message, bot_response) VALUES (%s, %s, %s)"
+
+
+def per_call(func, calls=CALLS):
+    started = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    return (time.perf_counter() - started) / calls
+
+
+def main():
+    histogram = metrics.Histogram('bench_seconds', 'benchmark', ('route',))
+    counter = metrics.Counter('bench_total', 'benchmark', ('error',))
+
+    print(f"Histogram.observe     {per_call(lambda i: histogram.observe(0.042, '/chat')) * 1e9:7.0f} ns")
+    print(f"Counter.inc           {per_call(lambda i: counter.inc('503')) * 1e9:7.0f} ns")
+    print(f"statement_label       {per_call(lambda i: metrics.statement_label(QUERY)) * 1e9:7.0f} ns")
+
+    results = []
+
+    def worker():
+        results.append(per_call(lambda i: histogram.observe(0.042, '/chat'), CALLS // THREADS))
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"observe, {THREADS} threads    {max(results) * 1e9:7.0f} ns wall per call (threads share the GIL)")
+
+    started = time.perf_counter()
+    size = len(metrics.render())
+    print(f"render /metrics       {(time.perf_counter() - started) * 1e3:7.2f} ms ({size} bytes)")
+
+
+if __name__ == '__main__':
+    main()
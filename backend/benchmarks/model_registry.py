@@ -0,0 +1,44 @@
+"""
+Micro-benchmark: building a GenerativeModel per request vs the shared registry
+
+Only construction and lookup are timed; no request is sent to Gemini, so
+this runs offline with either the real SDK or GEMINI_FAKE=true.
+
+    cd backend && python benchmarks/model_registry.py [iterations]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from models import generation_config, genai, get_model  # noqa: E402
+
+
+def per_request():
+    return genai.GenerativeModel(Config.GEMINI_MODEL, generation_config=generation_config())
+
+
+def timed(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6  # microseconds per call
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    get_model()  # build once, as the first request of a worker would
+
+    print(f"SDK: {genai.__name__}, model: {Config.GEMINI_MODEL}, "
+          f"generation_config: {generation_config()}, iterations: {iterations}")
+    construct = timed(per_request, iterations)
+    registry = timed(get_model, iterations)
+    print(f"  new GenerativeModel per request: {construct:8.2f} us/call")
+    print(f"  get_model() registry lookup:     {registry:8.2f} us/call")
+    print(f"  saved per model call:            {construct - registry:8.2f} us ({construct / registry:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
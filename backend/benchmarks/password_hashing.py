@@ -0,0 +1,85 @@
+"""
+Login verification throughput per core: scheme cost and hashing pool size
+
+For each PASSWORD_ROUNDS setting, CLIENTS threads verify passwords through
+passwords.verify_password for DURATION seconds with the hashing pool at 1,
+2 and 4 workers. The script prints verifications per second, the same per
+core in use (PBKDF2 runs without the GIL, so a pool uses min(workers, CPUs)
+cores), and p95 latency, which includes waiting for a pool slot. Calls
+refused because the pool was full are counted separately.
+
+    cd backend && python benchmarks/password_hashing.py
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import passwords  # noqa: E402
+from config import Config  # noqa: E402
+
+ROUNDS = (29000, 100000, 10000)  # passlib's pbkdf2_sha256 default first
+WORKERS = (1, 2, 4)
+CLIENTS = 16
+DURATION = 2.0
+PASSWORD = 'correct horse battery staple'
+
+
+def configure(rounds, workers):
+    Config.PASSWORD_ROUNDS = rounds
+    Config.PASSWORD_HASH_WORKERS = workers
+    Config.PASSWORD_HASH_QUEUE_SIZE = CLIENTS
+    passwords.context = passwords._make_context()
+    passwords._slots = threading.BoundedSemaphore(workers + CLIENTS)
+    passwords._executor_pid = None  # next call starts a pool of the new size
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else float('nan')
+
+
+def run(password_hash):
+    latencies, rejected = [], [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + DURATION
+
+    def client():
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                verified, _ = passwords.verify_password(PASSWORD, password_hash)
+                assert verified
+            except passwords.PasswordHashingBusy:
+                with lock:
+                    rejected[0] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=client) for _ in range(CLIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, rejected[0]
+
+
+def main():
+    print(f"{CLIENTS} concurrent clients, {DURATION:.0f}s per run, {os.cpu_count()} CPUs\n")
+    print(f"{'rounds':>7s} {'workers':>7s} {'verify/s':>9s} {'per core':>10s} {'p95':>8s} {'rejected':>8s}")
+    for rounds in ROUNDS:
+        for workers in WORKERS:
+            configure(rounds, workers)
+            password_hash = passwords.context.hash(PASSWORD)
+            latencies, rejected = run(password_hash)
+            rate = len(latencies) / DURATION
+            cores = min(workers, os.cpu_count() or 1)
+            print(f"{rounds:7d} {workers:7d} {rate:9.1f} {rate / cores:10.1f} "
+                  f"{percentile(latencies, 0.95) * 1000:6.0f}ms {rejected:8d}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Peak memory of one large /chat upload per file type, with a pass/fail bound
+
+Runs app.py in-process through Flask's test client with GEMINI_FAKE=true
+and the SQLite pool from memory_db.py, like load_test.py, and sends one
+upload of each type (image, PDF, DOCX, TXT) of about --size-mb megabytes.
+Each multipart body is built before measuring starts; tracemalloc then
+records the peak of Python allocations while /chat parses, spools,
+processes and answers the request, and what is still allocated after it
+(the extracted text and retrieval index of DOCX/TXT files, kept in the
+extraction and index caches under their own limits).
+
+Spooled uploads stay in memory only up to UPLOAD_MEMORY_MAX_BYTES (the
+spool chunk) and are read through views of the spool or temp file, so the
+memory a request uses on top of what it leaves cached should not grow with
+the upload. The run fails (exit status 1) when, for any type, that exceeds
+--max-chunks x UPLOAD_MEMORY_MAX_BYTES plus --overhead-mb:
+
+    cd backend && python benchmarks/upload_memory.py
+    cd backend && python benchmarks/upload_memory.py --size-mb 40 --max-chunks 4
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+MB = 1024 * 1024
+PASSWORD = 'upload-memory-password'
+WORDS = ('caching', 'indexes', 'retries', 'queues', 'threads', 'latency', 'sharding', 'backpressure')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size-mb', type=int, default=20, help='approximate size of each upload')
+    parser.add_argument('--max-chunks', type=float, default=4,
+                        help='allowed peak, in multiples of UPLOAD_MEMORY_MAX_BYTES')
+    parser.add_argument('--overhead-mb', type=float, default=4,
+                        help='allowed peak on top of that (request handling, processor state)')
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+def configure_environment():
+    """Settings the app reads at import time; explicit environment variables still win."""
+    os.environ.setdefault('GEMINI_FAKE', 'true')
+    os.environ.setdefault('JWT_SECRET_KEY', 'offline-upload-memory-secret-key-0123456789')
+    os.environ.setdefault('HISTORY_SEARCH_BACKEND', 'python')
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+    os.environ.setdefault('PDF_BACKGROUND_JOBS', 'false')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # Uploads and the extraction cache go to a scratch directory, not the source tree
+    os.chdir(tempfile.mkdtemp(prefix='upload-memory-'))
+
+
+# -- request fixtures ------------------------------------------------------
+
+def make_image(size, rng):
+    # Noise does not compress, so the PNG is about as large as its pixels
+    from PIL import Image
+    side = int((size / 3) ** 0.5)
+    image = Image.frombytes('RGB', (side, side), rng.randbytes(side * side * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG', compress_level=1)
+    return buffer.getvalue()
+
+
+def make_pdf(size, rng):
+    # The fake Files API never parses the bytes; only size and hash matter
+    return b'%PDF-1.4\n' + rng.randbytes(size) + b'\n%%EOF\n'
+
+
+def make_text(size, rng):
+    line = ' '.join(rng.choice(WORDS) for _ in range(12)) + '.\n'
+    return (line * (size // len(line) + 1))[:size].encode()
+
+
+def make_docx(size, rng):
+    # Large DOCX files are large because of embedded media; the text is a few hundred KB
+    import docx
+    document = docx.Document()
+    text = make_text(min(size // 20, MB), rng).decode()
+    for start in range(0, len(text), 4000):
+        document.add_paragraph(text[start:start + 4000])
+    document.add_picture(io.BytesIO(make_image(size, rng)))
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+FIXTURES = {
+    'image': (make_image, 'large.png'),
+    'pdf': (make_pdf, 'large.pdf'),
+    'docx': (make_docx, 'large.docx'),
+    'txt': (make_text, 'large.txt'),
+}
+
+
+# -- measurement -------------------------------------------------------------
+
+def login(client):
+    client.post('/register', json={'username': 'upload-memory', 'password': PASSWORD})
+    response = client.post('/login', json={'username': 'upload-memory', 'password': PASSWORD})
+    return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+
+def build_environ(payload, filename, headers):
+    from werkzeug.test import EnvironBuilder
+    builder = EnvironBuilder(path='/chat', method='POST', headers=headers,
+                             data={'message': 'What is this file about?', 'files': (io.BytesIO(payload), filename)})
+    environ = builder.get_environ()
+    builder.close()
+    return environ
+
+
+def measure(client, environ):
+    """(peak, kept): traced allocations above the starting point during and after one /chat request."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    response = client.open(environ)
+    response.get_data()
+    response.close()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if response.status_code != 200:
+        raise SystemExit(f"/chat answered {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return peak - baseline, max(0, current - baseline)
+
+
+def main():
+    args = parse_args()
+    configure_environment()
+
+    import db_pool
+    from benchmarks.memory_db import MemoryPool
+
+    db_pool.use_pool(MemoryPool())
+
+    from app import app
+    from config import Config
+
+    client = app.test_client()
+    headers = login(client)
+    rng = random.Random(args.seed)
+    chunk = Config.UPLOAD_MEMORY_MAX_BYTES
+    bound = args.max_chunks * chunk + args.overhead_mb * MB
+
+    print(f"One ~{args.size_mb} MB upload per type; spool chunk {chunk / MB:.1f} MB; "
+          f"bound {args.max_chunks:g} chunks + {args.overhead_mb:g} MB = {bound / MB:.1f} MB")
+    failed = []
+    for kind, (make, filename) in FIXTURES.items():
+        payload = make(args.size_mb * MB, rng)
+        environ = build_environ(payload, filename, headers)
+        del payload
+        peak, kept = measure(client, environ)
+        over = peak - kept > bound
+        if over:
+            failed.append(kind)
+        print(f"  {kind:6s} upload {int(environ['CONTENT_LENGTH']) / MB:6.1f} MB   peak {peak / MB:7.1f} MB   "
+              f"cached {kept / MB:6.1f} MB   request {(peak - kept) / MB:6.1f} MB"
+              f"{'   OVER BOUND' if over else ''}")
+
+    if failed:
+        print(f"\nrequest memory over the bound for: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
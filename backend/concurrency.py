@@ -0,0 +1,182 @@
+"""
+Adaptive concurrency limit for outbound model calls
+
+All Gemini calls of a process share one AdaptiveLimiter. It admits up to
+``limit`` calls at once and queues the rest (FIFO, bounded, each waiter
+with a deadline). The limit follows AIMD: it grows by about one per round
+trip while calls are fast and the limit is actually in use, and is cut
+multiplicatively when a call errors with an overload status or takes
+longer than the latency threshold. When the upstream slows down, calls
+wait in the queue or are shed with Overloaded (HTTP 503) instead of all
+piling onto Gemini.
+"""
+import math
+import threading
+import time
+from collections import deque
+
+from resilience import LLMUnavailable
+
+# HTTP statuses (api_core exceptions carry them as .code) that mean "back off"
+OVERLOAD_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class Overloaded(LLMUnavailable):
+    """Raised when a call is shed: the wait queue is full or its deadline passed."""
+
+
+def is_overload_error(error):
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return getattr(error, 'code', None) in OVERLOAD_STATUS_CODES
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial=8, min_limit=1, max_limit=64, max_queue=100, queue_timeout=10.0,
+                 latency_threshold=15.0, backoff=0.7):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.latency_threshold = latency_threshold
+        self.backoff = backoff
+
+        self.in_flight = 0
+        self._waiters = deque()  # threading.Event per queued caller, FIFO
+        self._lock = threading.Lock()
+        self._last_decrease = 0.0
+        self._latency_ewma = None
+        self.stats = {'admitted': 0, 'queued': 0, 'shed_queue_full': 0, 'shed_timeout': 0,
+                      'errors': 0, 'slow': 0, 'decreases': 0}
+
+    def _retry_after(self):
+        return max(1, math.ceil(self._latency_ewma or 1))
+
+    def acquire(self, timeout=None):
+        """Take a slot, waiting at most ``timeout`` (default queue_timeout) seconds."""
+        timeout = self.queue_timeout if timeout is None else timeout
+        with self._lock:
+            if self.in_flight < int(self.limit) and not self._waiters:
+                self.in_flight += 1
+                self.stats['admitted'] += 1
+                return
+            if len(self._waiters) >= self.max_queue:
+                self.stats['shed_queue_full'] += 1
+                raise Overloaded("The AI service is overloaded. Please try again shortly.", self._retry_after())
+            event = threading.Event()
+            self._waiters.append(event)
+            self.stats['queued'] += 1
+
+        if event.wait(max(0.0, timeout)):
+            return  # the releasing thread handed us its slot
+        with self._lock:
+            if event.is_set():
+                return  # granted between the timeout and taking the lock
+            self._waiters.remove(event)
+            self.stats['shed_timeout'] += 1
+        raise Overloaded("Timed out waiting for the AI service. Please try again shortly.", self._retry_after())
+
+    def release(self, latency, error=None):
+        """Return a slot and feed the call's outcome into the limit."""
+        with self._lock:
+            self._adjust(latency, error)
+            self.in_flight -= 1
+            # Hand freed slots to waiters in arrival order
+            while self._waiters and self.in_flight < int(self.limit):
+                self._waiters.popleft().set()
+                self.in_flight += 1
+                self.stats['admitted'] += 1
+
+    def _adjust(self, latency, error):
+        self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+        overloaded = error is not None and is_overload_error(error)
+        if error is not None:
+            self.stats['errors'] += 1
+        if latency > self.latency_threshold:
+            self.stats['slow'] += 1
+
+        now = time.monotonic()
+        if overloaded or latency > self.latency_threshold:
+            # Cut at most once per round trip, otherwise one slow burst collapses the limit
+            if now - self._last_decrease >= latency:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+                self.stats['decreases'] += 1
+        elif error is None and (self.in_flight >= int(self.limit) or self._waiters):
+            # Additive increase only while the limit is the bottleneck
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def call(self, func, *args, timeout=None, **kwargs):
+        """Run ``func`` in a slot, recording its latency and outcome."""
+        self.acquire(timeout)
+        started = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.release(time.monotonic() - started, e)
+            raise
+        self.release(time.monotonic() - started)
+        return result
+
+    def stream(self, func, *args, timeout=None, **kwargs):
+        """Like call() for functions returning an iterator; the slot is held until it is consumed."""
+        self.acquire(timeout)
+        started = time.monotonic()
+        try:
+            iterator = func(*args, **kwargs)
+        except Exception as e:
+            self.release(time.monotonic() - started, e)
+            raise
+        return GovernedStream(self, iterator, started)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, limit=round(self.limit, 2), in_flight=self.in_flight,
+                        queued_now=len(self._waiters),
+                        latency_ewma=round(self._latency_ewma, 3) if self._latency_ewma else None)
+
+
+class GovernedStream:
+    """Iterator holding a limiter slot until it is exhausted, fails or is dropped.
+
+    Latency fed to the limiter is time to first chunk, which tracks upstream
+    load independently of how long the answer is.
+    """
+
+    def __init__(self, limiter, iterator, started):
+        self._limiter = limiter
+        self._iterator = iter(iterator)
+        self._started = started
+        self._first_chunk_latency = None
+        self._released = False
+
+    def _finish(self, error=None):
+        if not self._released:
+            self._released = True
+            latency = self._first_chunk_latency
+            if latency is None:
+                latency = time.monotonic() - self._started
+            self._limiter.release(latency, error)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self._iterator)
+        except StopIteration:
+            self._finish()
+            raise
+        except Exception as e:
+            self._finish(e)
+            raise
+        if self._first_chunk_latency is None:
+            self._first_chunk_latency = time.monotonic() - self._started
+        return chunk
+
+    def close(self):
+        self._finish()
+
+    def __del__(self):
+        self._finish()
@@ -11,6 +11,20 @@ class Config:
     SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'dev-secret-key')
     DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
 
+    # Logging
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()  # 'json' or 'text'
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '1.0'))  # fraction of requests logging DEBUG events
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))  # records beyond this are dropped, not waited on
+
+    # Metrics (GET /metrics, Prometheus text format)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+
+    # Tracing (OpenTelemetry-shaped spans as JSON lines)
+    TRACING_EXPORTER = os.getenv('TRACING_EXPORTER', 'none').lower()  # 'none', 'stdout' or 'file'
+    TRACING_FILE = os.getenv('TRACING_FILE', 'traces.jsonl')
+    TRACING_SAMPLE_RATE = float(os.getenv('TRACING_SAMPLE_RATE', '1.0'))  # fraction of new traces recorded
+
     # Database
     DB_CONFIG = {
         'host': os.getenv('DB_HOST', 'localhost'),
@@ -18,14 +32,141 @@ class Config:
         'password': os.getenv('DB_PASSWORD', ''),
         'database': os.getenv('DB_NAME', 'chatbot_db')
     }
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+    DB_POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', '10'))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))  # reopen connections idle longer than this
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'True').lower() == 'true'
+    # Write-behind for chat_messages: replies return before the INSERT, rows are batched
+    CHAT_WRITE_BEHIND = os.getenv('CHAT_WRITE_BEHIND', 'False').lower() == 'true'
+    CHAT_WRITE_BATCH_SIZE = int(os.getenv('CHAT_WRITE_BATCH_SIZE', '100'))  # rows per multi-row INSERT
+    CHAT_WRITE_FLUSH_INTERVAL = float(os.getenv('CHAT_WRITE_FLUSH_INTERVAL', '0.5'))  # seconds a row may wait
+    CHAT_WRITE_QUEUE_SIZE = int(os.getenv('CHAT_WRITE_QUEUE_SIZE', '10000'))  # beyond this, requests wait for the writer
+    CHAT_WRITE_QUEUE_TIMEOUT = float(os.getenv('CHAT_WRITE_QUEUE_TIMEOUT', '5'))  # then answer 503
+    CHAT_WRITE_SPOOL_PATH = os.getenv('CHAT_WRITE_SPOOL_PATH', os.path.join(os.getcwd(), 'spool', 'chat_messages'))
+    CHAT_WRITE_SPOOL_FSYNC = os.getenv('CHAT_WRITE_SPOOL_FSYNC', 'False').lower() == 'true'
 
     # File Upload
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB
     UPLOAD_FOLDER = os.path.join(os.getcwd(), 'uploads')
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'txt'}
+    FILE_PROCESSING_CONCURRENCY = int(os.getenv('FILE_PROCESSING_CONCURRENCY', '4'))  # per request
+    FILE_PROCESSING_TIMEOUT = float(os.getenv('FILE_PROCESSING_TIMEOUT', '90'))  # seconds per file, once started
+    FILE_PROCESSING_WORKERS = int(os.getenv('FILE_PROCESSING_WORKERS', '16'))  # per process, all requests
+    FILE_PROCESSING_QUEUE_SIZE = int(os.getenv('FILE_PROCESSING_QUEUE_SIZE', '64'))
+    FILE_PROCESSING_QUEUE_TIMEOUT = float(os.getenv('FILE_PROCESSING_QUEUE_TIMEOUT', '30'))  # then answer 503
+    PDF_PROCESSING_TIMEOUT = float(os.getenv('PDF_PROCESSING_TIMEOUT', '60'))  # Gemini file ingestion
+
+    # Background jobs (requests with PDFs return 202 and a /jobs/<id> URL)
+    PDF_BACKGROUND_JOBS = os.getenv('PDF_BACKGROUND_JOBS', 'True').lower() == 'true'
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+    JOB_STALE_AFTER = float(os.getenv('JOB_STALE_AFTER', '600'))  # unfinished jobs untouched this long are failed
+    JOB_EVENTS_POLL_INTERVAL = float(os.getenv('JOB_EVENTS_POLL_INTERVAL', '2'))
+    JOB_EVENTS_MAX_DURATION = float(os.getenv('JOB_EVENTS_MAX_DURATION', '60'))  # each stream holds a gunicorn thread
+
+    # Extraction cache (keyed by SHA-256 of uploaded bytes)
+    EXTRACTION_CACHE_ENABLED = os.getenv('EXTRACTION_CACHE_ENABLED', 'True').lower() == 'true'
+    EXTRACTION_CACHE_DIR = os.getenv('EXTRACTION_CACHE_DIR', os.path.join(os.getcwd(), 'cache', 'extraction'))
+    EXTRACTION_CACHE_TTL = int(os.getenv('EXTRACTION_CACHE_TTL', '86400'))
+    EXTRACTION_CACHE_MEMORY_MAX_BYTES = int(os.getenv('EXTRACTION_CACHE_MEMORY_MAX_BYTES', str(64 * 1024 * 1024)))
+    EXTRACTION_CACHE_DISK_MAX_BYTES = int(os.getenv('EXTRACTION_CACHE_DISK_MAX_BYTES', str(512 * 1024 * 1024)))
+    GEMINI_FILE_CACHE_TTL = int(os.getenv('GEMINI_FILE_CACHE_TTL', str(46 * 3600)))  # Gemini deletes files after 48h
+
+    # Document retrieval (long DOCX/TXT files are chunked and only relevant chunks are sent)
+    RETRIEVAL_MIN_CHARS = int(os.getenv('RETRIEVAL_MIN_CHARS', '8000'))  # shorter documents are sent whole
+    RETRIEVAL_CHUNK_SIZE = int(os.getenv('RETRIEVAL_CHUNK_SIZE', '1200'))
+    RETRIEVAL_CHUNK_OVERLAP = int(os.getenv('RETRIEVAL_CHUNK_OVERLAP', '200'))
+    RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', '6'))
+    RETRIEVAL_INDEX_CACHE_SIZE = int(os.getenv('RETRIEVAL_INDEX_CACHE_SIZE', '32'))  # documents
+
+    # History search: 'fulltext' (MySQL FULLTEXT index) or 'python' (in-process inverted index)
+    HISTORY_SEARCH_BACKEND = os.getenv('HISTORY_SEARCH_BACKEND', 'fulltext')
+
+    # Response cache for plain-text prompts
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'True').lower() == 'true'
+    RESPONSE_CACHE_SCOPE = os.getenv('RESPONSE_CACHE_SCOPE', 'user')  # 'user' or 'global'
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '5000'))
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD = float(os.getenv('RESPONSE_CACHE_SIMILARITY_THRESHOLD', '0'))  # 0 disables the embedding tier
+    RESPONSE_CACHE_SEMANTIC_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_SEMANTIC_MAX_ENTRIES', '256'))  # scanned per miss, per scope
+    EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'models/text-embedding-004')
+
+    # Rate limiting (token buckets; *_PER_MINUTE is the refill rate, *_BURST the bucket size, 0 disables)
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')  # 'memory' (per process) or 'redis'
+    RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0')
+    # Proxies in front of the app that append to X-Forwarded-For (RATE_LIMIT_TRUST_FORWARDED_FOR=true means 1)
+    RATE_LIMIT_TRUSTED_PROXY_HOPS = int(os.getenv(
+        'RATE_LIMIT_TRUSTED_PROXY_HOPS',
+        '1' if os.getenv('RATE_LIMIT_TRUST_FORWARDED_FOR', 'False').lower() == 'true' else '0'
+    ))
+    RATE_LIMIT_USER_PER_MINUTE = float(os.getenv('RATE_LIMIT_USER_PER_MINUTE', '30'))
+    RATE_LIMIT_USER_BURST = float(os.getenv('RATE_LIMIT_USER_BURST', '20'))
+    RATE_LIMIT_IP_PER_MINUTE = float(os.getenv('RATE_LIMIT_IP_PER_MINUTE', '60'))
+    RATE_LIMIT_IP_BURST = float(os.getenv('RATE_LIMIT_IP_BURST', '40'))
+    RATE_LIMIT_GLOBAL_PER_MINUTE = float(os.getenv('RATE_LIMIT_GLOBAL_PER_MINUTE', '0'))  # e.g. the Gemini quota
+    RATE_LIMIT_GLOBAL_BURST = float(os.getenv('RATE_LIMIT_GLOBAL_BURST', '100'))
+    RATE_LIMIT_COST_TEXT = float(os.getenv('RATE_LIMIT_COST_TEXT', '1'))
+    RATE_LIMIT_COST_DOCUMENT = float(os.getenv('RATE_LIMIT_COST_DOCUMENT', '2'))  # TXT/DOCX
+    RATE_LIMIT_COST_IMAGE = float(os.getenv('RATE_LIMIT_COST_IMAGE', '3'))
+    RATE_LIMIT_COST_PDF = float(os.getenv('RATE_LIMIT_COST_PDF', '5'))
+    RATE_LIMIT_COST_AUTH = float(os.getenv('RATE_LIMIT_COST_AUTH', '1'))  # /login and /register, per IP
+
+    # Uploads up to this size are kept in memory; larger ones are spooled to a temp file
+    UPLOAD_MEMORY_MAX_BYTES = int(os.getenv('UPLOAD_MEMORY_MAX_BYTES', str(1024 * 1024)))
+
+    # Image preprocessing before vision calls
+    IMAGE_MAX_SIDE = int(os.getenv('IMAGE_MAX_SIDE', '1536'))  # pixels, longest side
+    IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'JPEG')  # JPEG, WEBP or PNG
+    IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', '85'))
+    IMAGE_GIF_FRAMES = int(os.getenv('IMAGE_GIF_FRAMES', '1'))  # >1 sends a strip of sampled frames
+
+    # Conversation context: recent turns packed into each prompt, older ones summarized
+    CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '2000'))
+    CONTEXT_MAX_TURNS = int(os.getenv('CONTEXT_MAX_TURNS', '20'))
+    CONTEXT_SUMMARY_WORDS = int(os.getenv('CONTEXT_SUMMARY_WORDS', '150'))
+
+    # Sessions: short-lived access tokens, refresh tokens stored (hashed) in user_sessions
+    ACCESS_TOKEN_EXPIRES_MINUTES = int(os.getenv('ACCESS_TOKEN_EXPIRES_MINUTES', '60'))
+    SESSION_TTL_DAYS = int(os.getenv('SESSION_TTL_DAYS', '30'))  # refresh token lifetime
+    SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', '10000'))
+    SESSION_CACHE_TTL = float(os.getenv('SESSION_CACHE_TTL', '30'))  # seconds before revocation reaches other workers
+    SESSION_SWEEP_INTERVAL = float(os.getenv('SESSION_SWEEP_INTERVAL', '3600'))  # seconds, per worker
+    SESSION_SWEEP_BATCH = int(os.getenv('SESSION_SWEEP_BATCH', '1000'))  # expired rows deleted per statement
+
+    # Verified access tokens remembered per worker until they expire (0 disables)
+    AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', '10000'))
+
+    # Password hashing: new hashes use this scheme/cost; older ones are upgraded on login
+    PASSWORD_SCHEME = os.getenv('PASSWORD_SCHEME', 'pbkdf2_sha256')  # or bcrypt / argon2 (needs the package)
+    PASSWORD_ROUNDS = int(os.getenv('PASSWORD_ROUNDS')) if os.getenv('PASSWORD_ROUNDS') else None  # scheme default
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))  # per worker process, ~cores used by logins
+    PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', '32'))
+    PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', '10'))  # seconds
 
     # AI
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+    GEMINI_FAKE = os.getenv('GEMINI_FAKE', 'False').lower() == 'true'  # offline fake model for tests
+    GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')
+    # Outbound concurrency (AIMD limit per worker process, bounded FIFO wait queue)
+    GEMINI_CONCURRENCY_INITIAL = int(os.getenv('GEMINI_CONCURRENCY_INITIAL', '8'))
+    GEMINI_CONCURRENCY_MIN = int(os.getenv('GEMINI_CONCURRENCY_MIN', '1'))
+    GEMINI_CONCURRENCY_MAX = int(os.getenv('GEMINI_CONCURRENCY_MAX', '64'))
+    GEMINI_QUEUE_SIZE = int(os.getenv('GEMINI_QUEUE_SIZE', '100'))
+    GEMINI_QUEUE_TIMEOUT = float(os.getenv('GEMINI_QUEUE_TIMEOUT', '10'))  # seconds before a waiting call is shed
+    GEMINI_LATENCY_THRESHOLD = float(os.getenv('GEMINI_LATENCY_THRESHOLD', '15'))  # slower calls shrink the limit
+    GEMINI_CALL_DEADLINE = float(os.getenv('GEMINI_CALL_DEADLINE', '60'))  # seconds per call, retries included
+    GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '2'))
+    GEMINI_RETRY_BASE_DELAY = float(os.getenv('GEMINI_RETRY_BASE_DELAY', '0.5'))
+    GEMINI_RETRY_MAX_DELAY = float(os.getenv('GEMINI_RETRY_MAX_DELAY', '8'))
+    GEMINI_BREAKER_FAILURES = int(os.getenv('GEMINI_BREAKER_FAILURES', '5'))  # consecutive failures that open the circuit
+    GEMINI_BREAKER_RESET = float(os.getenv('GEMINI_BREAKER_RESET', '30'))  # seconds before a trial call
+    GEMINI_HEDGE_ENABLED = os.getenv('GEMINI_HEDGE_ENABLED', 'False').lower() == 'true'
+    GEMINI_HEDGE_MIN_DELAY = float(os.getenv('GEMINI_HEDGE_MIN_DELAY', '1'))  # hedge after max(p95, this)
+    GEMINI_TRANSPORT = os.getenv('GEMINI_TRANSPORT') or None  # 'grpc' (SDK default) or 'rest'
+    GEMINI_TEMPERATURE = float(os.getenv('GEMINI_TEMPERATURE')) if os.getenv('GEMINI_TEMPERATURE') else None
+    GEMINI_TOP_P = float(os.getenv('GEMINI_TOP_P')) if os.getenv('GEMINI_TOP_P') else None
+    GEMINI_MAX_OUTPUT_TOKENS = int(os.getenv('GEMINI_MAX_OUTPUT_TOKENS')) if os.getenv('GEMINI_MAX_OUTPUT_TOKENS') else None
 
     # CORS
     CORS_ORIGINS = [
@@ -0,0 +1,209 @@
+"""
+Conversations and the token-budgeted context window sent with each prompt
+
+Recent turns of a conversation are packed verbatim, newest first, until
+CONTEXT_TOKEN_BUDGET is used up or CONTEXT_MAX_TURNS turns are in. Turns
+outside that window are folded, oldest first, into a running summary
+stored on the conversation row. Summarisation runs in
+the background after the reply, so prompt size and latency stay flat as a
+conversation grows.
+"""
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from db_pool import get_pool
+from message_writer import writer as message_writer
+
+logger = logging.getLogger(__name__)
+
+MAX_TURN_CHARS = 2000  # a single long answer (e.g. a document analysis) is clipped in context
+FOLD_BATCH = 200  # turns per summarisation call when catching up on a long backlog
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='summarizer')
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token) without a tokenizer round trip."""
+    return len(text) // 4 + 1
+
+
+def format_turn(turn):
+    bot_response = turn['bot_response'] or ''
+    if len(bot_response) > MAX_TURN_CHARS:
+        bot_response = bot_response[:MAX_TURN_CHARS] + " [...]"
+    return f"User: {turn['user_message'] or '(sent files)'}\nAssistant: {bot_response}"
+
+
+def create_conversation(user_id, title):
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "INSERT INTO conversations (user_id, title) VALUES (%s, %s)",
+                (user_id, title[:255])
+            )
+            conn.commit()
+            return cursor.lastrowid
+        finally:
+            cursor.close()
+
+
+def get_conversation(conversation_id, user_id):
+    with get_pool().connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("""
+                SELECT id, title, summary, summary_upto_id
+                FROM conversations
+                WHERE id = %s AND user_id = %s
+            """, (conversation_id, user_id))
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+
+
+def _fetch_turns(conversation_id, after_id, limit):
+    """Turns newer than after_id, newest first."""
+    with get_pool().connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("""
+                SELECT id, user_message, bot_response, created_at
+                FROM chat_messages
+                WHERE conversation_id = %s AND id > %s
+                ORDER BY id DESC
+                LIMIT %s
+            """, (conversation_id, after_id or 0, limit))
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+
+def _fetch_oldest_turns(conversation_id, after_id, before_id, limit):
+    """Turns with after_id < id < before_id, oldest first."""
+    with get_pool().connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("""
+                SELECT id, user_message, bot_response, created_at
+                FROM chat_messages
+                WHERE conversation_id = %s AND id > %s AND id < %s
+                ORDER BY id
+                LIMIT %s
+            """, (conversation_id, after_id or 0, before_id, limit))
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+
+def _with_pending(conversation_id, limit, fetch):
+    """Committed turns plus those still queued by the write-behind writer, newest first."""
+    # Read the queue before the table: a row committed in between shows up in both and is dropped
+    # from the pending side, never missed by both
+    pending = message_writer.pending_turns(conversation_id)
+    turns = fetch(limit)
+    if not pending:
+        return turns
+    committed = {(turn['created_at'], turn['user_message'], turn['bot_response']) for turn in turns}
+    pending = [turn for turn in pending
+               if (turn['created_at'], turn['user_message'], turn['bot_response']) not in committed]
+    return (pending + turns)[:limit]
+
+
+def _pack(turns, budget):
+    """Take turns newest first while they fit; returns (packed oldest first, tokens used)."""
+    packed, used = [], 0
+    for turn in turns:
+        text = format_turn(turn)
+        cost = estimate_tokens(text)
+        if used + cost > budget:
+            break
+        packed.append((turn, text))
+        used += cost
+    packed.reverse()
+    return packed, used
+
+
+def build_context(conversation):
+    """Return (context text, needs_summary) for the next prompt of a conversation."""
+    budget = Config.CONTEXT_TOKEN_BUDGET
+    summary = conversation['summary'] or ''
+    # One row past the window tells us older unsummarised turns exist
+    turns = _with_pending(conversation['id'], Config.CONTEXT_MAX_TURNS + 1,
+                          lambda limit: _fetch_turns(conversation['id'], conversation['summary_upto_id'], limit))
+    window = turns[:Config.CONTEXT_MAX_TURNS]
+
+    packed, _ = _pack(window, budget - estimate_tokens(summary))
+    needs_summary = len(packed) < len(turns)
+
+    sections = []
+    if summary:
+        sections.append(f"Summary of the earlier conversation:\n{summary}")
+    if packed:
+        sections.append("Recent conversation:\n" + "\n\n".join(text for _, text in packed))
+    return "\n\n".join(sections), needs_summary
+
+
+def with_context(context, user_message):
+    if not context:
+        return user_message
+    return f"{context}\n\nContinue the conversation. User: {user_message}"
+
+
+def _refresh_summary(conversation_id, user_id, summarize_fn):
+    try:
+        while True:
+            conversation = get_conversation(conversation_id, user_id)
+            if not conversation:
+                return
+            # Keep the newest half of the context window (turns and tokens) verbatim and fold
+            # everything older, so the next summary is due only after the window refills.
+            recent = _fetch_turns(conversation_id, conversation['summary_upto_id'],
+                                  max(1, Config.CONTEXT_MAX_TURNS // 2))
+            kept, _ = _pack(recent, Config.CONTEXT_TOKEN_BUDGET // 2)
+            if kept:
+                oldest_kept = kept[0][0]['id']
+            elif recent:
+                oldest_kept = recent[0]['id'] + 1
+            else:
+                return
+            folded = _fetch_oldest_turns(conversation_id, conversation['summary_upto_id'], oldest_kept, FOLD_BATCH)
+            if not folded:
+                return
+
+            summary = summarize_fn(conversation['summary'], [format_turn(turn) for turn in folded])
+            with get_pool().connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    # Only apply if nobody else moved the summary forward meanwhile
+                    cursor.execute("""
+                        UPDATE conversations
+                        SET summary = %s, summary_upto_id = %s
+                        WHERE id = %s AND (summary_upto_id <=> %s)
+                    """, (summary, folded[-1]['id'], conversation_id, conversation['summary_upto_id']))
+                    conn.commit()
+                    applied = cursor.rowcount == 1
+                finally:
+                    cursor.close()
+            if not applied or len(folded) < FOLD_BATCH:
+                return
+    except Exception as e:
+        logger.exception("Failed to summarize conversation", extra={'conversation_id': conversation_id})
+    finally:
+        with _in_flight_lock:
+            _in_flight.discard(conversation_id)
+
+
+def schedule_summary(conversation_id, user_id, summarize_fn):
+    """Fold turns outside the context window into the conversation summary in the background."""
+    with _in_flight_lock:
+        if conversation_id in _in_flight:
+            return
+        _in_flight.add(conversation_id)
+    # Carry the request's context so the summary's log records keep its request id
+    _executor.submit(contextvars.copy_context().run, _refresh_summary, conversation_id, user_id, summarize_fn)
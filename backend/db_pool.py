@@ -0,0 +1,294 @@
+"""
+MySQL connection pool for the AI Chatbot Backend
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+
+from config import Config
+from metrics import db_connection_wait, db_query_duration, statement_label
+
+
+_NEW_SLOT = object()
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the pool timeout."""
+
+
+class PooledConnection:
+    """Proxy around a MySQL connection that returns it to the pool on close()."""
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._checked_out_at = time.monotonic()
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self.__getattr__('cursor')(*args, **kwargs))
+
+    def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool._checkin(raw, self._created_at, self._checked_out_at)
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise mysql.connector.InterfaceError("Connection already returned to the pool")
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # Safety net for a caller that never reached close(): without it the slot is lost
+        # for the life of the worker. A finalizer can run while this thread holds the pool
+        # lock, so the connection is only queued here; the next checkout takes it back.
+        raw = self.__dict__.get('_raw')
+        if raw is not None:
+            self._raw = None
+            self._pool._abandoned.append((raw, self._created_at, self._checked_out_at))
+
+
+class TimedCursor:
+    """Cursor proxy recording execute/executemany time per statement kind."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, *args, **kwargs):
+        with db_query_duration.time(statement_label(operation)):
+            return self._cursor.execute(operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        with db_query_duration.time(statement_label(operation)):
+            return self._cursor.executemany(operation, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class ConnectionPool:
+    """Thread-safe pool with overflow, idle recycling and health-ping on checkout."""
+
+    def __init__(self, db_config, size=5, max_overflow=10, timeout=30.0,
+                 recycle=1800, pre_ping=True):
+        self.db_config = dict(db_config)
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._idle = deque()  # (raw, created_at, last_used)
+        self._waiters = deque()  # [Event, handed-over item]
+        self._abandoned = deque()  # (raw, created_at, checked_out_at) garbage-collected unclosed
+        self._open = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'connections_created': 0,
+            'connections_recycled': 0,
+            'connections_abandoned': 0,
+            'ping_failures': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'hold_time_total': 0.0,
+        }
+
+    def _connect(self):
+        raw = mysql.connector.connect(**self.db_config)
+        with self._lock:
+            self._stats['connections_created'] += 1
+        return raw, time.monotonic()
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def connection(self):
+        """Check a connection out of the pool, waiting up to ``timeout`` seconds.
+
+        Waiters are served in FIFO order: a returned connection is handed
+        straight to the oldest waiter so late arrivals cannot barge ahead.
+        """
+        self._reclaim_abandoned()
+        started = time.monotonic()
+        waiter = None
+        with self._lock:
+            if self._idle and not self._waiters:
+                item = self._idle.pop()  # LIFO keeps hot connections warm
+            elif self._open < self.size + self.max_overflow and not self._waiters:
+                self._open += 1
+                item = _NEW_SLOT
+            else:
+                waiter = [threading.Event(), None]
+                self._waiters.append(waiter)
+
+        if waiter is not None:
+            waiter[0].wait(self.timeout)
+            with self._lock:
+                item = waiter[1]
+                if item is None:
+                    self._waiters.remove(waiter)
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f"No database connection available after {self.timeout}s "
+                        f"(size={self.size}, max_overflow={self.max_overflow})"
+                    )
+
+        try:
+            if item is _NEW_SLOT:
+                raw, created_at = self._connect()
+            else:
+                raw, created_at, last_used = item
+                raw, created_at = self._revalidate(raw, created_at, last_used)
+        except Exception:
+            with self._lock:
+                self._release_slot()
+            raise
+
+        waited = time.monotonic() - started
+        db_connection_wait.observe(waited)
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['wait_time_total'] += waited
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+        return PooledConnection(self, raw, created_at)
+
+    def _release_slot(self):
+        # Caller holds the lock. A freed slot goes to the next waiter, if any.
+        if self._waiters:
+            waiter = self._waiters.popleft()
+            waiter[1] = _NEW_SLOT
+            waiter[0].set()
+        else:
+            self._open -= 1
+
+    def _revalidate(self, raw, created_at, last_used):
+        if self.recycle and time.monotonic() - last_used > self.recycle:
+            self._discard(raw)
+            with self._lock:
+                self._stats['connections_recycled'] += 1
+            return self._connect()
+
+        if self.pre_ping:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                self._discard(raw)
+                with self._lock:
+                    self._stats['ping_failures'] += 1
+                return self._connect()
+
+        return raw, created_at
+
+    def _reclaim_abandoned(self):
+        while self._abandoned:
+            try:
+                raw, created_at, checked_out_at = self._abandoned.popleft()
+            except IndexError:
+                return
+            with self._lock:
+                self._stats['connections_abandoned'] += 1
+            self._checkin(raw, created_at, checked_out_at)
+
+    def _checkin(self, raw, created_at, checked_out_at):
+        healthy = True
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+        except Exception:
+            healthy = False
+
+        with self._lock:
+            self._stats['hold_time_total'] += time.monotonic() - checked_out_at
+            if healthy and self._waiters:
+                waiter = self._waiters.popleft()
+                waiter[1] = (raw, created_at, time.monotonic())
+                waiter[0].set()
+                raw = None
+            elif healthy and len(self._idle) < self.size:
+                self._idle.append((raw, created_at, time.monotonic()))
+                raw = None
+            else:
+                self._release_slot()
+
+        if raw is not None:
+            self._discard(raw)
+
+    def dispose(self):
+        """Close every idle connection (checked-out ones close on return)."""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+        for raw, _, _ in idle:
+            self._discard(raw)
+
+    def stats(self):
+        self._reclaim_abandoned()
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['max_overflow'] = self.max_overflow
+            stats['open'] = self._open
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._open - len(self._idle)
+        checkouts = stats['checkouts'] or 1
+        stats['wait_time_avg'] = stats['wait_time_total'] / checkouts
+        stats['hold_time_avg'] = stats['hold_time_total'] / checkouts
+        stats['pid'] = os.getpid()
+        return stats
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return this process's pool, building a fresh one after a fork.
+
+    Gunicorn forks workers from the master, so each worker must open its own
+    sockets instead of sharing the parent's.
+    """
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool(
+                    Config.DB_CONFIG,
+                    size=Config.DB_POOL_SIZE,
+                    max_overflow=Config.DB_POOL_MAX_OVERFLOW,
+                    timeout=Config.DB_POOL_TIMEOUT,
+                    recycle=Config.DB_POOL_RECYCLE,
+                    pre_ping=Config.DB_POOL_PRE_PING,
+                )
+                _pool_pid = pid
+    return _pool
+
+
+def use_pool(pool):
+    """Install ``pool`` as this process's pool instead of a MySQL one.
+
+    Used by the offline load test, which runs the app against an in-memory
+    stand-in (benchmarks/memory_db.py) exposing the same connection() API.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        _pool = pool
+        _pool_pid = os.getpid()
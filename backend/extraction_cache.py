@@ -0,0 +1,162 @@
+"""
+Content-addressed cache for document extraction results
+
+Entries are keyed by the SHA-256 of the uploaded bytes, so a follow-up
+question about an identical file reuses the extracted text (DOCX/TXT) or
+the Gemini file handle (PDF) instead of parsing or uploading it again.
+Two tiers: an in-process LRU bounded by bytes, backed by a disk directory
+bounded by total size. Both honour a per-entry TTL.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class ExtractionCache:
+    def __init__(self, disk_dir, ttl=86400, memory_max_bytes=64 * 1024 * 1024,
+                 disk_max_bytes=512 * 1024 * 1024, enabled=True):
+        self.disk_dir = disk_dir
+        self.ttl = ttl
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.enabled = enabled
+
+        self._memory = OrderedDict()  # key -> (expires_at, value, size)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._disk_bytes = None  # computed lazily on first write
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+        if enabled:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        # Shard on the hash, not the "{kind}-" prefix, so entries spread over 256 directories
+        sha256 = key.rpartition('-')[2]
+        return os.path.join(self.disk_dir, sha256[:2], f"{key}.json")
+
+    def get(self, kind, sha256):
+        """Return the cached dict for (kind, sha256), or None."""
+        if not self.enabled:
+            return None
+        key = f"{kind}-{sha256}"
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return entry[1]
+                self._evict_memory(key)
+
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.stats['misses'] += 1
+            return None
+
+        if record['expires_at'] <= now:
+            self._remove_disk(path)
+            with self._lock:
+                self.stats['misses'] += 1
+            return None
+
+        os.utime(path)  # mtime doubles as the disk tier's LRU clock
+        with self._lock:
+            self.stats['disk_hits'] += 1
+            self._put_memory(key, record['value'], record['expires_at'])
+        return record['value']
+
+    def set(self, kind, sha256, value, ttl=None):
+        """Store a JSON-serialisable dict for (kind, sha256) in both tiers."""
+        if not self.enabled:
+            return
+        key = f"{kind}-{sha256}"
+        expires_at = time.time() + (ttl if ttl is not None else self.ttl)
+
+        with self._lock:
+            self._put_memory(key, value, expires_at)
+
+        payload = json.dumps({'expires_at': expires_at, 'value': value})
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)  # atomic, so readers never see half a file
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk_bytes()
+            else:
+                self._disk_bytes += len(payload)
+            over_limit = self._disk_bytes > self.disk_max_bytes
+        if over_limit:
+            self._trim_disk()
+
+    def delete(self, kind, sha256):
+        key = f"{kind}-{sha256}"
+        with self._lock:
+            self._evict_memory(key)
+        self._remove_disk(self._disk_path(key))
+
+    # Memory tier (caller holds the lock)
+
+    def _put_memory(self, key, value, expires_at):
+        size = len(json.dumps(value))
+        if size > self.memory_max_bytes:
+            return
+        self._evict_memory(key)
+        self._memory[key] = (expires_at, value, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_max_bytes:
+            oldest = next(iter(self._memory))
+            self._evict_memory(oldest)
+
+    def _evict_memory(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[2]
+
+    # Disk tier
+
+    def _entries_on_disk(self):
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def _scan_disk_bytes(self):
+        return sum(size for _, size, _ in self._entries_on_disk())
+
+    def _remove_disk(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _trim_disk(self):
+        """Drop least recently used files until the tier is back under 90% of its limit."""
+        entries = sorted(self._entries_on_disk(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_max_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            self._remove_disk(path)
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
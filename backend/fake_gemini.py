@@ -0,0 +1,110 @@
+"""
+Offline stand-in for google.generativeai used when GEMINI_FAKE=true.
+
+Mirrors the small part of the SDK the backend calls (configure,
+GenerativeModel.generate_content with and without stream=True, and the
+Files API) and returns deterministic text so tests run without network.
+
+``latency`` (seconds, or a callable returning seconds) and ``error_rate``
+simulate a slow or failing upstream; they default to GEMINI_FAKE_LATENCY
+and GEMINI_FAKE_ERROR_RATE.
+"""
+import hashlib
+import os
+import random
+import re
+import time
+import uuid
+from types import SimpleNamespace
+
+_files = {}
+
+latency = float(os.getenv('GEMINI_FAKE_LATENCY', '0'))
+error_rate = float(os.getenv('GEMINI_FAKE_ERROR_RATE', '0'))
+
+
+class ServiceUnavailable(Exception):
+    """Stands in for google.api_core.exceptions.ServiceUnavailable."""
+    code = 503
+
+
+def _simulate_call():
+    delay = latency() if callable(latency) else latency
+    if delay:
+        time.sleep(delay)
+    if error_rate and random.random() < error_rate:
+        raise ServiceUnavailable("503 The model is overloaded. Please try again later.")
+
+
+def configure(**kwargs):
+    """Accept and ignore SDK configuration (api_key, transport, ...)."""
+
+
+def _describe(contents):
+    """Build a short, deterministic description of the request contents."""
+    if isinstance(contents, str):
+        return contents
+    parts = []
+    for part in contents:
+        if isinstance(part, str):
+            parts.append(part)
+        elif isinstance(part, FakeFile):
+            parts.append(f"[file {part.display_name}]")
+        else:
+            parts.append("[inline data]")
+    return " ".join(parts)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class GenerativeModel:
+    def __init__(self, model_name='gemini-1.5-flash', generation_config=None, **kwargs):
+        self.model_name = model_name
+        self.generation_config = generation_config
+
+    def _reply(self, contents):
+        prompt = _describe(contents)
+        return f"Fake {self.model_name} reply to: {prompt[-200:]}"
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        _simulate_call()
+        text = self._reply(contents)
+        if not stream:
+            return FakeResponse(text)
+        words = text.split(' ')
+        return (FakeResponse(word + (' ' if i < len(words) - 1 else ''))
+                for i, word in enumerate(words))
+
+
+def embed_content(model, content, **kwargs):
+    """Deterministic bag-of-words embedding so similar prompts score close."""
+    _simulate_call()
+    vector = [0.0] * 64
+    for word in re.findall(r'\w+', str(content).lower()):
+        vector[int(hashlib.md5(word.encode('utf-8')).hexdigest(), 16) % 64] += 1.0
+    return {'embedding': vector}
+
+
+class FakeFile:
+    def __init__(self, path, display_name=None):
+        self.name = f"files/{uuid.uuid4().hex[:12]}"
+        self.display_name = display_name or os.path.basename(str(path))
+        self.state = SimpleNamespace(name="ACTIVE")
+
+
+def upload_file(path, **kwargs):
+    _simulate_call()
+    uploaded = FakeFile(path, kwargs.get('display_name'))
+    _files[uploaded.name] = uploaded
+    return uploaded
+
+
+def get_file(name):
+    return _files[name]
+
+
+def delete_file(name):
+    _files.pop(name, None)
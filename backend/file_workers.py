@@ -0,0 +1,100 @@
+"""
+Bounded thread pool for processing uploaded files
+
+Each process runs attachments (Gemini uploads, DOCX/TXT extraction, image
+calls) on FILE_PROCESSING_WORKERS threads of its own, separate from the
+gunicorn request threads and the job pool. At most
+FILE_PROCESSING_QUEUE_SIZE more files wait for a thread; beyond that, or
+when a file has waited FILE_PROCESSING_QUEUE_TIMEOUT seconds without
+starting, the request gets FileProcessingBusy (a 503). A file's
+FILE_PROCESSING_TIMEOUT only starts counting once a thread picks it up, so
+time spent queued behind other requests never uses it up.
+"""
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+
+
+class FileProcessingBusy(Exception):
+    """Raised when a file cannot get a processing thread in time."""
+
+    def __init__(self, message="The server is busy processing other files. Please try again shortly.",
+                 retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+_executor = None
+_executor_pid = None
+_slots = threading.BoundedSemaphore(Config.FILE_PROCESSING_WORKERS + Config.FILE_PROCESSING_QUEUE_SIZE)
+_lock = threading.Lock()
+
+
+def _get_executor():
+    # Threads do not survive fork; each gunicorn worker starts its own pool
+    global _executor, _executor_pid
+    if _executor_pid != os.getpid():
+        with _lock:
+            if _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=Config.FILE_PROCESSING_WORKERS,
+                                               thread_name_prefix='file-worker')
+                _executor_pid = os.getpid()
+    return _executor
+
+
+class FileTask:
+    """A file queued on the pool; result() times the work from when it started."""
+
+    def __init__(self, func, *args):
+        self._func = func
+        self._args = args
+        self._context = contextvars.copy_context()
+        self._started = threading.Event()
+        self.started_at = None
+        self.finished_at = None
+        self.submitted_at = time.monotonic()
+        self.future = None
+
+    def _run(self):
+        self.started_at = time.monotonic()
+        self._started.set()
+        try:
+            return self._context.run(self._func, *self._args)
+        finally:
+            self.finished_at = time.monotonic()
+
+    def cancel(self):
+        """Drop the task if no thread has picked it up; True if it will never run."""
+        return self.future.cancel()
+
+    def result(self, timeout):
+        """Wait for the result, at most ``timeout`` seconds after the work started.
+
+        Raises FileProcessingBusy if the task is still queued after
+        FILE_PROCESSING_QUEUE_TIMEOUT (it is then dropped) and TimeoutError if
+        it runs out of time.
+        """
+        queue_left = self.submitted_at + Config.FILE_PROCESSING_QUEUE_TIMEOUT - time.monotonic()
+        if not self._started.wait(max(0, queue_left)) and self.cancel():
+            raise FileProcessingBusy()
+        self._started.wait()  # picked up just as the queue wait ran out
+        return self.future.result(timeout=max(0, self.started_at + timeout - time.monotonic()))
+
+
+def submit(func, *args):
+    """Queue func(*args) with the caller's context; raises FileProcessingBusy when the queue is full."""
+    if not _slots.acquire(blocking=False):
+        raise FileProcessingBusy()
+    task = FileTask(func, *args)
+    try:
+        task.future = _get_executor().submit(task._run)
+    except BaseException:
+        _slots.release()
+        raise
+    # The slot is held until the file is done (or dropped), even if the caller stops waiting
+    task.future.add_done_callback(lambda _: _slots.release())
+    return task
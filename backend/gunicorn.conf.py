@@ -0,0 +1,28 @@
+"""
+Gunicorn configuration for the AI Chatbot Backend
+
+    gunicorn -c gunicorn.conf.py
+
+Serves app:app with gthread workers. Each request holds one thread while it
+waits on Gemini, so a worker process has at most GUNICORN_THREADS requests
+in flight and the server GUNICORN_WORKERS x GUNICORN_THREADS. Idle threads
+only cost memory: raise GUNICORN_THREADS for more concurrent slow calls.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+
+wsgi_app = 'app:app'
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '64'))
+
+# PDF processing can poll Gemini for up to a minute
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
@@ -0,0 +1,101 @@
+"""
+Chat history queries: keyset pagination over (created_at, id)
+"""
+import base64
+import json
+from datetime import datetime
+
+from db_pool import get_pool
+
+SUMMARY_LENGTH = 300  # characters of bot_response returned in summary rows
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, message_id):
+    raw = json.dumps([created_at.isoformat(), message_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, message_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(message_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def fetch_history_page(user_id, cursor=None, limit=50, message_type='all', full=False):
+    """Return one page of a user's history, newest first.
+
+    Rows are summaries (bot_response cut to SUMMARY_LENGTH characters, with
+    response_truncated set) unless ``full`` is true. ``next_cursor`` is None
+    on the last page.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    body = "bot_response" if full else f"LEFT(bot_response, {SUMMARY_LENGTH})"
+    query = f"""
+        SELECT id, conversation_id, user_message, {body} AS bot_response,
+               CHAR_LENGTH(bot_response) > {SUMMARY_LENGTH} AS response_truncated,
+               files_info, created_at
+        FROM chat_messages
+        WHERE user_id = %s
+    """
+    params = [user_id]
+
+    if cursor:
+        created_at, message_id = decode_cursor(cursor)
+        # Expanded form of (created_at, id) < (%s, %s) so MySQL uses a range scan
+        query += " AND (created_at < %s OR (created_at = %s AND id < %s))"
+        params += [created_at, created_at, message_id]
+
+    if message_type == 'files':
+        query += " AND JSON_LENGTH(files_info) > 0"
+    elif message_type == 'text':
+        query += " AND (files_info IS NULL OR JSON_LENGTH(files_info) = 0)"
+
+    query += " ORDER BY created_at DESC, id DESC LIMIT %s"
+    params.append(limit + 1)  # one extra row tells us whether another page exists
+
+    with get_pool().connection() as conn:
+        db_cursor = conn.cursor(dictionary=True)
+        try:
+            db_cursor.execute(query, params)
+            rows = db_cursor.fetchall()
+        finally:
+            db_cursor.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id']) if has_more else None
+
+    for row in rows:
+        row['files_info'] = json.loads(row['files_info'] or '[]')
+        row['created_at'] = row['created_at'].isoformat()
+        row['response_truncated'] = bool(row['response_truncated']) and not full
+
+    return {"messages": rows, "next_cursor": next_cursor, "has_more": has_more}
+
+
+def fetch_message(user_id, message_id):
+    """Return one full history row, or None."""
+    with get_pool().connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("""
+                SELECT id, conversation_id, user_message, bot_response, files_info, created_at
+                FROM chat_messages
+                WHERE id = %s AND user_id = %s
+            """, (message_id, user_id))
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+
+    if row:
+        row['files_info'] = json.loads(row['files_info'] or '[]')
+        row['created_at'] = row['created_at'].isoformat()
+    return row
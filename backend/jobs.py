@@ -0,0 +1,129 @@
+"""
+Background job pipeline for slow attachment processing (PDF upload, polling, generation)
+
+Jobs are recorded in the processing_jobs table so any worker process can
+answer GET /jobs/<id>, while the work itself runs on a thread pool in the
+process that received the upload. If that process goes away (restart,
+deploy, crash) the job never finishes; a job still queued or running
+JOB_STALE_AFTER seconds after its last update is marked failed when read.
+"""
+import contextvars
+import json
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from config import Config
+from db_pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {'completed', 'failed'}
+STALE_ERROR = "Processing was interrupted. Please send the file again."
+
+_executor = ThreadPoolExecutor(max_workers=Config.JOB_WORKERS, thread_name_prefix='job-worker')
+
+
+def create_job(user_id, user_message, files_info):
+    """Insert a queued job and return its id."""
+    job_id = uuid.uuid4().hex
+    # Timestamps come from this clock, not the database's, so the stale check compares like with like
+    now = datetime.now()
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                INSERT INTO processing_jobs (id, user_id, status, user_message, files_info, created_at, updated_at)
+                VALUES (%s, %s, 'queued', %s, %s, %s, %s)
+            """, (job_id, user_id, user_message, json.dumps(files_info), now, now))
+            conn.commit()
+        finally:
+            cursor.close()
+    return job_id
+
+
+def _update_job(job_id, status, result=None, files_info=None, error=None):
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                UPDATE processing_jobs
+                SET status = %s, result = %s, files_info = COALESCE(%s, files_info), error = %s, updated_at = %s
+                WHERE id = %s
+            """, (status, result, json.dumps(files_info) if files_info is not None else None, error,
+                  datetime.now(), job_id))
+            conn.commit()
+        finally:
+            cursor.close()
+
+
+def _run_job(job_id, func, args):
+    try:
+        _update_job(job_id, 'running')
+        reply, files_info = func(*args)
+        _update_job(job_id, 'completed', result=reply, files_info=files_info)
+    except Exception as e:
+        logger.exception("Job failed", extra={'job_id': job_id})
+        _update_job(job_id, 'failed', error=str(e))
+
+
+def submit_job(job_id, func, *args):
+    """Run func(*args) on the job pool; it must return (reply, files_info)."""
+    # Carry the request's context so the job's log records keep its request id
+    _executor.submit(contextvars.copy_context().run, _run_job, job_id, func, args)
+
+
+def _fail_if_stale(job):
+    """Mark a job failed if no worker has touched it for JOB_STALE_AFTER seconds."""
+    cutoff = datetime.now() - timedelta(seconds=Config.JOB_STALE_AFTER)
+    if job['status'] in TERMINAL_STATUSES or job['updated_at'] >= cutoff:
+        return job
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            # Conditional, so a job that finished meanwhile keeps its result
+            cursor.execute("""
+                UPDATE processing_jobs
+                SET status = 'failed', error = %s, updated_at = %s
+                WHERE id = %s AND status IN ('queued', 'running') AND updated_at < %s
+            """, (STALE_ERROR, datetime.now(), job['id'], cutoff))
+            conn.commit()
+            marked = cursor.rowcount == 1
+        finally:
+            cursor.close()
+    if not marked:
+        return None
+    logger.warning("Marked stale job failed", extra={'job_id': job['id'], 'last_status': job['status']})
+    return dict(job, status='failed', error=STALE_ERROR, updated_at=datetime.now())
+
+
+def get_job(job_id, user_id):
+    """Return the job as a JSON-ready dict, or None if the user has no such job."""
+    with get_pool().connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("""
+                SELECT id, status, result, files_info, error, created_at, updated_at
+                FROM processing_jobs
+                WHERE id = %s AND user_id = %s
+            """, (job_id, user_id))
+            job = cursor.fetchone()
+        finally:
+            cursor.close()
+
+    if not job:
+        return None
+    stale = _fail_if_stale(job)
+    if stale is None:
+        return get_job(job_id, user_id)  # finished while we looked
+    job = stale
+    return {
+        "job_id": job['id'],
+        "status": job['status'],
+        "reply": job['result'],
+        "files": json.loads(job['files_info'] or '[]'),
+        "error": job['error'],
+        "created_at": job['created_at'].isoformat(),
+        "updated_at": job['updated_at'].isoformat()
+    }
@@ -0,0 +1,165 @@
+"""
+Structured, sampled, non-blocking logging
+
+setup_logging() routes the root logger through a bounded in-memory queue
+drained by one background thread, so a log call on the request path costs
+a dict copy and a put, never a write to stdout. When the queue is full,
+records are dropped and counted rather than making the request wait.
+
+Records are written as one JSON object per line (LOG_FORMAT=json) with the
+request id of the request that produced them; extra={...} fields become
+top-level keys. DEBUG records are sampled per request: with
+LOG_DEBUG_SAMPLE_RATE=0.05 one request in twenty logs all of its debug
+events and the rest log none, so sampled requests stay readable end to end.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import traceback
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from config import Config
+
+request_id_var = ContextVar('request_id', default=None)
+_debug_sampled = ContextVar('debug_sampled', default=None)
+
+# Attributes every LogRecord has; anything else came in through extra={...}
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+_handler = None
+_listener = None
+
+
+def start_request(request_id=None):
+    """Bind a request id (a new one if not given) and the debug sampling decision to the current context."""
+    request_id = request_id or uuid.uuid4().hex
+    request_id_var.set(request_id)
+    _debug_sampled.set(random.random() < Config.LOG_DEBUG_SAMPLE_RATE)
+    return request_id
+
+
+class ContextFilter(logging.Filter):
+    """Stamps the request id and drops DEBUG records of unsampled requests.
+
+    Runs in the thread that logged, where the request's context is visible.
+    """
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        if record.levelno <= logging.DEBUG:
+            sampled = _debug_sampled.get()
+            if sampled is None:
+                sampled = random.random() < Config.LOG_DEBUG_SAMPLE_RATE
+            return sampled
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = ''.join(traceback.format_exception(*record.exc_info))
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = {key: value for key, value in vars(record).items()
+                  if key not in _RECORD_ATTRS and not key.startswith('_')}
+        return f"{line} {json.dumps(fields, default=str)}" if fields else line
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking or raising when full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread; only freeze the message here
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = ''.join(traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _start_listener():
+    global _listener
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if Config.LOG_FORMAT == 'json' else TextFormatter())
+    _listener = QueueListener(_handler.queue, stream_handler, respect_handler_level=False)
+    _listener.start()
+
+
+def _restart_after_fork():
+    # The listener thread does not survive fork; give the child its own queue and thread
+    if _handler is not None:
+        _handler.queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+        _start_listener()
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()  # drains what is already queued
+        _listener = None
+
+
+def setup_logging():
+    """Install the queue handler on the root logger (idempotent)."""
+    global _handler
+    if _handler is not None:
+        return
+    _handler = DroppingQueueHandler(queue.Queue(maxsize=Config.LOG_QUEUE_SIZE))
+    _handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(Config.LOG_LEVEL)
+    # Library debug output (HTTP pools, image decoders) drowns the app's own
+    for noisy in ('asyncio', 'urllib3', 'PIL'):
+        logging.getLogger(noisy).setLevel(max(root.level, logging.INFO))
+    _start_listener()
+
+    os.register_at_fork(after_in_child=_restart_after_fork)
+    atexit.register(_stop_listener)
+
+
+def logging_stats():
+    return {
+        'queued': _handler.queue.qsize() if _handler else 0,
+        'dropped': _handler.dropped if _handler else 0,
+    }
@@ -0,0 +1,382 @@
+"""
+Write-behind persistence for chat_messages (CHAT_WRITE_BEHIND=true)
+
+A finished exchange is appended to a spool file and queued in memory; the
+reply is sent without waiting for MySQL. A background thread inserts
+queued rows with one multi-row executemany() per batch, when
+CHAT_WRITE_BATCH_SIZE rows are waiting or CHAT_WRITE_FLUSH_INTERVAL seconds
+after the first of them arrived, and empties the spool once every spooled
+row is committed. Rows wait for the thread at exit, so a clean shutdown
+flushes everything.
+
+Each worker process writes its own spool file (CHAT_WRITE_SPOOL_PATH plus
+pid and a random suffix) and holds an flock on it. On start, a worker
+replays spool files whose owner is gone, e.g. after a crash, skipping rows
+that were committed before it died. The spool is flushed to the OS on
+every write, which survives a process crash; CHAT_WRITE_SPOOL_FSYNC=true
+also survives a host crash at the cost of an fsync per message.
+
+Only transient errors (lost connection, deadlock, pool timeout) are
+retried. A batch the database refuses for good, e.g. a foreign key error
+for a conversation deleted while its reply was queued, is written again row
+by row. Rows that still fail are logged and dropped, so one bad row cannot
+stall the writer or the replay of a spool file.
+
+Rows still queued are visible to the context builder (pending_turns) and
+are written before /clear-history deletes (flush). /history shows them once
+they are committed.
+
+At most CHAT_WRITE_QUEUE_SIZE rows wait per worker. Beyond that, submit()
+waits up to CHAT_WRITE_QUEUE_TIMEOUT seconds for the writer to catch up and
+then raises ChatWriterBusy without spooling anything, so every row that
+was accepted stays owned by the writer thread.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import mysql.connector
+
+from config import Config
+from db_pool import PoolTimeout, get_pool
+from search_index import on_message_saved
+
+logger = logging.getLogger(__name__)
+
+INSERT_SQL = """
+    INSERT INTO chat_messages (user_id, conversation_id, user_message, bot_response, files_info, created_at)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 30.0
+TRANSIENT_ERRNOS = {1205, 1213}  # lock wait timeout, deadlock
+
+
+class ChatWriterBusy(Exception):
+    """Raised when the write-behind backlog is full and does not drain in time."""
+
+    def __init__(self, message="Too many messages waiting to be saved. Please try again shortly.", retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _params(row):
+    return (row['user_id'], row['conversation_id'], row['user_message'], row['bot_response'],
+            json.dumps(row['files_info']), row['created_at'])
+
+
+def _to_line(row):
+    return json.dumps(dict(row, created_at=row['created_at'].isoformat())) + '\n'
+
+
+def _from_line(line):
+    row = json.loads(line)
+    row['created_at'] = datetime.fromisoformat(row['created_at'])
+    return row
+
+
+def insert_rows(rows):
+    """Insert rows in one statement; returns their ids.
+
+    mysql-connector sends executemany() of an INSERT ... VALUES as a single
+    multi-row INSERT, and InnoDB gives such a statement consecutive ids
+    starting at lastrowid.
+    """
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(INSERT_SQL, [_params(row) for row in rows])
+            conn.commit()
+            first_id = cursor.lastrowid
+        finally:
+            cursor.close()
+    return [first_id + i for i in range(len(rows))]
+
+
+def is_transient(error):
+    """Whether retrying the same insert later can succeed."""
+    if isinstance(error, mysql.connector.Error):
+        return (isinstance(error, (mysql.connector.OperationalError, mysql.connector.InterfaceError))
+                or error.errno in TRANSIENT_ERRNOS)
+    return isinstance(error, (PoolTimeout, OSError))
+
+
+def write_rows(rows, settle):
+    """Insert rows, calling settle(rows, ids) once they are committed.
+
+    A batch refused for a permanent reason is retried one row at a time;
+    a row that still fails is logged and settled with ids=None. Transient
+    errors propagate, and rows settled before them stay settled.
+    """
+    try:
+        ids = insert_rows(rows)
+    except Exception as e:
+        if is_transient(e):
+            raise
+        if len(rows) > 1:
+            for row in rows:
+                write_rows([row], settle)
+            return
+        logger.error("Dropping chat message the database refused: %s", e,
+                     extra={'user_id': rows[0]['user_id'], 'conversation_id': rows[0]['conversation_id']})
+        settle(rows, None)
+        return
+    settle(rows, ids)
+
+
+class ChatMessageWriter:
+    def __init__(self, spool_path, batch_size=100, flush_interval=0.5, max_queue=10000,
+                 queue_timeout=5.0, fsync=False, on_saved=None):
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.fsync = fsync
+        self.on_saved = on_saved
+        self.stats = {'queued': 0, 'written': 0, 'batches': 0, 'rejected': 0, 'dropped': 0,
+                      'failed_flushes': 0, 'recovered': 0}
+
+        self._pid = None
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        self._space = threading.Condition(self._lock)
+
+    def _ensure_started(self):
+        # Started lazily, and again in a forked worker (threads and flocks do not survive fork)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()  # bounded by max_queue through _unflushed
+            self._pending = {}  # conversation id -> rows not yet committed, oldest first
+            self._unflushed = 0  # rows in the spool file not yet committed
+            self._spool_file = self._open_spool()
+            self._thread = threading.Thread(target=self._run, name='chat-writer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _open_spool(self):
+        directory = os.path.dirname(os.path.abspath(self.spool_path))
+        os.makedirs(directory, exist_ok=True)
+        path = f"{self.spool_path}.{os.getpid()}.{uuid.uuid4().hex[:8]}"
+        spool_file = open(path, 'a+', encoding='utf-8')
+        fcntl.flock(spool_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return spool_file
+
+    # -- request side -----------------------------------------------------
+
+    def submit(self, row):
+        """Spool and queue one exchange for writing (created_at is cut to whole seconds, as MySQL stores it).
+
+        Raises ChatWriterBusy, with nothing spooled, if the backlog stays full for queue_timeout seconds.
+        """
+        self._ensure_started()
+        row['created_at'] = row['created_at'].replace(microsecond=0)
+        with self._lock:
+            # The writer is behind (or MySQL is down): push back on this request instead of growing
+            if not self._space.wait_for(lambda: self._unflushed < self.max_queue, self.queue_timeout):
+                self.stats['rejected'] += 1
+                raise ChatWriterBusy()
+            self._spool_file.write(_to_line(row))
+            self._spool_file.flush()
+            if self.fsync:
+                os.fsync(self._spool_file.fileno())
+            self._unflushed += 1
+            self._pending.setdefault(row['conversation_id'], []).append(row)
+            self.stats['queued'] += 1
+            # Queued under the lock, so the writer never sees a row before its bookkeeping
+            self._queue.put_nowait(row)
+
+    def pending_turns(self, conversation_id):
+        """Rows of a conversation that are queued but not committed yet, newest first."""
+        if self._pid != os.getpid():
+            return []
+        with self._lock:
+            return list(reversed(self._pending.get(conversation_id, ())))
+
+    def flush(self, timeout=None):
+        """Wait until every submitted row is committed; returns False on timeout."""
+        if self._pid != os.getpid():
+            return True
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._flushed:
+            while self._unflushed:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._flushed.wait(remaining)
+        return True
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            if self._pid == os.getpid():
+                stats.update(backlog=self._unflushed, queue_depth=self._queue.qsize())
+        return stats
+
+    # -- writer thread ------------------------------------------------------
+
+    def _settle(self, rows, ids):
+        """Forget rows that were committed (ids) or dropped for good (ids=None)."""
+        with self._lock:
+            for row in rows:
+                pending = self._pending.get(row['conversation_id'])
+                if pending:
+                    pending[:] = [other for other in pending if other is not row]
+                    if not pending:
+                        del self._pending[row['conversation_id']]
+            self._unflushed -= len(rows)
+            if ids is None:
+                self.stats['dropped'] += len(rows)
+            else:
+                self.stats['written'] += len(rows)
+                self.stats['batches'] += 1
+            self._space.notify_all()
+            if not self._unflushed:
+                # Everything spooled is in MySQL now (or was refused for good)
+                self._spool_file.truncate(0)
+                self._flushed.notify_all()
+        if ids is not None and self.on_saved:
+            for row, message_id in zip(rows, ids):
+                try:
+                    self.on_saved(row, message_id)
+                except Exception:
+                    logger.exception("on_saved callback failed", extra={'message_id': message_id})
+
+    def _next_batch(self):
+        """Block for the first row, then collect until the batch is full or the interval has passed."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while batch[-1] is not None and len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        self._recover()
+        delay = RETRY_DELAY
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is None
+            rows = [row for row in batch if row is not None]
+            while rows:
+                try:
+                    write_rows(rows, self._settle)
+                    delay = RETRY_DELAY
+                    break
+                except Exception:
+                    # Rows stay queued here and in the spool; retry rather than lose them
+                    rows = self._unsettled(rows)
+                    self.stats['failed_flushes'] += 1
+                    logger.exception("Chat message flush failed; retrying",
+                                     extra={'rows': len(rows), 'retry_in_s': delay})
+                    if stop:
+                        return
+                    time.sleep(delay)
+                    delay = min(delay * 2, MAX_RETRY_DELAY)
+            if stop:
+                return
+
+    def _unsettled(self, rows):
+        with self._lock:
+            return [row for row in rows
+                    if any(pending is row for pending in self._pending.get(row['conversation_id'], ()))]
+
+    def _recover(self):
+        """Replay spool files left behind by processes that no longer hold them."""
+        own = os.path.abspath(self._spool_file.name)
+        for path in glob.glob(f"{glob.escape(self.spool_path)}.*"):
+            if os.path.abspath(path) == own:
+                continue
+            try:
+                with open(path, 'r+', encoding='utf-8') as spool_file:
+                    try:
+                        fcntl.flock(spool_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # a live worker's spool
+                    rows = []
+                    for line in spool_file:
+                        try:
+                            rows.append(_from_line(line))
+                        except ValueError:
+                            # A write torn by the crash; the request it belonged to got an error
+                            logger.warning("Skipping unreadable spool line", extra={'path': path})
+                    missing = [row for row in rows if not self._already_written(row)]
+                    replayed = []
+
+                    def settle(chunk, ids):
+                        if ids is None:
+                            self.stats['dropped'] += len(chunk)
+                            return
+                        replayed.extend(chunk)
+                        if self.on_saved:
+                            for row, message_id in zip(chunk, ids):
+                                self.on_saved(row, message_id)
+
+                    # A transient error leaves the file for the next start; rows written by then are skipped
+                    for start in range(0, len(missing), self.batch_size):
+                        write_rows(missing[start:start + self.batch_size], settle)
+                    os.unlink(path)
+                self.stats['recovered'] += len(replayed)
+                logger.info("Replayed chat message spool", extra={'path': path, 'rows': len(rows),
+                                                                   'inserted': len(replayed)})
+            except Exception:
+                logger.exception("Failed to replay chat message spool", extra={'path': path})
+
+    def _already_written(self, row):
+        # Rows are spooled before they are committed, so a crash can leave committed rows behind
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT 1 FROM chat_messages
+                    WHERE user_id = %s AND created_at = %s AND user_message <=> %s AND conversation_id <=> %s
+                    LIMIT 1
+                """, (row['user_id'], row['created_at'], row['user_message'], row['conversation_id']))
+                return cursor.fetchone() is not None
+            finally:
+                cursor.close()
+
+    def close(self, timeout=10):
+        """Flush what is queued and stop the writer thread (at exit)."""
+        if self._pid != os.getpid():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        with self._lock:
+            # Rows still unflushed stay in the spool and are replayed on the next start
+            if not self._unflushed:
+                self._spool_file.close()
+                os.unlink(self._spool_file.name)
+            self._pid = None
+
+
+def _index_saved(row, message_id):
+    on_message_saved(row['user_id'], dict(row, id=message_id))
+
+
+writer = ChatMessageWriter(
+    Config.CHAT_WRITE_SPOOL_PATH,
+    batch_size=Config.CHAT_WRITE_BATCH_SIZE,
+    flush_interval=Config.CHAT_WRITE_FLUSH_INTERVAL,
+    max_queue=Config.CHAT_WRITE_QUEUE_SIZE,
+    queue_timeout=Config.CHAT_WRITE_QUEUE_TIMEOUT,
+    fsync=Config.CHAT_WRITE_SPOOL_FSYNC,
+    on_saved=_index_saved,
+)
+atexit.register(writer.close)
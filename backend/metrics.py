@@ -0,0 +1,144 @@
+"""
+In-process metrics in the Prometheus text format (GET /metrics)
+
+Histograms and counters are plain dicts of floats behind one lock each;
+observing a value is a bisect over the bucket bounds and two additions,
+cheap enough to leave on for every request. Each worker process keeps its
+own values, so scrape each worker (or sum across them) the same way as
+the per-worker /health endpoints.
+"""
+import bisect
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Seconds: from a cache hit or a DB query up to a slow PDF
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Bytes: 1 KB .. 50 MB (MAX_CONTENT_LENGTH)
+SIZE_BUCKETS = (1024, 10240, 102400, 512000, 1048576, 5242880, 10485760, 26214400, 52428800)
+
+_registry = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {}  # labels -> [per-bucket counts, sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, labels, [('le', _format_bound(bound))])
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {total}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+@lru_cache(maxsize=512)
+def statement_label(query):
+    """'INSERT chat_messages' style label for a SQL string (bounded by the schema, not the data)."""
+    match = re.match(r'\s*(\w+)', query)
+    verb = match.group(1).upper() if match else 'OTHER'
+    table = re.search(r'\b(?:FROM|INTO|UPDATE)\s+`?(\w+)', query, re.IGNORECASE)
+    return f"{verb} {table.group(1)}" if table else verb
+
+
+http_request_duration = Histogram(
+    'http_request_duration_seconds', 'Time to produce the response (streams: until headers are sent)',
+    ('method', 'route', 'status'))
+file_processing_duration = Histogram(
+    'file_processing_duration_seconds', 'Processing time per attachment, extraction and model call included',
+    ('file_type',))
+upload_size = Histogram(
+    'upload_size_bytes', 'Size of uploaded attachments', ('file_type',), buckets=SIZE_BUCKETS)
+gemini_call_duration = Histogram(
+    'gemini_call_duration_seconds', 'Latency of individual Gemini API attempts (streams: until the first chunk)',
+    ('operation',))
+gemini_call_errors = Counter(
+    'gemini_call_errors_total', 'Failed Gemini attempts and calls, by status code or error type',
+    ('operation', 'error'))
+db_connection_wait = Histogram(
+    'db_connection_wait_seconds', 'Time to check a connection out of the pool, connect/ping included')
+db_query_duration = Histogram(
+    'db_query_duration_seconds', 'Time spent in cursor.execute/executemany', ('statement',))
+password_hash_duration = Histogram(
+    'password_hash_duration_seconds', 'Password hash/verify time, queueing for the hashing pool included',
+    ('operation',))
+password_hash_rejected = Counter(
+    'password_hash_rejected_total', 'Hash/verify calls refused because the hashing pool was saturated',
+    ('operation',))
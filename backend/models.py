@@ -0,0 +1,209 @@
+"""
+Gemini client setup and model registry
+
+The SDK is configured once at import and each model is built once per
+process, then shared by every request. GenerativeModel is stateless
+between calls, so one instance per (model, generation config) is safe to
+use from many threads at once.
+
+Models are handed out wrapped in GovernedModel, and uploads, file lookups
+and embeddings go through the functions below, so every outbound Gemini call runs under the
+process's call policy (deadline, retries, circuit breaker, hedging; see
+resilience.py) and takes a slot from its adaptive concurrency limiter
+(see concurrency.py).
+"""
+import os
+import threading
+import time
+
+from concurrency import AdaptiveLimiter
+from config import Config
+from metrics import gemini_call_duration, gemini_call_errors
+from resilience import CallPolicy, CircuitBreaker, LLMUnavailable
+from tracing import span
+
+if Config.GEMINI_FAKE:
+    import fake_gemini as genai  # Offline, deterministic replies for tests
+else:
+    import google.generativeai as genai
+
+_models = {}
+_models_pid = None
+_models_lock = threading.Lock()
+
+
+def _make_limiter():
+    return AdaptiveLimiter(
+        initial=Config.GEMINI_CONCURRENCY_INITIAL,
+        min_limit=Config.GEMINI_CONCURRENCY_MIN,
+        max_limit=Config.GEMINI_CONCURRENCY_MAX,
+        max_queue=Config.GEMINI_QUEUE_SIZE,
+        queue_timeout=Config.GEMINI_QUEUE_TIMEOUT,
+        latency_threshold=Config.GEMINI_LATENCY_THRESHOLD,
+    )
+
+
+def _limiter_has_room():
+    # A hedge is an extra call; only send it when the limiter has a free slot
+    return limiter.in_flight < int(limiter.limit)
+
+
+def _make_policy():
+    return CallPolicy(
+        deadline=Config.GEMINI_CALL_DEADLINE,
+        max_retries=Config.GEMINI_MAX_RETRIES,
+        base_delay=Config.GEMINI_RETRY_BASE_DELAY,
+        max_delay=Config.GEMINI_RETRY_MAX_DELAY,
+        breaker=CircuitBreaker(Config.GEMINI_BREAKER_FAILURES, Config.GEMINI_BREAKER_RESET),
+        hedge=Config.GEMINI_HEDGE_ENABLED,
+        hedge_min_delay=Config.GEMINI_HEDGE_MIN_DELAY,
+        # Hedged calls run on the policy's threads, waiting ones included
+        hedge_workers=Config.GEMINI_CONCURRENCY_MAX + Config.GEMINI_QUEUE_SIZE,
+        should_hedge=_limiter_has_room,
+    )
+
+
+limiter = _make_limiter()
+policy = _make_policy()
+
+
+def _error_label(error):
+    code = getattr(error, 'code', None)
+    return str(code) if isinstance(code, int) else type(error).__name__
+
+
+def _run(operation, attempt, hedgeable=False):
+    """Run ``attempt`` under the policy, counting calls that end without an answer."""
+    try:
+        return policy.run(attempt, hedgeable=hedgeable)
+    except LLMUnavailable as e:
+        gemini_call_errors.inc(operation, type(e).__name__)
+        raise
+
+
+def _governed(operation, func, *args, streaming=False, request_options=None, **kwargs):
+    """One attempt for the policy: wait for a slot, then call with what is left of the deadline.
+
+    ``request_options=None`` means the SDK call takes no request options
+    (the Files API); otherwise the remaining time is passed as its timeout.
+    """
+    def attempt(remaining):
+        deadline = time.monotonic() + remaining
+
+        def send():
+            started = time.perf_counter()
+            try:
+                with span(f'gemini.{operation}'):
+                    if request_options is None:
+                        return func(*args, **kwargs)
+                    options = dict(request_options, timeout=max(0.1, deadline - time.monotonic()))
+                    return func(*args, request_options=options, **kwargs)
+            except Exception as e:
+                gemini_call_errors.inc(operation, _error_label(e))
+                raise
+            finally:
+                gemini_call_duration.observe(time.perf_counter() - started, operation)
+
+        queue_timeout = min(limiter.queue_timeout, remaining)
+        if streaming:
+            return limiter.stream(send, timeout=queue_timeout)
+        return limiter.call(send, timeout=queue_timeout)
+    return attempt
+
+
+class GovernedModel:
+    """A shared GenerativeModel whose calls run under the call policy and the limiter.
+
+    Streams are retried only until they start; once chunks have been sent
+    to the client, a failure ends the stream.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def generate_content(self, contents, stream=False, request_options=None, **kwargs):
+        if stream:
+            kwargs['stream'] = True
+        operation = 'stream' if stream else 'generate'
+        attempt = _governed(operation, self.model.generate_content, contents, streaming=stream,
+                            request_options=request_options or {}, **kwargs)
+        return _run(operation, attempt, hedgeable=not stream)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+def upload_file(path, **kwargs):
+    def upload():
+        if hasattr(path, 'seek'):
+            path.seek(0)  # a retry re-sends the file from the start
+        return genai.upload_file(path, **kwargs)
+    return _run('upload', _governed('upload', upload))
+
+
+def get_file(name):
+    return _run('get_file', _governed('get_file', genai.get_file, name))
+
+
+def delete_file(name):
+    return _run('delete_file', _governed('delete_file', genai.delete_file, name))
+
+
+def embed_content(request_options=None, **kwargs):
+    return _run('embed', _governed('embed', genai.embed_content, request_options=request_options or {}, **kwargs))
+
+
+def limiter_snapshot():
+    return dict(limiter.snapshot(), policy=policy.snapshot())
+
+
+def configure():
+    """Configure the SDK's shared client.
+
+    The SDK keeps one client (and its gRPC channel / HTTP session) per
+    process and hands it to every model, so connections are reused across
+    requests instead of being set up per call.
+    """
+    options = {'api_key': Config.GEMINI_API_KEY}
+    if Config.GEMINI_TRANSPORT:
+        options['transport'] = Config.GEMINI_TRANSPORT
+    genai.configure(**options)
+
+
+def generation_config():
+    """Generation settings from Config; unset values fall back to the model defaults."""
+    settings = {
+        'temperature': Config.GEMINI_TEMPERATURE,
+        'top_p': Config.GEMINI_TOP_P,
+        'max_output_tokens': Config.GEMINI_MAX_OUTPUT_TOKENS,
+    }
+    return {key: value for key, value in settings.items() if value is not None} or None
+
+
+def get_model(name=None):
+    """Return the shared model for ``name`` (default GEMINI_MODEL), building it on first use.
+
+    The registry (and the limiter and call policy) is rebuilt after a fork,
+    like the DB pool, because gRPC channels cannot be shared between processes.
+    """
+    global _models_pid, limiter, policy
+    name = name or Config.GEMINI_MODEL
+    pid = os.getpid()
+    model = _models.get(name) if _models_pid == pid else None
+    if model is None:
+        with _models_lock:
+            if _models_pid != pid:
+                _models.clear()
+                limiter = _make_limiter()
+                policy = _make_policy()
+                configure()
+                _models_pid = pid
+            model = _models.get(name)
+            if model is None:
+                model = GovernedModel(genai.GenerativeModel(name, generation_config=generation_config()))
+                _models[name] = model
+    return model
+
+
+configure()
+_models_pid = os.getpid()
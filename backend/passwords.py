@@ -0,0 +1,91 @@
+"""
+Password hashing off the request threads, with a tunable scheme and cost
+
+Hashes and verifications run on a small per-process thread pool
+(PASSWORD_HASH_WORKERS). PBKDF2 and bcrypt release the GIL while they
+compute, so the pool uses that many cores at most however many logins
+arrive at once; at most PASSWORD_HASH_QUEUE_SIZE more wait for it, and the
+rest get PasswordHashingBusy (a 503) instead of piling up.
+
+PASSWORD_SCHEME and PASSWORD_ROUNDS set how new hashes are made. Hashes made
+with another scheme or cost still verify and are replaced with the current
+parameters on the user's next successful login, so changing either is a
+config change, not a migration.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+from config import Config
+import metrics
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when the hashing pool and its queue are full."""
+
+    def __init__(self, message="Too many sign-ins in progress. Please try again shortly.", retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _make_context():
+    scheme = Config.PASSWORD_SCHEME
+    settings = {}
+    if Config.PASSWORD_ROUNDS:
+        # min == max, so hashes with any other cost need an update (in either direction)
+        for key in ('default_rounds', 'min_rounds', 'max_rounds'):
+            settings[f'{scheme}__{key}'] = Config.PASSWORD_ROUNDS
+    # pbkdf2_sha256 stays verifiable: every existing hash was made with it
+    schemes = [scheme] if scheme == 'pbkdf2_sha256' else [scheme, 'pbkdf2_sha256']
+    return CryptContext(schemes=schemes, deprecated='auto', **settings)
+
+
+context = _make_context()
+
+_executor = None
+_executor_pid = None
+_slots = threading.BoundedSemaphore(Config.PASSWORD_HASH_WORKERS + Config.PASSWORD_HASH_QUEUE_SIZE)
+_lock = threading.Lock()
+
+
+def _get_executor():
+    # Threads do not survive fork; each gunicorn worker starts its own pool
+    global _executor, _executor_pid
+    if _executor_pid != os.getpid():
+        with _lock:
+            if _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS,
+                                               thread_name_prefix='password-hash')
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def _run(operation, func, *args):
+    if not _slots.acquire(blocking=False):
+        metrics.password_hash_rejected.inc(operation)
+        raise PasswordHashingBusy()
+    try:
+        future = _get_executor().submit(func, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    # The slot is held until the hash finishes, even if the caller stops waiting
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        with metrics.password_hash_duration.time(operation):
+            return future.result(timeout=Config.PASSWORD_HASH_TIMEOUT)
+    except TimeoutError:
+        metrics.password_hash_rejected.inc(operation)
+        raise PasswordHashingBusy() from None
+
+
+def hash_password(password):
+    """Hash with the configured scheme and cost."""
+    return _run('hash', context.hash, password)
+
+
+def verify_password(password, password_hash):
+    """Return (matches, new_hash); new_hash is set when the stored hash should be replaced."""
+    return _run('verify', context.verify_and_update, password, password_hash)
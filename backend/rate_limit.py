@@ -0,0 +1,174 @@
+"""
+Token-bucket rate limiting per user, per client IP and globally
+
+Every limited request draws tokens from up to three buckets at once: the
+user's (JWT sub), the client IP's, and an optional global bucket that caps
+total model traffic. Requests cost more when they carry images or PDFs.
+Buckets refill continuously; a request is admitted only if every bucket
+has enough tokens, otherwise nothing is taken and the caller gets the
+time until it would fit.
+
+Backends:
+- 'memory': per process (each gunicorn worker enforces its own limits)
+- 'redis': shared by all workers and instances, one atomic script call
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_TYPES = {'txt', 'docx', 'doc'}
+IMAGE_TYPES = {'png', 'jpg', 'jpeg', 'gif'}
+
+
+def request_cost(file_extensions=()):
+    """Tokens charged for a chat request: the text turn plus each attachment."""
+    cost = Config.RATE_LIMIT_COST_TEXT
+    for extension in file_extensions:
+        if extension == 'pdf':
+            cost += Config.RATE_LIMIT_COST_PDF
+        elif extension in IMAGE_TYPES:
+            cost += Config.RATE_LIMIT_COST_IMAGE
+        elif extension in DOCUMENT_TYPES:
+            cost += Config.RATE_LIMIT_COST_DOCUMENT
+    return cost
+
+
+class MemoryBackend:
+    """Buckets in a dict; the least recently used are dropped past max_keys.
+
+    A dropped bucket simply starts full again, which is what an idle
+    bucket would have refilled to anyway.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> [tokens, updated_at]
+        self._lock = threading.Lock()
+
+    def consume(self, buckets):
+        """buckets: [(key, capacity, rate per second, cost)]. Returns seconds to wait, 0 if admitted."""
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            wait = 0.0
+            for key, capacity, rate, cost in buckets:
+                state = self._buckets.get(key)
+                tokens = capacity if state is None else min(capacity, state[0] + (now - state[1]) * rate)
+                if tokens < cost:
+                    wait = max(wait, (cost - tokens) / rate)
+                levels.append(tokens)
+            if wait > 0:
+                return wait
+
+            for (key, capacity, rate, cost), tokens in zip(buckets, levels):
+                self._buckets[key] = [tokens - cost, now]
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return 0.0
+
+
+# KEYS: bucket keys; ARGV: capacity, rate, cost per key. Uses the Redis clock so
+# app servers with skewed clocks share consistent buckets.
+_CONSUME_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local levels = {}
+local wait = 0
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[i * 3 - 2])
+    local rate = tonumber(ARGV[i * 3 - 1])
+    local cost = tonumber(ARGV[i * 3])
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    if tokens < cost then
+        wait = math.max(wait, (cost - tokens) / rate)
+    end
+    levels[i] = tokens
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[i * 3 - 2])
+    local rate = tonumber(ARGV[i * 3 - 1])
+    local tokens = levels[i] - tonumber(ARGV[i * 3])
+    redis.call('HSET', KEYS[i], 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('PEXPIRE', KEYS[i], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+end
+return '0'
+"""
+
+
+class RedisBackend:
+    """Buckets shared through Redis. Fails open: if Redis is unreachable, requests are admitted."""
+
+    def __init__(self, url, prefix='ratelimit:'):
+        import redis  # only needed when RATE_LIMIT_BACKEND=redis
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self._script = self._client.register_script(_CONSUME_SCRIPT)
+
+    def consume(self, buckets):
+        keys = [self.prefix + key for key, _, _, _ in buckets]
+        args = []
+        for _, capacity, rate, cost in buckets:
+            args += [capacity, rate, cost]
+        try:
+            return float(self._script(keys=keys, args=args))
+        except Exception as e:
+            logger.error("Rate limiter backend unavailable, admitting request: %s", e)
+            return 0.0
+
+
+class RateLimiter:
+    def __init__(self, backend, enabled=True):
+        self.backend = backend
+        self.enabled = enabled
+
+    @staticmethod
+    def _bucket(key, per_minute, burst, cost):
+        # A request costing more than the burst would never fit; charge a full bucket instead
+        return (key, burst, per_minute / 60.0, min(cost, burst))
+
+    def check(self, user_id, ip, cost):
+        """Take ``cost`` tokens from the caller's buckets.
+
+        Returns None if the request is admitted, otherwise whole seconds
+        until it would be (for Retry-After).
+        """
+        if not self.enabled or cost <= 0:
+            return None
+
+        buckets = []
+        if user_id is not None and Config.RATE_LIMIT_USER_PER_MINUTE > 0:
+            buckets.append(self._bucket(f"user:{user_id}", Config.RATE_LIMIT_USER_PER_MINUTE,
+                                        Config.RATE_LIMIT_USER_BURST, cost))
+        if ip and Config.RATE_LIMIT_IP_PER_MINUTE > 0:
+            buckets.append(self._bucket(f"ip:{ip}", Config.RATE_LIMIT_IP_PER_MINUTE,
+                                        Config.RATE_LIMIT_IP_BURST, cost))
+        if Config.RATE_LIMIT_GLOBAL_PER_MINUTE > 0:
+            buckets.append(self._bucket("global", Config.RATE_LIMIT_GLOBAL_PER_MINUTE,
+                                        Config.RATE_LIMIT_GLOBAL_BURST, cost))
+        if not buckets:
+            return None
+
+        wait = self.backend.consume(buckets)
+        return math.ceil(wait) if wait > 0 else None
+
+
+def make_rate_limiter():
+    if Config.RATE_LIMIT_BACKEND == 'redis':
+        backend = RedisBackend(Config.RATE_LIMIT_REDIS_URL)
+    else:
+        backend = MemoryBackend()
+    return RateLimiter(backend, enabled=Config.RATE_LIMIT_ENABLED)
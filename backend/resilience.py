@@ -0,0 +1,218 @@
+"""
+Retry, deadline, circuit breaker and hedging policy for Gemini calls
+
+Each logical call gets a deadline (GEMINI_CALL_DEADLINE). Attempts that
+fail with a transient error (429, 5xx, timeouts, dropped connections) are
+retried with exponential backoff and full jitter while the deadline
+allows. Consecutive transient failures open a circuit breaker, after which
+calls fail fast until a trial call succeeds. Optionally, a non-streaming
+generation still running after the observed p95 latency gets a hedged
+duplicate and the first answer wins.
+
+When a call cannot be completed, LLMUnavailable is raised; routes answer
+503 and nothing is saved to history.
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# HTTP statuses (api_core exceptions carry them as .code) worth retrying
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailable(Exception):
+    """The model could not produce an answer right now; safe to retry later."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpen(LLMUnavailable):
+    pass
+
+
+def is_retryable(error):
+    if isinstance(error, LLMUnavailable):
+        return False  # shed or short-circuited locally; retrying would add load
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return getattr(error, 'code', None) in RETRYABLE_STATUS_CODES
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive transient failures.
+
+    While open, calls fail immediately. After ``reset_timeout`` seconds one
+    trial call is let through (half-open); its outcome closes or re-opens
+    the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == 'closed':
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if self.state == 'open' and remaining <= 0:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            raise CircuitOpen("The AI service is temporarily unavailable. Please try again shortly.",
+                              retry_after=max(1, int(remaining + 0.999)))
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self, error):
+        with self._lock:
+            self._trial_in_flight = False
+            if not is_retryable(error):
+                return  # bad requests say nothing about upstream health
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+
+class LatencyWindow:
+    """Rolling window of successful call latencies, for the hedging delay."""
+
+    def __init__(self, size=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, latency):
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, fraction):
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class CallPolicy:
+    """Deadline, retries with backoff, circuit breaker and optional hedging for one kind of call.
+
+    ``should_hedge`` is asked before a hedge is sent, so the caller can skip
+    it when there is no spare capacity. A losing hedge is not cancelled; it
+    finishes in the background and its result is dropped.
+    """
+
+    def __init__(self, deadline=60.0, max_retries=2, base_delay=0.5, max_delay=8.0,
+                 breaker=None, hedge=False, hedge_min_delay=1.0, hedge_workers=64, should_hedge=None):
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.should_hedge = should_hedge
+        self.latencies = LatencyWindow()
+        self._hedge_executor = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix='llm-hedge') \
+            if hedge else None
+        self.stats = {'calls': 0, 'retries': 0, 'failures': 0, 'short_circuited': 0, 'hedges': 0, 'hedge_wins': 0}
+
+    def _backoff(self, attempt):
+        # Full jitter: spreads retries from many callers instead of synchronising them
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def run(self, attempt, hedgeable=False):
+        """Call ``attempt(timeout)`` under the policy and return its result.
+
+        ``attempt`` receives the seconds left before the deadline and must
+        bound its own wait (queueing, request timeout) by it.
+        """
+        self.stats['calls'] += 1
+        deadline = time.monotonic() + self.deadline
+        retries = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpen:
+                self.stats['short_circuited'] += 1
+                raise
+
+            started = time.monotonic()
+            try:
+                if hedgeable and self.hedge:
+                    result = self._run_hedged(attempt, deadline)
+                else:
+                    result = attempt(max(0.0, deadline - started))
+            except Exception as e:
+                self.breaker.record_failure(e)
+                if isinstance(e, LLMUnavailable):
+                    raise
+                if not is_retryable(e):
+                    raise
+                delay = self._backoff(retries)
+                if retries >= self.max_retries or time.monotonic() + delay >= deadline:
+                    self.stats['failures'] += 1
+                    raise LLMUnavailable("The AI service is temporarily unavailable. Please try again shortly.",
+                                         retry_after=max(1, int(delay + 0.999))) from e
+                retries += 1
+                self.stats['retries'] += 1
+                logger.info("Retrying Gemini call in %.2fs after: %s", delay, e)
+                time.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            self.latencies.add(time.monotonic() - started)
+            return result
+
+    def _run_hedged(self, attempt, deadline):
+        """Start ``attempt``; if it is still running after the p95 latency, start a duplicate."""
+        remaining = deadline - time.monotonic()
+        # Attempts run on the hedge threads with the caller's context (request id, trace)
+        primary = self._hedge_executor.submit(contextvars.copy_context().run, attempt, max(0.0, remaining))
+        p95 = self.latencies.percentile(0.95)
+        if p95 is None:
+            return primary.result()
+
+        hedge_delay = max(self.hedge_min_delay, p95)
+        done, _ = wait([primary], timeout=min(hedge_delay, max(0.0, remaining)))
+        if done or (self.should_hedge and not self.should_hedge()):
+            return primary.result()
+
+        self.stats['hedges'] += 1
+        backup = self._hedge_executor.submit(contextvars.copy_context().run, attempt,
+                                             max(0.0, deadline - time.monotonic()))
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self.stats['hedge_wins'] += 1
+                    return future.result()
+                error = future.exception()
+        raise error or TimeoutError("Gemini call exceeded its deadline")
+
+    def snapshot(self):
+        return dict(self.stats, breaker=self.breaker.state, p95=self.latencies.percentile(0.95))
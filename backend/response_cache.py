@@ -0,0 +1,152 @@
+"""
+Response cache for plain-text chat prompts
+
+Exact tier: normalised prompt text -> reply. Optional semantic tier: when
+an embedding function and a similarity threshold are configured, a miss on
+the exact tier falls back to the most similar cached prompt in the same
+scope. Entries are scoped per user or shared globally, expire after a TTL
+and are evicted least-recently-used beyond max_entries.
+
+The semantic tier keeps the embeddings of at most semantic_max_entries
+recent prompts per scope. A lookup copies that scope's vectors under the
+lock and scores them after releasing it, so a miss costs one bounded scan
+and never blocks other gets and sets.
+"""
+import hashlib
+import logging
+import math
+import operator
+import re
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt):
+    return re.sub(r'\s+', ' ', prompt).strip().lower()
+
+
+def _unit(vector):
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class ResponseCache:
+    def __init__(self, max_entries=5000, ttl=3600, scope='user',
+                 similarity_threshold=0.0, embed_fn=None, enabled=True, semantic_max_entries=256):
+        self.max_entries = max_entries
+        self.semantic_max_entries = semantic_max_entries
+        self.ttl = ttl
+        self.scope = scope
+        self.similarity_threshold = similarity_threshold
+        self.embed_fn = embed_fn if similarity_threshold > 0 else None
+        self.enabled = enabled
+
+        self._entries = OrderedDict()  # key -> (expires_at, scope, response, unit embedding)
+        self._vectors = {}  # scope -> OrderedDict(key -> unit embedding), newest last
+        self._lock = threading.Lock()
+        self.stats = {'exact_hits': 0, 'semantic_hits': 0, 'misses': 0, 'embedding_errors': 0}
+
+    def _scope_for(self, user_id):
+        return f"user:{user_id}" if self.scope == 'user' else 'global'
+
+    def _key(self, scope, prompt):
+        digest = hashlib.sha256(normalize_prompt(prompt).encode('utf-8')).hexdigest()
+        return f"{scope}:{digest}"
+
+    def get(self, prompt, user_id):
+        """Return (cached reply or None, embedding to pass back to set())."""
+        if not self.enabled:
+            return None, None
+        scope = self._scope_for(user_id)
+        key = self._key(scope, prompt)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats['exact_hits'] += 1
+                return entry[2], None
+            if entry is not None:
+                self._drop(key)
+
+        if self.embed_fn is None:
+            with self._lock:
+                self.stats['misses'] += 1
+            return None, None
+
+        try:
+            embedding = _unit(self.embed_fn(prompt))
+        except Exception as e:
+            logger.warning("Embedding for response cache failed: %s", e)
+            with self._lock:
+                self.stats['embedding_errors'] += 1
+                self.stats['misses'] += 1
+            return None, None
+
+        with self._lock:
+            candidates = list(self._vectors.get(scope, {}).items())
+
+        best_key, best_score = None, self.similarity_threshold
+        for candidate_key, vector in candidates:
+            score = sum(map(operator.mul, embedding, vector))
+            if score >= best_score:
+                best_key, best_score = candidate_key, score
+
+        with self._lock:
+            # The entry may have expired or been evicted while we were scoring
+            entry = self._entries.get(best_key) if best_key is not None else None
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(best_key)
+                self.stats['semantic_hits'] += 1
+                return entry[2], embedding
+            self.stats['misses'] += 1
+        return None, embedding
+
+    def set(self, prompt, user_id, response, embedding=None):
+        if not self.enabled:
+            return
+        scope = self._scope_for(user_id)
+        key = self._key(scope, prompt)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (time.time() + self.ttl, scope, response, embedding)
+            if embedding is not None and self.semantic_max_entries:
+                vectors = self._vectors.setdefault(scope, OrderedDict())
+                vectors[key] = embedding
+                while len(vectors) > self.semantic_max_entries:
+                    vectors.popitem(last=False)  # still an exact-tier entry, just not matched by similarity
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        # Caller holds the lock
+        entry = self._entries.pop(key, None)
+        if entry is None or entry[3] is None:
+            return
+        vectors = self._vectors.get(entry[1])
+        if vectors is not None:
+            vectors.pop(key, None)
+            if not vectors:
+                del self._vectors[entry[1]]
+
+    def invalidate_user(self, user_id):
+        """Forget a user's cached replies (e.g. after they clear their history)."""
+        if self.scope != 'user':
+            return
+        scope = self._scope_for(user_id)
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry[1] == scope]:
+                self._drop(key)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+            stats['semantic_entries'] = sum(len(vectors) for vectors in self._vectors.values())
+        lookups = stats['exact_hits'] + stats['semantic_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['exact_hits'] + stats['semantic_hits']) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,144 @@
+"""
+Chunking and BM25 retrieval for large documents
+
+Instead of cutting extracted text at a fixed length, long documents are
+split into overlapping chunks, indexed with BM25 and only the chunks most
+relevant to the question are sent to the model.
+"""
+import hashlib
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from config import Config
+
+_TOKEN_RE = re.compile(r'\w+')
+
+# Query words that say nothing about which part of a document is wanted: English
+# function words, plus the verbs and nouns of generic requests such as the default
+# "Please summarize this document." Dropped from questions only, never from chunks.
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from
+further had has have having he her here hers him his how i if in into is it its itself
+just me more most my no nor not now of off on once only or other our out over own same
+she should so some such than that the their them then there these they this those
+through to too under until up very was we were what when where which while who whom
+why will with would you your
+please tell give show explain describe summarize summarise summary analyze analyse
+analysis overview review read document documents doc file files text content contents
+pdf docx txt attached attachment provide detailed based key main points
+""".split())
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def query_terms(question):
+    """Distinct terms of a question that can pick out chunks (stopwords removed)."""
+    return {term for term in tokenize(question) if term not in STOPWORDS}
+
+
+def chunk_text(text, chunk_size=1200, overlap=200):
+    """Split text into ~chunk_size character windows overlapping by ``overlap``.
+
+    Window ends are moved back to the nearest paragraph, sentence or word
+    boundary so chunks do not cut words in half.
+    """
+    chunks = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + chunk_size, length)
+        if end < length:
+            window = text[start:end]
+            for separator in ('\n\n', '\n', '. ', ' '):
+                cut = window.rfind(separator)
+                if cut > chunk_size // 2:
+                    end = start + cut + len(separator)
+                    break
+        chunks.append(text[start:end].strip())
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+    return [chunk for chunk in chunks if chunk]
+
+
+class BM25Index:
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokenize(chunk)) for chunk in chunks]
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+        doc_freq = Counter()
+        for tf in self.term_freqs:
+            doc_freq.update(tf.keys())
+        n = len(chunks)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    def scores(self, query):
+        terms = [term for term in query_terms(query) if term in self.idf]
+        results = []
+        for tf, length in zip(self.term_freqs, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            results.append(score)
+        return results
+
+
+_index_cache = OrderedDict()  # sha256 of text -> BM25Index
+_index_lock = threading.Lock()
+
+
+def get_index(text):
+    """Build (or reuse) the chunk index for a document's text."""
+    key = hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+    with _index_lock:
+        index = _index_cache.get(key)
+        if index is not None:
+            _index_cache.move_to_end(key)
+            return index
+
+    index = BM25Index(chunk_text(text, Config.RETRIEVAL_CHUNK_SIZE, Config.RETRIEVAL_CHUNK_OVERLAP))
+    with _index_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > Config.RETRIEVAL_INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def select_relevant_text(text, question):
+    """Return the whole text if it is short, otherwise its top-k chunks for the question.
+
+    Chunks are returned in document order. When nothing in the question
+    matches once stopwords are dropped (e.g. "summarize this document"),
+    chunks are sampled evenly across the document so the answer still
+    covers all of it.
+    """
+    if len(text) <= Config.RETRIEVAL_MIN_CHARS:
+        return text
+
+    index = get_index(text)
+    top_k = Config.RETRIEVAL_TOP_K
+    total = len(index.chunks)
+    if total <= top_k:
+        return text
+
+    scores = index.scores(question)
+    if any(scores):
+        ranked = sorted(range(total), key=lambda i: scores[i], reverse=True)
+        selected = sorted(i for i in ranked[:top_k] if scores[i] > 0)
+    else:
+        step = total / top_k
+        selected = sorted({int(i * step) for i in range(top_k)})
+
+    return '\n\n'.join(f"[Section {i + 1} of {total}]\n{index.chunks[i]}" for i in selected)
@@ -0,0 +1,207 @@
+"""
+Full-text search over chat history
+
+Two backends with the same result shape:
+- 'fulltext': MySQL FULLTEXT index on chat_messages(user_message, bot_response)
+- 'python': a per-user in-process inverted index, for databases without
+  FULLTEXT support (e.g. a local test database)
+"""
+import json
+import math
+import re
+import threading
+from collections import Counter, OrderedDict, defaultdict
+
+from config import Config
+from db_pool import get_pool
+from retrieval import tokenize
+
+SNIPPET_WIDTH = 160
+
+
+def _utf16_offset(text, index):
+    """Offset of text[index] in UTF-16 code units, the way JavaScript indexes strings."""
+    return len(text[:index].encode('utf-16-le')) // 2
+
+
+def make_snippet(text, terms, width=SNIPPET_WIDTH):
+    """Cut a window of text around the first matching term.
+
+    Returns (snippet, highlights) where highlights are [start, end] offsets
+    of term matches inside the snippet, so clients can mark them up without
+    rendering stored text as HTML. Offsets are in UTF-16 code units, so an
+    emoji before a match counts as two, as in String.prototype.slice.
+    """
+    text = text or ''
+    if not terms:
+        return text[:width], []
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(term) for term in terms) + r')\w*', re.IGNORECASE)
+    first = pattern.search(text)
+    start = max(0, first.start() - width // 3) if first else 0
+    end = min(len(text), start + width)
+    snippet = text[start:end]
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if end < len(text) else ''
+    snippet = prefix + snippet
+    highlights = [[_utf16_offset(snippet, m.start()), _utf16_offset(snippet, m.end())]
+                  for m in pattern.finditer(snippet, len(prefix))]
+    return snippet + suffix, highlights
+
+
+def _format_result(row, terms, score):
+    user_snippet, user_highlights = make_snippet(row['user_message'], terms)
+    bot_snippet, bot_highlights = make_snippet(row['bot_response'], terms)
+    files_info = row['files_info']
+    if isinstance(files_info, str) or files_info is None:
+        files_info = json.loads(files_info or '[]')
+    created_at = row['created_at']
+    return {
+        "id": row['id'],
+        "score": round(float(score), 4),
+        "user_message": user_snippet,
+        "user_message_highlights": user_highlights,
+        "bot_response": bot_snippet,
+        "bot_response_highlights": bot_highlights,
+        "files_info": files_info,
+        "created_at": created_at if isinstance(created_at, str) else created_at.isoformat()
+    }
+
+
+def search_fulltext(user_id, query, limit, offset):
+    with get_pool().connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("""
+                SELECT id, user_message, bot_response, files_info, created_at,
+                       MATCH(user_message, bot_response) AGAINST (%s IN NATURAL LANGUAGE MODE) AS score
+                FROM chat_messages
+                WHERE user_id = %s
+                  AND MATCH(user_message, bot_response) AGAINST (%s IN NATURAL LANGUAGE MODE)
+                ORDER BY score DESC, id DESC
+                LIMIT %s OFFSET %s
+            """, (query, user_id, query, limit + 1, offset))
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+    return [(row, row['score']) for row in rows]
+
+
+class InvertedIndex:
+    """BM25-ranked inverted index over one user's history."""
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # term -> {message id: term frequency}
+        self.lengths = {}
+        self.rows = {}
+        self._total_length = 0
+
+    def add(self, row):
+        terms = Counter(tokenize(f"{row['user_message'] or ''} {row['bot_response'] or ''}"))
+        self.rows[row['id']] = row
+        self.lengths[row['id']] = sum(terms.values())
+        self._total_length += self.lengths[row['id']]
+        for term, freq in terms.items():
+            self.postings[term][row['id']] = freq
+
+    def search(self, query):
+        n = len(self.rows)
+        if not n:
+            return []
+        avg_length = self._total_length / n
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for message_id, freq in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[message_id] / avg_length)
+                scores[message_id] += idf * freq * (self.k1 + 1) / (freq + norm)
+        ranked = sorted(scores.items(), key=lambda item: (item[1], item[0]), reverse=True)
+        return [(self.rows[message_id], score) for message_id, score in ranked]
+
+
+class PythonSearchBackend:
+    """Keeps inverted indexes for recently searched users, updated as messages are saved."""
+
+    def __init__(self, max_users=256):
+        self.max_users = max_users
+        self._indexes = OrderedDict()  # user id -> InvertedIndex
+        self._lock = threading.Lock()
+
+    def _load(self, user_id):
+        index = InvertedIndex()
+        with get_pool().connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute("""
+                    SELECT id, user_message, bot_response, files_info, created_at
+                    FROM chat_messages
+                    WHERE user_id = %s
+                """, (user_id,))
+                for row in cursor.fetchall():
+                    index.add(row)
+            finally:
+                cursor.close()
+        return index
+
+    def index_for(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                self._indexes.move_to_end(user_id)
+                return index
+        index = self._load(user_id)
+        with self._lock:
+            self._indexes[user_id] = index
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+        return index
+
+    def search(self, user_id, query, limit, offset):
+        index = self.index_for(user_id)
+        with self._lock:
+            return index.search(query)[offset:offset + limit + 1]
+
+    def add_message(self, user_id, row):
+        with self._lock:
+            index = self._indexes.get(str(user_id))
+            if index is not None:
+                index.add(row)
+
+    def drop_user(self, user_id):
+        with self._lock:
+            self._indexes.pop(str(user_id), None)
+
+
+python_backend = PythonSearchBackend()
+
+
+def search_history(user_id, query, limit=20, offset=0):
+    """Ranked search over all of a user's history with highlighted snippets."""
+    if Config.HISTORY_SEARCH_BACKEND == 'python':
+        matches = python_backend.search(user_id, query, limit, offset)
+    else:
+        matches = search_fulltext(user_id, query, limit, offset)
+
+    has_more = len(matches) > limit
+    terms = list(set(tokenize(query)))
+    return {
+        "results": [_format_result(row, terms, score) for row, score in matches[:limit]],
+        "next_offset": offset + limit if has_more else None,
+        "has_more": has_more
+    }
+
+
+def on_message_saved(user_id, row):
+    """Keep the in-process index current; MySQL maintains FULLTEXT itself."""
+    if Config.HISTORY_SEARCH_BACKEND == 'python':
+        python_backend.add_message(user_id, row)
+
+
+def on_history_cleared(user_id):
+    if Config.HISTORY_SEARCH_BACKEND == 'python':
+        python_backend.drop_user(user_id)
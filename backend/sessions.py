@@ -0,0 +1,205 @@
+"""
+Login sessions and refresh tokens, stored in user_sessions
+
+A login opens a session row holding the SHA-256 of a random refresh token
+(the token itself is only ever sent to the client). POST /refresh swaps a
+valid refresh token for a new access token and a new refresh token without
+a password check, so clients stay signed in for SESSION_TTL_DAYS at the
+cost of one indexed lookup and one update per access-token lifetime.
+
+Access tokens carry the session id (``sid``). require_auth asks
+is_active() on each request; answers are cached per worker for
+SESSION_CACHE_TTL seconds, so revoking a session (DELETE by primary key)
+takes effect at once in the worker that handled it and within that TTL in
+the others. Expired rows are deleted in batches by a background sweep.
+"""
+import contextvars
+import hashlib
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from config import Config
+from db_pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='session-sweep')
+_sweep_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+def _hash_token(refresh_token):
+    return hashlib.sha256(refresh_token.encode('utf-8')).hexdigest()
+
+
+class SessionCache:
+    """Session id -> (active, expires_at, checked_at), trusted for ``ttl`` seconds."""
+
+    def __init__(self, max_entries=10000, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get(self, session_id, allow_stale=False):
+        """Return the cached (active, expires_at) or None."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or (not allow_stale and time.monotonic() - entry[2] > self.ttl):
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.stats['hits'] += 1
+            return entry[0], entry[1]
+
+    def set(self, session_id, active, expires_at=None):
+        with self._lock:
+            self._entries[session_id] = (active, expires_at, time.monotonic())
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries))
+
+
+session_cache = SessionCache(Config.SESSION_CACHE_SIZE, Config.SESSION_CACHE_TTL)
+
+
+def create_session(user_id):
+    """Open a session for a user who just logged in; returns (session id, refresh token)."""
+    refresh_token = secrets.token_urlsafe(32)
+    expires_at = datetime.now() + timedelta(days=Config.SESSION_TTL_DAYS)
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "INSERT INTO user_sessions (user_id, session_token, expires_at) VALUES (%s, %s, %s)",
+                (user_id, _hash_token(refresh_token), expires_at)
+            )
+            conn.commit()
+            session_id = cursor.lastrowid
+        finally:
+            cursor.close()
+
+    session_cache.set(session_id, True, expires_at)
+    schedule_sweep()
+    return session_id, refresh_token
+
+
+def refresh_session(refresh_token):
+    """Rotate a valid refresh token; returns (session id, user id, new refresh token) or None."""
+    token_hash = _hash_token(refresh_token)
+    new_token = secrets.token_urlsafe(32)
+    with get_pool().connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(
+                "SELECT id, user_id, expires_at FROM user_sessions WHERE session_token = %s",
+                (token_hash,)
+            )
+            session = cursor.fetchone()
+            if not session or session['expires_at'] <= datetime.now():
+                return None
+            # Conditional on the old hash: of two concurrent refreshes with one token, only one wins
+            cursor.execute(
+                "UPDATE user_sessions SET session_token = %s WHERE id = %s AND session_token = %s",
+                (_hash_token(new_token), session['id'], token_hash)
+            )
+            conn.commit()
+            if cursor.rowcount != 1:
+                return None
+        finally:
+            cursor.close()
+
+    session_cache.set(session['id'], True, session['expires_at'])
+    return session['id'], session['user_id'], new_token
+
+
+def revoke_session(session_id, user_id):
+    """End a session: its refresh token stops working and its access tokens are rejected."""
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("DELETE FROM user_sessions WHERE id = %s AND user_id = %s", (session_id, user_id))
+            conn.commit()
+        finally:
+            cursor.close()
+    session_cache.set(session_id, False)
+
+
+def is_active(session_id):
+    """Whether a session still exists and has not expired (cached for SESSION_CACHE_TTL)."""
+    cached = session_cache.get(session_id)
+    if cached is None:
+        try:
+            with get_pool().connection() as conn:
+                cursor = conn.cursor(dictionary=True)
+                try:
+                    cursor.execute("SELECT expires_at FROM user_sessions WHERE id = %s", (session_id,))
+                    row = cursor.fetchone()
+                finally:
+                    cursor.close()
+        except Exception:
+            # Keep answering from the last known state while the database is unreachable
+            cached = session_cache.get(session_id, allow_stale=True)
+            if cached is None:
+                raise
+            logger.warning("Session lookup failed; using cached state", exc_info=True)
+        else:
+            cached = (row is not None, row['expires_at'] if row else None)
+            session_cache.set(session_id, *cached)
+    active, expires_at = cached
+    return active and (expires_at is None or expires_at > datetime.now())
+
+
+def sweep_expired_sessions(batch_size=None):
+    """Delete expired sessions, batch_size rows per statement; returns the number deleted."""
+    batch_size = batch_size or Config.SESSION_SWEEP_BATCH
+    deleted = 0
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            while True:
+                # Select then delete by primary key: short lock footprint, uses the expires_at index
+                cursor.execute(
+                    "SELECT id FROM user_sessions WHERE expires_at < %s ORDER BY expires_at LIMIT %s",
+                    (datetime.now(), batch_size)
+                )
+                ids = [row[0] for row in cursor.fetchall()]
+                if ids:
+                    placeholders = ', '.join(['%s'] * len(ids))
+                    cursor.execute(f"DELETE FROM user_sessions WHERE id IN ({placeholders})", ids)
+                    conn.commit()
+                    deleted += len(ids)
+                if len(ids) < batch_size:
+                    return deleted
+        finally:
+            cursor.close()
+
+
+def _sweep():
+    try:
+        deleted = sweep_expired_sessions()
+        if deleted:
+            logger.info("Swept expired sessions", extra={'deleted': deleted})
+    except Exception:
+        logger.exception("Session sweep failed")
+
+
+def schedule_sweep():
+    """Run a sweep in the background at most once per SESSION_SWEEP_INTERVAL per worker."""
+    global _last_sweep
+    with _sweep_lock:
+        now = time.monotonic()
+        if _last_sweep and now - _last_sweep < Config.SESSION_SWEEP_INTERVAL:
+            return
+        _last_sweep = now
+    _executor.submit(contextvars.copy_context().run, _sweep)
@@ -0,0 +1,22 @@
+"""
+Server-Sent Events helpers for streaming chat responses
+"""
+import json
+
+
+def sse_event(data, event=None):
+    """Format one SSE frame; data is JSON-encoded so newlines stay inside it."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+def iter_text_chunks(response):
+    """Yield the non-empty text of each chunk in a streamed Gemini response."""
+    for chunk in response:
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. safety or finish metadata) raise.
+            continue
+        if text:
+            yield text
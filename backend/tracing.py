@@ -0,0 +1,246 @@
+"""
+Request tracing with OpenTelemetry-shaped spans
+
+Spans carry W3C trace/span ids and are written one JSON object per line,
+with OTLP field names (traceId, spanId, parentSpanId, startTimeUnixNano,
+...), so a trace file can be loaded into OTel tooling or read with jq. The
+current span lives in a context variable: the file pool, the job pool and
+the summarizer copy the context, so work they run on other threads nests
+under the request that started it.
+
+    TRACING_EXPORTER=file TRACING_FILE=traces.jsonl   # or stdout; none (default) disables it
+
+A request's root span is started in a before_request hook (continuing an
+incoming ``traceparent`` header if there is one) and ended on teardown,
+after a streamed response has been fully sent. Finished spans go to a
+bounded queue drained by a background thread; spans that do not fit are
+dropped and counted rather than slowing the request.
+"""
+import atexit
+import functools
+import json
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from config import Config
+
+SERVICE_NAME = 'chatbot-backend'
+
+_current_span = ContextVar('current_span', default=None)
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+
+class Span:
+    recording = True
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None, kind='INTERNAL'):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = '%016x' % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.status = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def add_event(self, name, **attributes):
+        self.events.append({'name': name, 'timeUnixNano': time.time_ns(), 'attributes': attributes})
+
+    def record_exception(self, error):
+        self.status = {'code': 'ERROR', 'message': str(error)}
+        self.add_event('exception', **{'exception.type': type(error).__name__, 'exception.message': str(error)})
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            _exporter.export(self)
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self):
+        return {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent_id or '',
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': self.start_ns,
+            'endTimeUnixNano': self.end_ns,
+            'durationMs': round((self.end_ns - self.start_ns) / 1e6, 3),
+            'attributes': self.attributes,
+            'events': self.events,
+            'status': self.status or {'code': 'OK'},
+            'resource': {'service.name': SERVICE_NAME, 'process.pid': os.getpid()},
+        }
+
+
+class NonRecordingSpan:
+    """Stands in when tracing is off or the trace was not sampled; keeps the trace id for children."""
+
+    recording = False
+
+    def __init__(self, trace_id=None, span_id=None):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    def set_attribute(self, key, value):
+        pass
+
+    def add_event(self, name, **attributes):
+        pass
+
+    def record_exception(self, error):
+        pass
+
+    def end(self):
+        pass
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-00" if self.trace_id else None
+
+
+class SpanExporter:
+    """Writes finished spans as JSON lines from a background thread."""
+
+    def __init__(self, target, path=None, max_queue=10000):
+        self.target = target
+        self.path = path
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.target in ('stdout', 'file')
+
+    def _ensure_thread(self):
+        # Started lazily, and again in a forked worker (threads do not survive fork)
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                    self._thread = threading.Thread(target=self._drain, name='span-exporter', daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+
+    def export(self, span):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self, out, span):
+        out.write(json.dumps(span.to_dict(), default=str) + '\n')
+
+    def _drain(self):
+        out = open(self.path, 'a', encoding='utf-8') if self.target == 'file' else sys.stdout
+        while True:
+            span = self._queue.get()
+            if span is None:
+                break
+            self._write(out, span)
+            # Flush once the backlog is written, not per span
+            if self._queue.empty():
+                out.flush()
+        out.flush()
+
+    def shutdown(self):
+        if self._thread is not None and self._pid == os.getpid():
+            try:
+                self._queue.put(None, timeout=1)
+            except queue.Full:
+                return
+            self._thread.join(timeout=5)
+
+
+_exporter = SpanExporter(Config.TRACING_EXPORTER, Config.TRACING_FILE)
+atexit.register(_exporter.shutdown)
+
+
+def _new_trace_id():
+    return '%032x' % random.getrandbits(128)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def start_span(name, attributes=None, parent=None, traceparent=None, kind='INTERNAL'):
+    """Start a span under ``parent`` (default: the current span) without making it current.
+
+    A root span samples the trace (TRACING_SAMPLE_RATE); children follow
+    their root's decision.
+    """
+    if not _exporter.enabled:
+        return NonRecordingSpan()
+    parent = parent if parent is not None else _current_span.get()
+    if parent is None and traceparent:
+        match = _TRACEPARENT.match(traceparent.strip().lower())
+        if match:
+            trace_id, parent_id, flags = match.groups()
+            # Follow the caller's sampling decision so the trace is complete or absent
+            if int(flags, 16) & 1:
+                return Span(name, trace_id, parent_id, attributes, kind)
+            return NonRecordingSpan(trace_id, parent_id)
+    if parent is None:
+        if random.random() >= Config.TRACING_SAMPLE_RATE:
+            return NonRecordingSpan(_new_trace_id(), '%016x' % random.getrandbits(64))
+        return Span(name, _new_trace_id(), None, attributes, kind)
+    if not parent.recording:
+        return parent
+    return Span(name, parent.trace_id, parent.span_id, attributes, kind)
+
+
+def activate(span):
+    """Make ``span`` current; returns the token for deactivate()."""
+    return _current_span.set(span)
+
+
+def deactivate(token):
+    _current_span.reset(token)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Run the block in a child span of the current one; exceptions are recorded on it."""
+    current = start_span(name, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+def traced(name):
+    """Decorator form of span()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def tracing_stats():
+    return {'exporter': _exporter.target, 'dropped': _exporter.dropped}
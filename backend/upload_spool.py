@@ -0,0 +1,141 @@
+"""
+Upload spooling: multipart file parts are written once, hashed on the way in
+
+Werkzeug's default stream factory buffers each part in a temp file, and the
+old /chat then copied it into UPLOAD_FOLDER and read it back whole. Here
+each part goes straight into an UploadSpool: kept in memory up to
+UPLOAD_MEMORY_MAX_BYTES, rolled over to a temp file beyond that, with the
+SHA-256 updated as chunks arrive. Processors read it through a zero-copy
+memoryview (of the in-memory buffer, or an mmap of the temp file) or a
+fresh file handle, so a 50 MB upload is never held in RAM more than once.
+"""
+import hashlib
+import io
+import logging
+import mmap
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from flask import Request
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class UploadSpool:
+    """Writable, then readable, container for one uploaded file.
+
+    Werkzeug closes request files when the request ends. Call retain() to
+    keep the data past that (e.g. for a background job) and release() when
+    done with it.
+    """
+
+    def __init__(self, memory_max_bytes, spool_dir=None):
+        self.memory_max_bytes = memory_max_bytes
+        self.spool_dir = spool_dir
+        self.path = None  # set once the upload rolls over to disk
+        self.size = 0
+        self._stream = io.BytesIO()
+        self._digest = hashlib.sha256()
+        self._sha256 = None
+        self._retained = False
+        self._lock = threading.Lock()
+        self.closed = False
+
+    # --- file protocol used by werkzeug's multipart parser ---
+    def write(self, data):
+        self._digest.update(data)
+        self.size += len(data)
+        if self.path is None and self.size > self.memory_max_bytes:
+            self._rollover()
+        return self._stream.write(data)
+
+    def _rollover(self):
+        fd, path = tempfile.mkstemp(prefix='upload_', suffix='.part', dir=self.spool_dir)
+        disk_stream = os.fdopen(fd, 'w+b')
+        disk_stream.write(self._stream.getbuffer())
+        self._stream.close()
+        self._stream = disk_stream
+        self.path = path
+
+    def seek(self, offset, whence=0):
+        return self._stream.seek(offset, whence)
+
+    def __getattr__(self, name):
+        # read, readline, tell, flush, ... go to the current buffer
+        return getattr(self._stream, name)
+
+    def __iter__(self):
+        return iter(self._stream)
+
+    # --- reading API for processors ---
+    @property
+    def in_memory(self):
+        return self.path is None
+
+    @property
+    def sha256(self):
+        if self._sha256 is None:
+            self._sha256 = self._digest.hexdigest()
+        return self._sha256
+
+    @contextmanager
+    def view(self):
+        """Zero-copy memoryview of the whole upload, valid inside the with block.
+
+        Do not keep slices of it past the block: the buffer (or mmap) is
+        released on exit.
+        """
+        if self.in_memory:
+            with self._stream.getbuffer() as view:
+                yield view
+            return
+        self._stream.flush()
+        if self.size == 0:
+            yield memoryview(b'')
+            return
+        with open(self.path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, \
+                memoryview(mapped) as view:
+            yield view
+
+    def open(self):
+        """A new read-only file object positioned at the start; close it when done."""
+        if self.in_memory:
+            # BytesIO over the getvalue() bytes shares the buffer instead of copying it
+            return io.BytesIO(self._stream.getvalue())
+        self._stream.flush()
+        return open(self.path, 'rb')
+
+    # --- lifetime ---
+    def retain(self):
+        self._retained = True
+
+    def close(self):
+        """Called by werkzeug at the end of the request; ignored while retained."""
+        if not self._retained:
+            self.release()
+
+    def release(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+        self._stream.close()
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                logger.warning("Could not remove spooled upload %s: %s", self.path, e)
+
+
+class SpoolingRequest(Request):
+    """Flask request whose file parts are parsed straight into UploadSpools."""
+
+    spool_dir = None
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadSpool(Config.UPLOAD_MEMORY_MAX_BYTES, self.spool_dir)
@@ -3,10 +3,13 @@ Utility functions for the AI Chatbot Backend
 """
 import os
 import base64
+import logging
 import mimetypes
 from werkzeug.utils import secure_filename
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 def allowed_file(filename, allowed_extensions):
     """Check if file extension is allowed."""
     return '.' in filename and \
@@ -25,7 +28,7 @@ def encode_image_to_base64(image_path):
             encoded_string = base64.b64encode(image_file.read()).decode()
         return encoded_string
     except Exception as e:
-        print(f"Error encoding image: {e}")
+        logger.error("Error encoding image: %s", e)
         return None
 
 def get_file_mime_type(file_path):
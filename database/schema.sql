@@ -14,19 +14,32 @@ CREATE TABLE users (
     is_active BOOLEAN DEFAULT TRUE
 );
 
+-- Conversations (a thread of chat messages with a rolling summary of older turns)
+CREATE TABLE conversations (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    title VARCHAR(255),
+    summary TEXT,
+    summary_upto_id INT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
 -- Chat messages table
 CREATE TABLE chat_messages (
     id INT PRIMARY KEY AUTO_INCREMENT,
     user_id INT NOT NULL,
+    conversation_id INT NULL,
     user_message TEXT,
     bot_response LONGTEXT,
     files_info JSON,
     message_type ENUM('text', 'image', 'pdf', 'mixed') DEFAULT 'text',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE SET NULL
 );
 
--- User sessions table (optional, for tracking active sessions)
+-- Login sessions: session_token is the SHA-256 of the client's refresh token
 CREATE TABLE user_sessions (
     id INT PRIMARY KEY AUTO_INCREMENT,
     user_id INT NOT NULL,
@@ -49,8 +62,41 @@ CREATE TABLE file_uploads (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
+-- Background processing jobs (attachments that are too slow to handle in-request)
+CREATE TABLE processing_jobs (
+    id CHAR(32) PRIMARY KEY,
+    user_id INT NOT NULL,
+    status ENUM('queued', 'running', 'completed', 'failed') DEFAULT 'queued',
+    user_message TEXT,
+    files_info JSON,
+    result LONGTEXT,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
 -- Create indexes for better performance
-CREATE INDEX idx_chat_messages_user_id ON chat_messages(user_id);
+-- Covers the user_id foreign key and keyset pagination of /history
+CREATE INDEX idx_chat_messages_user_created ON chat_messages(user_id, created_at, id);
 CREATE INDEX idx_chat_messages_created_at ON chat_messages(created_at);
+-- Context builder reads the newest turns of one conversation
+CREATE INDEX idx_chat_messages_conversation ON chat_messages(conversation_id, id);
+CREATE INDEX idx_conversations_user_id ON conversations(user_id);
 CREATE INDEX idx_user_sessions_user_id ON user_sessions(user_id);
+-- POST /refresh looks sessions up by token hash; the sweep deletes by expiry
+CREATE UNIQUE INDEX idx_user_sessions_token ON user_sessions(session_token);
+CREATE INDEX idx_user_sessions_expires ON user_sessions(expires_at);
 CREATE INDEX idx_file_uploads_user_id ON file_uploads(user_id);
+CREATE INDEX idx_processing_jobs_user_id ON processing_jobs(user_id);
+
+-- Full-text search over chat history (GET /history/search)
+CREATE FULLTEXT INDEX ft_chat_messages_text ON chat_messages(user_message, bot_response);
+
+-- Existing databases: add conversations before running the app
+-- ALTER TABLE chat_messages ADD COLUMN conversation_id INT NULL AFTER user_id,
+--     ADD FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE SET NULL;
+
+-- Existing databases: index user_sessions before enabling refresh tokens
+-- CREATE UNIQUE INDEX idx_user_sessions_token ON user_sessions(session_token);
+-- CREATE INDEX idx_user_sessions_expires ON user_sessions(expires_at);
@@ -73,17 +73,34 @@ def create_tables():
         cursor.execute(users_table)
         print("✅ Users table created")
 
+        # Conversations table
+        conversations_table = """
+        CREATE TABLE IF NOT EXISTS conversations (
+            id INT PRIMARY KEY AUTO_INCREMENT,
+            user_id INT NOT NULL,
+            title VARCHAR(255),
+            summary TEXT,
+            summary_upto_id INT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        """
+        cursor.execute(conversations_table)
+        print("✅ Conversations table created")
+
         # Chat messages table
         chat_messages_table = """
         CREATE TABLE IF NOT EXISTS chat_messages (
             id INT PRIMARY KEY AUTO_INCREMENT,
             user_id INT NOT NULL,
+            conversation_id INT NULL,
             user_message TEXT,
             bot_response LONGTEXT,
             files_info JSON,
             message_type ENUM('text', 'image', 'pdf', 'mixed') DEFAULT 'text',
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE SET NULL
         )
         """
         cursor.execute(chat_messages_table)
@@ -120,12 +137,36 @@ def create_tables():
         cursor.execute(file_uploads_table)
         print("✅ File uploads table created")
 
+        # Processing jobs table
+        processing_jobs_table = """
+        CREATE TABLE IF NOT EXISTS processing_jobs (
+            id CHAR(32) PRIMARY KEY,
+            user_id INT NOT NULL,
+            status ENUM('queued', 'running', 'completed', 'failed') DEFAULT 'queued',
+            user_message TEXT,
+            files_info JSON,
+            result LONGTEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        """
+        cursor.execute(processing_jobs_table)
+        print("✅ Processing jobs table created")
+
         # Create indexes
         indexes = [
-            "CREATE INDEX IF NOT EXISTS idx_chat_messages_user_id ON chat_messages(user_id)",
+            "CREATE INDEX IF NOT EXISTS idx_chat_messages_user_created ON chat_messages(user_id, created_at, id)",
             "CREATE INDEX IF NOT EXISTS idx_chat_messages_created_at ON chat_messages(created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_chat_messages_conversation ON chat_messages(conversation_id, id)",
+            "CREATE INDEX IF NOT EXISTS idx_conversations_user_id ON conversations(user_id)",
             "CREATE INDEX IF NOT EXISTS idx_user_sessions_user_id ON user_sessions(user_id)",
-            "CREATE INDEX IF NOT EXISTS idx_file_uploads_user_id ON file_uploads(user_id)"
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_user_sessions_token ON user_sessions(session_token)",
+            "CREATE INDEX IF NOT EXISTS idx_user_sessions_expires ON user_sessions(expires_at)",
+            "CREATE INDEX IF NOT EXISTS idx_file_uploads_user_id ON file_uploads(user_id)",
+            "CREATE INDEX IF NOT EXISTS idx_processing_jobs_user_id ON processing_jobs(user_id)",
+            "CREATE FULLTEXT INDEX ft_chat_messages_text ON chat_messages(user_message, bot_response)"
         ]
 
         for index in indexes:
@@ -156,7 +197,7 @@ def verify_setup():
         cursor.execute("SHOW TABLES")
         tables = cursor.fetchall()
 
-        expected_tables = ['users', 'chat_messages', 'user_sessions', 'file_uploads']
+        expected_tables = ['users', 'conversations', 'chat_messages', 'user_sessions', 'file_uploads', 'processing_jobs']
         existing_tables = [table[0] for table in tables]
 
         print("\n📊 Database Tables:")
@@ -1,5 +1,7 @@
 import React, { useState, useEffect } from 'react';
+import axios from 'axios';
 import './App.css';
+import { clearSession, getAccessToken, installAuthRetry, storeSession } from './session';
 
 // Components
 import Auth from './components/Auth';
@@ -7,25 +9,39 @@ import Chat from './components/Chat';
 import History from './components/History';
 
 const App = () => {
-  const [token, setToken] = useState(localStorage.getItem('authToken'));
+  const [token, setToken] = useState(getAccessToken());
   const [user, setUser] = useState(JSON.parse(localStorage.getItem('user') || '{}'));
   const [activeTab, setActiveTab] = useState('chat');
   const [isLoading, setIsLoading] = useState(false); // loading state used dynamically
 
-  const handleLoginSuccess = (receivedToken, userData) => {
-    localStorage.setItem('authToken', receivedToken);
-    localStorage.setItem('user', JSON.stringify(userData));
+  const handleLoginSuccess = (receivedToken, refreshToken, userData) => {
+    storeSession(receivedToken, refreshToken, userData);
     setToken(receivedToken);
     setUser(userData);
   };
 
-  const handleLogout = () => {
-    localStorage.removeItem('authToken');
-    localStorage.removeItem('user');
+  const endSession = () => {
+    clearSession();
     setToken(null);
     setUser({});
   };
 
+  const handleLogout = async () => {
+    try {
+      // Revokes the refresh token server-side; signing out locally happens either way
+      await axios.post(`${process.env.REACT_APP_API_URL}/logout`, {}, {
+        headers: { 'Authorization': `Bearer ${getAccessToken()}` }
+      });
+    } catch (err) {
+      console.error('Error logging out:', err);
+    } finally {
+      endSession();
+    }
+  };
+
+  // Refresh expired access tokens instead of sending the user back to the login screen
+  useEffect(() => installAuthRetry({ onRefreshed: setToken, onSessionEnded: endSession }), []);
+
   // 3D floating elements animation setup
   useEffect(() => {
     const floatingElements = document.querySelectorAll('.floating-element');
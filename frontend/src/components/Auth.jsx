@@ -34,8 +34,8 @@ const Auth = ({ onLoginSuccess }) => {
         setPassword('');
         setEmail('');
       } else {
-        const { access_token, user } = response.data;
-        onLoginSuccess(access_token, user);
+        const { access_token, refresh_token, user } = response.data;
+        onLoginSuccess(access_token, refresh_token, user);
       }
     } catch (err) {
       setError(err.response?.data?.msg || 'An error occurred.');
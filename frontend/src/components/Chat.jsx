@@ -1,6 +1,10 @@
 import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import './Chat.css';
+import { authFetch, getAccessToken } from '../session';
+
+// The server reports jobs abandoned by a restarted worker as failed after 10 minutes
+const JOB_WAIT_TIMEOUT_MS = 15 * 60 * 1000;
 
 const Chat = ({ token }) => {
   const [messages, setMessages] = useState([]);
@@ -11,6 +15,8 @@ const Chat = ({ token }) => {
   const messagesEndRef = useRef(null);
   const fileInputRef = useRef(null);
   const chatContainerRef = useRef(null);
+  // Server-side conversation this chat belongs to; sent back so replies see earlier turns
+  const conversationIdRef = useRef(null);
 
   const API_BASE_URL = process.env.REACT_APP_API_URL;
 
@@ -76,6 +82,89 @@ const Chat = ({ token }) => {
     setSelectedFiles(prev => prev.filter((_, i) => i !== index));
   };
 
+  // Replace the last message (the bot reply being streamed) with an updated copy
+  const updateLastMessage = (update) => {
+    setMessages(prev => [...prev.slice(0, -1), { ...prev[prev.length - 1], ...update }]);
+  };
+
+  // Stream a text-only reply from /chat/stream, rendering chunks as they arrive
+  const streamReply = async (message) => {
+    const formData = new FormData();
+    formData.append('message', message);
+    if (conversationIdRef.current) {
+      formData.append('conversation_id', conversationIdRef.current);
+    }
+
+    const response = await authFetch(`${API_BASE_URL}/chat/stream`, {
+      method: 'POST',
+      body: formData
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`Streaming request failed with status ${response.status}`);
+    }
+
+    let text = '';
+    setMessages(prev => [...prev, { sender: 'bot', text: '', timestamp: new Date().toISOString() }]);
+    setIsLoading(false);
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // SSE frames are separated by a blank line
+      const frames = buffer.split('\n\n');
+      buffer = frames.pop();
+
+      for (const frame of frames) {
+        let event = 'message';
+        let data = '';
+        frame.split('\n').forEach(line => {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          if (line.startsWith('data: ')) data += line.slice(6);
+        });
+        if (!data) continue;
+        const payload = JSON.parse(data);
+
+        if (event === 'chunk') {
+          text += payload.text;
+          updateLastMessage({ text });
+        } else if (event === 'done') {
+          conversationIdRef.current = payload.conversation_id;
+          updateLastMessage({ text: payload.reply });
+        } else if (event === 'error') {
+          updateLastMessage({
+            text: text || 'Sorry, I encountered an error processing your request. Please try again. 😔',
+            isError: true
+          });
+        }
+      }
+    }
+  };
+
+  // Poll a background job until it completes or fails, giving up after JOB_WAIT_TIMEOUT_MS
+  const waitForJob = async (jobId) => {
+    const deadline = Date.now() + JOB_WAIT_TIMEOUT_MS;
+    while (Date.now() < deadline) {
+      await new Promise(resolve => setTimeout(resolve, 2000));
+      // The access token may have been refreshed since polling started
+      const { data } = await axios.get(`${API_BASE_URL}/jobs/${jobId}`, {
+        headers: { 'Authorization': `Bearer ${getAccessToken()}` }
+      });
+      if (data.status === 'completed') {
+        return { reply: data.reply, filesProcessed: data.files.length };
+      }
+      if (data.status === 'failed') {
+        throw Object.assign(new Error(data.error || 'Background job failed'), { isJobError: true });
+      }
+    }
+    throw Object.assign(new Error('Processing is taking too long. Please try again later.'), { isJobError: true });
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     if (!input.trim() && selectedFiles.length === 0) return;
@@ -91,10 +180,18 @@ const Chat = ({ token }) => {
     setIsLoading(true);
 
     try {
+      if (selectedFiles.length === 0) {
+        await streamReply(input);
+        return;
+      }
+
       const formData = new FormData();
       if (input.trim()) {
         formData.append('message', input);
       }
+      if (conversationIdRef.current) {
+        formData.append('conversation_id', conversationIdRef.current);
+      }
 
       selectedFiles.forEach(file => {
         formData.append('files', file);
@@ -110,12 +207,18 @@ const Chat = ({ token }) => {
           }
         }
       );
+      conversationIdRef.current = response.data.conversation_id;
+
+      // PDFs are processed in the background; wait for the job to finish
+      const result = response.status === 202
+        ? await waitForJob(response.data.job_id)
+        : { reply: response.data.reply, filesProcessed: response.data.files_processed || 0 };
 
       const botMessage = {
         sender: 'bot',
-        text: response.data.reply,
+        text: result.reply,
         timestamp: new Date().toISOString(),
-        filesProcessed: response.data.files_processed || 0
+        filesProcessed: result.filesProcessed
       };
 
       setMessages(prev => [...prev, botMessage]);
@@ -123,7 +226,9 @@ const Chat = ({ token }) => {
       console.error("Error chatting with backend:", error);
       const errorMessage = {
         sender: 'bot',
-        text: 'Sorry, I encountered an error processing your request. Please try again. 😔',
+        text: error.isJobError
+          ? `${error.message} 😔`
+          : 'Sorry, I encountered an error processing your request. Please try again. 😔',
         timestamp: new Date().toISOString(),
         isError: true
       };
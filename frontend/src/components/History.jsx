@@ -8,28 +8,95 @@ const History = ({ token }) => {
   const [error, setError] = useState('');
   const [searchTerm, setSearchTerm] = useState('');
   const [filterType, setFilterType] = useState('all');
+  const [nextCursor, setNextCursor] = useState(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+  const [searchResults, setSearchResults] = useState(null);
+  const [searchNextOffset, setSearchNextOffset] = useState(null);
 
   // Use environment variable for API base URL
   const API_BASE_URL = process.env.REACT_APP_API_URL;
 
   useEffect(() => {
     fetchHistory();
-  }, []);
+  }, [filterType]);
 
-  const fetchHistory = async () => {
-    setIsLoading(true);
+  // Search runs on the server over the whole history, debounced while typing
+  useEffect(() => {
+    if (!searchTerm.trim()) {
+      setSearchResults(null);
+      setSearchNextOffset(null);
+      return;
+    }
+    const timer = setTimeout(() => searchHistory(0), 300);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
+
+  const searchHistory = async (offset) => {
+    try {
+      const response = await axios.get(`${API_BASE_URL}/history/search`, {
+        headers: {
+          'Authorization': `Bearer ${token}`
+        },
+        params: { q: searchTerm.trim(), limit: 20, offset }
+      });
+      const results = response.data.results || [];
+      setSearchResults(prev => offset > 0 && prev ? [...prev, ...results] : results);
+      setSearchNextOffset(response.data.next_offset ?? null);
+    } catch (err) {
+      setError('Failed to search chat history');
+      console.error('Error searching history:', err);
+    }
+  };
+
+  // Wrap the server-reported match ranges in <mark>
+  const renderHighlighted = (text, highlights) => {
+    const parts = [];
+    let last = 0;
+    (highlights || []).forEach(([start, end], i) => {
+      parts.push(text.slice(last, start));
+      parts.push(<mark key={i}>{text.slice(start, end)}</mark>);
+      last = end;
+    });
+    parts.push(text.slice(last));
+    return parts;
+  };
+
+  // Load the first page, or the page after `cursor` when loading more
+  const fetchHistory = async (cursor = null) => {
+    cursor ? setIsLoadingMore(true) : setIsLoading(true);
     try {
       const response = await axios.get(`${API_BASE_URL}/history`, {
         headers: {
           'Authorization': `Bearer ${token}`
-        }
+        },
+        params: { type: filterType, limit: 50, ...(cursor && { cursor }) }
       });
-      setMessages(response.data.messages || []);
+      const page = response.data.messages || [];
+      setMessages(prev => cursor ? [...prev, ...page] : page);
+      setNextCursor(response.data.next_cursor || null);
     } catch (err) {
       setError('Failed to load chat history');
       console.error('Error fetching history:', err);
     } finally {
       setIsLoading(false);
+      setIsLoadingMore(false);
+    }
+  };
+
+  // History rows carry a shortened response; fetch the full text on demand
+  const expandMessage = async (messageId) => {
+    try {
+      const response = await axios.get(`${API_BASE_URL}/history/${messageId}`, {
+        headers: {
+          'Authorization': `Bearer ${token}`
+        }
+      });
+      setMessages(prev => prev.map(message =>
+        message.id === messageId ? { ...response.data, response_truncated: false } : message
+      ));
+    } catch (err) {
+      setError('Failed to load the full response');
+      console.error('Error fetching message:', err);
     }
   };
 
@@ -44,24 +111,13 @@ const History = ({ token }) => {
         }
       });
       setMessages([]);
+      setNextCursor(null);
     } catch (err) {
       setError('Failed to clear history');
       console.error('Error clearing history:', err);
     }
   };
 
-  const filteredMessages = messages.filter(message => {
-    const matchesSearch =
-      message.user_message?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      message.bot_response?.toLowerCase().includes(searchTerm.toLowerCase());
-
-    if (filterType === 'all') return matchesSearch;
-    if (filterType === 'files') return matchesSearch && message.files_info?.length > 0;
-    if (filterType === 'text') return matchesSearch && (!message.files_info || message.files_info.length === 0);
-
-    return matchesSearch;
-  });
-
   const formatDate = (dateString) => {
     const date = new Date(dateString);
     const now = new Date();
@@ -104,7 +160,7 @@ const History = ({ token }) => {
         <div className="header-title">
           <h2>💬 Chat History</h2>
           <p className="header-subtitle">
-            {messages.length} conversation{messages.length !== 1 ? 's' : ''} saved
+            {messages.length}{nextCursor ? '+' : ''} conversation{messages.length !== 1 ? 's' : ''} saved
           </p>
         </div>
 
@@ -163,7 +219,56 @@ const History = ({ token }) => {
       )}
 
       <div className="history-content">
-        {filteredMessages.length === 0 ? (
+        {searchResults ? (
+          <div className="history-list">
+            {searchResults.length === 0 && (
+              <div className="empty-history">
+                <div className="empty-icon">🔍</div>
+                <h3>No matching conversations</h3>
+                <p>Try different search terms</p>
+              </div>
+            )}
+            {searchResults.map(result => (
+              <div key={result.id} className="history-item">
+                <div className="conversation-card">
+                  <div className="conversation-header">
+                    <div className="conversation-time">
+                      <span className="time-icon">🕒</span>
+                      {formatDate(result.created_at)}
+                    </div>
+                  </div>
+                  <div className="conversation-content">
+                    {result.user_message && (
+                      <div className="user-message-history">
+                        <div className="message-label">
+                          <span className="label-icon">👤</span>
+                          You asked:
+                        </div>
+                        <div className="message-text">
+                          {renderHighlighted(result.user_message, result.user_message_highlights)}
+                        </div>
+                      </div>
+                    )}
+                    <div className="bot-response-history">
+                      <div className="message-label">
+                        <span className="label-icon">🤖</span>
+                        AI responded:
+                      </div>
+                      <div className="message-text">
+                        {renderHighlighted(result.bot_response, result.bot_response_highlights)}
+                      </div>
+                    </div>
+                  </div>
+                </div>
+              </div>
+            ))}
+            {searchNextOffset !== null && (
+              <button onClick={() => searchHistory(searchNextOffset)} className="load-more-btn">
+                More results
+              </button>
+            )}
+          </div>
+        ) : messages.length === 0 ? (
           <div className="empty-history">
             <div className="empty-icon">📭</div>
             <h3>No conversations found</h3>
@@ -176,7 +281,7 @@ const History = ({ token }) => {
           </div>
         ) : (
           <div className="history-list">
-            {filteredMessages.map((message, index) => (
+            {messages.map((message, index) => (
               <div key={message.id || index} className="history-item">
                 <div className="conversation-card">
                   <div className="conversation-header">
@@ -234,12 +339,30 @@ const History = ({ token }) => {
                             {i < message.bot_response.split('\n').length - 1 && <br />}
                           </React.Fragment>
                         ))}
+                        {message.response_truncated && (
+                          <>
+                            …{' '}
+                            <button onClick={() => expandMessage(message.id)} className="show-more-btn">
+                              Show full response
+                            </button>
+                          </>
+                        )}
                       </div>
                     </div>
                   </div>
                 </div>
               </div>
             ))}
+
+            {nextCursor && (
+              <button
+                onClick={() => fetchHistory(nextCursor)}
+                className="load-more-btn"
+                disabled={isLoadingMore}
+              >
+                {isLoadingMore ? 'Loading...' : 'Load older conversations'}
+              </button>
+            )}
           </div>
         )}
       </div>
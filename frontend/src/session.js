@@ -0,0 +1,94 @@
+import axios from 'axios';
+
+// Access tokens are short-lived; the refresh token from /login keeps the user
+// signed in. A request answered 401 triggers one /refresh (shared by every
+// request that failed at the same time) and is retried once with the new
+// access token. /refresh rotates the refresh token, so both are stored again.
+const API_BASE_URL = process.env.REACT_APP_API_URL;
+
+let refreshing = null;
+
+export const getAccessToken = () => localStorage.getItem('authToken');
+
+export const storeSession = (accessToken, refreshToken, user) => {
+  localStorage.setItem('authToken', accessToken);
+  localStorage.setItem('refreshToken', refreshToken);
+  localStorage.setItem('user', JSON.stringify(user));
+};
+
+export const clearSession = () => {
+  localStorage.removeItem('authToken');
+  localStorage.removeItem('refreshToken');
+  localStorage.removeItem('user');
+};
+
+// Resolves to a new access token; rejects with sessionEnded set when the user must log in again
+export const refreshAccessToken = () => {
+  if (!refreshing) {
+    const refreshToken = localStorage.getItem('refreshToken');
+    const request = refreshToken
+      ? axios.post(`${API_BASE_URL}/refresh`, { refresh_token: refreshToken }, { skipAuthRetry: true })
+      : Promise.reject(Object.assign(new Error('No refresh token'), { response: { status: 401 } }));
+
+    refreshing = request
+      .then(({ data }) => {
+        localStorage.setItem('authToken', data.access_token);
+        localStorage.setItem('refreshToken', data.refresh_token);
+        return data.access_token;
+      })
+      .catch(err => {
+        err.sessionEnded = err.response?.status === 401;
+        throw err;
+      })
+      .finally(() => {
+        refreshing = null;
+      });
+  }
+  return refreshing;
+};
+
+let handlers = { onRefreshed: () => {}, onSessionEnded: () => {} };
+
+// Refresh and tell the app about the outcome; resolves to the new access token or null
+const renewAccessToken = async () => {
+  try {
+    const accessToken = await refreshAccessToken();
+    handlers.onRefreshed(accessToken);
+    return accessToken;
+  } catch (err) {
+    if (err.sessionEnded) handlers.onSessionEnded();
+    return null;
+  }
+};
+
+// Retry authenticated axios requests once after refreshing; returns a function that uninstalls it
+export const installAuthRetry = ({ onRefreshed, onSessionEnded }) => {
+  handlers = { onRefreshed, onSessionEnded };
+  const id = axios.interceptors.response.use(undefined, async (error) => {
+    const config = error.config;
+    if (error.response?.status !== 401 || !config || config.skipAuthRetry || config.authRetried
+        || !config.headers?.Authorization) {
+      throw error;
+    }
+
+    const accessToken = await renewAccessToken();
+    if (!accessToken) throw error;
+    config.authRetried = true;
+    config.headers.Authorization = `Bearer ${accessToken}`;
+    return axios(config);
+  });
+  return () => axios.interceptors.response.eject(id);
+};
+
+// fetch() with the current access token and the same refresh-and-retry-once on 401
+export const authFetch = async (url, options = {}) => {
+  const send = accessToken => fetch(url, {
+    ...options,
+    headers: { ...options.headers, 'Authorization': `Bearer ${accessToken}` }
+  });
+
+  const response = await send(getAccessToken());
+  if (response.status !== 401) return response;
+  const accessToken = await renewAccessToken();
+  return accessToken ? send(accessToken) : response;
+};